@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Benchmark the Vector clickhouse sink against the ClickHouse stand-in.
+
+Vector replays synthetic syslog from a demo_logs source into
+fake_clickhouse.py once per profile: "default" runs the sink with the
+Vector defaults, "tuned" with the batch and buffer options vector_config
+sets for --target-eps. Wall time until every event is inserted, events/s,
+inserts and rows per insert are reported. Needs vector in PATH or --vector.
+
+    python benchmarks/bench_vector.py --events 200000 --target-eps 5000 --insert-latency 0.05
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+VECTOR_UTILS = os.path.join(os.path.dirname(BENCH_DIR), 'plugins', 'module_utils', 'vector.py')
+TABLE_COLUMNS = ('PRIORITY Int8, SYSLOG_FACILITY Int8, SYSLOG_IDENTIFIER String, host String, message String, '
+                 'source_type String, timestamp DateTime')
+
+
+def load_vector_utils():
+    spec = importlib.util.spec_from_file_location('vector_utils', VECTOR_UTILS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class ClickHouseStandIn(object):
+    """fake_clickhouse.py running in a subprocess."""
+
+    def __init__(self, latency):
+        self.port = free_port()
+        self.url = 'http://127.0.0.1:%d' % self.port
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, 'fake_clickhouse.py'), '--port', str(self.port),
+             '--latency', str(latency)], stdout=subprocess.DEVNULL)
+        deadline = time.time() + 10
+        while True:
+            try:
+                self.query('SELECT 1')
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def query(self, statement):
+        with urlopen(Request(self.url + '/?query=' + quote(statement), data=b''), timeout=10) as response:
+            return response.read().decode()
+
+    def stats(self, table):
+        with urlopen(self.url + '/fake_stats', timeout=10) as response:
+            return json.loads(response.read().decode())['tables'].get(table, dict(inserts=0, rows=0, bytes=0))
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def pipeline(args, endpoint, table, data_dir):
+    interval = 1.0 / args.rate if args.rate else 0.0
+    return dict(
+        data_dir=data_dir,
+        sources=dict(syslog_replay=dict(type='demo_logs', format='syslog', interval=interval, count=args.events)),
+        sinks=dict(clickhouse_syslog=dict(
+            type='clickhouse', inputs=['syslog_replay'], endpoint=endpoint, database='logs', table=table,
+            skip_unknown_fields=True, healthcheck=dict(enabled=True))),
+    )
+
+
+def run_profile(args, vector_utils, standin, profile, work_dir):
+    table = 'syslogd_' + profile
+    standin.query('CREATE TABLE logs.%s (%s) ENGINE = MergeTree ORDER BY timestamp' % (table, TABLE_COLUMNS))
+    data_dir = os.path.join(work_dir, profile)
+    os.makedirs(data_dir)
+    config = pipeline(args, standin.url, table, data_dir)
+    tuned = {}
+    if profile == 'tuned':
+        config, tuned = vector_utils.tune_pipeline(config, args.target_eps, event_size=args.event_size,
+                                                   batch_timeout=args.batch_timeout, buffer_type=args.buffer_type,
+                                                   buffer_seconds=args.buffer_seconds)
+    errors, warnings = vector_utils.validate_pipeline(config)
+    if errors:
+        raise SystemExit('invalid %s config: %s' % (profile, '; '.join(errors)))
+    path = os.path.join(work_dir, profile + '.json')
+    with open(path, 'w') as file:
+        json.dump(config, file, indent=2, sort_keys=True)
+
+    started = time.time()
+    validate = subprocess.run([args.vector, 'validate', '--no-environment', path],
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    validate_time = time.time() - started
+    if validate.returncode != 0:
+        raise SystemExit('vector validate failed for %s:\n%s' % (profile, validate.stdout.decode()))
+
+    log = open(os.path.join(work_dir, profile + '.log'), 'wb')
+    started = time.time()
+    vector = subprocess.Popen([args.vector, '--config', path], stdout=log, stderr=subprocess.STDOUT)
+    first_insert = None
+    try:
+        while True:
+            stats = standin.stats('logs.' + table)
+            now = time.time()
+            if stats['rows'] and first_insert is None:
+                first_insert = now - started
+            if stats['rows'] >= args.events or now - started > args.timeout or vector.poll() is not None:
+                break
+            time.sleep(0.05)
+    finally:
+        vector.terminate()
+        vector.wait()
+        log.close()
+    wall = time.time() - started
+    return dict(
+        profile=profile,
+        events=stats['rows'],
+        complete=stats['rows'] >= args.events,
+        wall=wall,
+        events_per_second=stats['rows'] / wall if wall else 0,
+        first_insert=first_insert,
+        inserts=stats['inserts'],
+        rows_per_insert=stats['rows'] / stats['inserts'] if stats['inserts'] else 0,
+        bytes_per_insert=stats['bytes'] / stats['inserts'] if stats['inserts'] else 0,
+        validate_time=validate_time,
+        tuned=tuned.get('clickhouse_syslog', {}),
+        log=log.name,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--vector', default=shutil.which('vector'), help='vector binary, from PATH by default')
+    parser.add_argument('--events', type=int, default=100000, help='events to replay per profile')
+    parser.add_argument('--rate', type=float, default=0, help='events/s the source generates, 0 is as fast as possible')
+    parser.add_argument('--profiles', nargs='+', choices=['default', 'tuned'], default=['default', 'tuned'])
+    parser.add_argument('--target-eps', type=int, default=5000, help='target_events_per_second of the tuned profile')
+    parser.add_argument('--event-size', type=int, default=512)
+    parser.add_argument('--batch-timeout', type=float, default=1.0)
+    parser.add_argument('--buffer-type', choices=['disk', 'memory'], default='memory')
+    parser.add_argument('--buffer-seconds', type=int, default=60)
+    parser.add_argument('--insert-latency', type=float, default=0.0, help='seconds every stand-in request takes')
+    parser.add_argument('--timeout', type=float, default=300, help='seconds to wait for all events of a profile')
+    parser.add_argument('--keep', action='store_true', help='keep configs and vector logs')
+    parser.add_argument('--json', metavar='FILE', help='also write the results to FILE')
+    args = parser.parse_args()
+
+    if not args.vector:
+        parser.error('vector is not in PATH, use --vector')
+
+    vector_utils = load_vector_utils()
+    work_dir = tempfile.mkdtemp(prefix='bench_vector.')
+    standin = ClickHouseStandIn(args.insert_latency)
+    results = []
+    try:
+        standin.query('CREATE DATABASE logs')
+        for profile in args.profiles:
+            result = run_profile(args, vector_utils, standin, profile, work_dir)
+            results.append(result)
+            print('%(profile)-8s %(events)d events in %(wall).2fs, %(events_per_second).0f events/s, '
+                  '%(inserts)d inserts, %(rows_per_insert).0f rows/insert, validate %(validate_time).2fs' % result)
+            if result['tuned']:
+                print('         tuned: %s' % json.dumps(result['tuned'], sort_keys=True))
+            if not result['complete']:
+                print('         incomplete, see %s' % (result['log'] if args.keep else 'the vector log with --keep'))
+    finally:
+        standin.stop()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(dict(events=args.events, rate=args.rate, insert_latency=args.insert_latency,
+                           results=results), file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
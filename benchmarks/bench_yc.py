@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Benchmark the yc modules against the fake yc executable or the mock REST API.
+
+Every scenario creates N instances, updates their memory (a stop/update/start
+cycle), stops, starts and deletes them, either with one yc module run per
+instance like a playbook loop (serial) or with one yc_instances run (batch).
+Wall time, yc spawns and p50/p99 latency of module runs and yc calls are
+reported for each phase.
+
+With --backend api the modules talk to fake_yc_api.py instead, getting their
+IAM token for an OAuth token. Requests take the place of yc spawns, and the
+connections, token exchanges, injected failures, dropped connections and
+answers replayed for a repeated idempotency key seen by the mock are reported
+per scenario: one token exchange per scenario means the token cache worked,
+no failed runs with --drop-rate means the retries recovered without running
+a request twice.
+
+    python benchmarks/bench_yc.py --instances 1 10 100 --latency 0.2 --max-workers 10 20
+    python benchmarks/bench_yc.py --backend api --instances 10 --failure-rate 0.05 --drop-rate 0.05
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+import json
+import os
+import pstats
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from urllib.request import urlopen
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+COLLECTION_DIR = os.path.dirname(BENCH_DIR)
+MODULES = 'ansible_collections.timych.yandex_cloud_cvl.plugins.modules.'
+PHASES = (
+    ('create', dict(state='present')),
+    ('update', dict(state='present', update=True, memory=4)),
+    ('stop', dict(state='stopped')),
+    ('start', dict(state='started')),
+    ('delete', dict(state='absent')),
+)
+COMMON_PARAMS = dict(zone='ru-central1-a', memory=2, cores=2, core_fraction=20)
+# resource ids in request paths, so requests are summed up per method
+RESOURCE_ID = re.compile(r'/(instances|disks|operations)/[^/:]+')
+
+
+def percentile(values, share):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(share * (len(values) - 1))))]
+
+
+def latency_summary(values):
+    return dict(count=len(values), p50=percentile(values, 0.5), p99=percentile(values, 0.99),
+                total=sum(values))
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class Sandbox(object):
+    """Temporary collection path, fake yc on PATH and its state and call log,
+    or the mock REST API for the api backend."""
+
+    def __init__(self, args):
+        self.dir = tempfile.mkdtemp(prefix='bench_yc.')
+        namespace = os.path.join(self.dir, 'ansible_collections', 'timych')
+        os.makedirs(namespace)
+        os.symlink(COLLECTION_DIR, os.path.join(namespace, 'yandex_cloud_cvl'))
+        bin_dir = os.path.join(self.dir, 'bin')
+        os.makedirs(bin_dir)
+        with open(os.path.join(bin_dir, 'yc'), 'w') as file:
+            file.write('#!/bin/sh\nexec "%s" "%s" "$@"\n' % (sys.executable, os.path.join(BENCH_DIR, 'fake_yc.py')))
+        os.chmod(os.path.join(bin_dir, 'yc'), 0o755)
+        self.log = os.path.join(self.dir, 'calls.jsonl')
+        self.env = dict(
+            os.environ,
+            PATH=bin_dir + os.pathsep + os.environ.get('PATH', ''),
+            PYTHONPATH=self.dir,
+            FAKE_YC_STATE=os.path.join(self.dir, 'state.json'),
+            FAKE_YC_LOG=self.log,
+            FAKE_YC_LATENCY=str(args.latency),
+            FAKE_YC_JITTER=str(args.jitter),
+            FAKE_YC_FAILURE_RATE=str(args.failure_rate),
+        )
+        self.profile = args.profile
+        self.backend = args.backend
+        self.api = None
+        self.params = {}
+        if self.backend == 'api':
+            self.start_api(args)
+
+    def start_api(self, args):
+        self.api_url = 'http://127.0.0.1:%d' % free_port()
+        self.api = subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, 'fake_yc_api.py'), '--port', self.api_url.rsplit(':', 1)[1],
+             '--latency', str(args.latency), '--failure-rate', str(args.failure_rate),
+             '--drop-rate', str(args.drop_rate)], stdout=subprocess.DEVNULL)
+        self.params = dict(backend='api', api_endpoint=self.api_url, folder_id='fake-folder',
+                           oauth_token='fake-oauth-token', token_cache=os.path.join(self.dir, 'iam_token.json'))
+        deadline = time.time() + 10
+        while True:
+            try:
+                self.api_stats()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def api_stats(self):
+        with urlopen(self.api_url + '/fake_stats', timeout=10) as response:
+            return json.loads(response.read().decode())
+
+    def cleanup(self):
+        if self.api is not None:
+            self.api.terminate()
+            self.api.wait()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def calls(self, runs):
+        """Read and reset the yc call log, or take the requests from the module results."""
+        if self.backend == 'api':
+            return [dict(command=call['method'] + ' ' + RESOURCE_ID.sub(r'/\1/<id>', call['url'].split('?')[0][
+                len(self.api_url):]), rc=call['rc'], elapsed=call['duration'])
+                    for result, elapsed, profile in runs for call in result.get('timings', []) if 'method' in call]
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log) as file:
+            calls = [json.loads(line) for line in file if line.strip()]
+        os.remove(self.log)
+        return calls
+
+    def run_module(self, module, params):
+        """Run a module like ansible does and return its result and wall time."""
+        params = dict(params, preflight_cache=os.path.join(self.dir, 'preflight.json'), **self.params)
+        command = [sys.executable]
+        profile_path = None
+        if self.profile:
+            fd, profile_path = tempfile.mkstemp(dir=self.dir, suffix='.prof')
+            os.close(fd)
+            command += ['-m', 'cProfile', '-o', profile_path]
+        command += ['-m', MODULES + module]
+        started = time.time()
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, env=self.env, cwd=self.dir)
+        out, err = process.communicate(json.dumps(dict(ANSIBLE_MODULE_ARGS=params)).encode())
+        elapsed = time.time() - started
+        try:
+            result = json.loads(out.decode().strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            result = dict(failed=True, msg=err.decode()[-500:] or 'module printed no result')
+        return result, elapsed, profile_path
+
+
+def run_phase(sandbox, mode, names, params, max_workers):
+    started = time.time()
+    runs = []
+    if mode == 'serial':
+        for name in names:
+            runs.append(sandbox.run_module('yc', dict(COMMON_PARAMS, name=name, **params)))
+    else:
+        instances = [dict(name=name) for name in names]
+        runs.append(sandbox.run_module('yc_instances', dict(COMMON_PARAMS, instances=instances,
+                                                            max_workers=max_workers, **params)))
+    wall = time.time() - started
+    calls = sandbox.calls(runs)
+    by_command = {}
+    for call in calls:
+        by_command.setdefault(call['command'], []).append(call['elapsed'])
+    return dict(
+        wall=wall,
+        spawns=len(calls),
+        failed_calls=sum(1 for call in calls if call['rc'] != 0),
+        failed_runs=sum(1 for result, elapsed, profile in runs if result.get('failed')),
+        errors=sorted(set(result.get('msg', '') for result, elapsed, profile in runs if result.get('failed')))[:3],
+        module_runs=latency_summary([elapsed for result, elapsed, profile in runs]),
+        all_calls=latency_summary([call['elapsed'] for call in calls]),
+        yc_calls=dict((command, latency_summary(values)) for command, values in sorted(by_command.items())),
+        profiles=[profile for result, elapsed, profile in runs if profile],
+    )
+
+
+def run_scenario(args, count, mode, max_workers):
+    sandbox = Sandbox(args)
+    names = ['bench-%04d' % index for index in range(count)]
+    phases = []
+    try:
+        for phase, params in PHASES:
+            result = run_phase(sandbox, mode, names, params, max_workers)
+            result['phase'] = phase
+            if args.profile and result['profiles']:
+                stats = pstats.Stats(*result['profiles'])
+                result['profile'] = os.path.join(args.profile, '%s-%s-%d-%s.prof' % (mode, max_workers, count, phase))
+                stats.dump_stats(result['profile'])
+            del result['profiles']
+            phases.append(result)
+        api = sandbox.api_stats() if sandbox.api is not None else None
+    finally:
+        sandbox.cleanup()
+    return dict(instances=count, mode=mode, max_workers=max_workers if mode == 'batch' else 1,
+                backend=args.backend,
+                wall=sum(phase['wall'] for phase in phases),
+                spawns=sum(phase['spawns'] for phase in phases),
+                api=api,
+                phases=phases)
+
+
+def format_ms(value):
+    return '-' if value is None else '%.0f' % (value * 1000)
+
+
+def print_report(scenario):
+    calls = 'requests' if scenario['backend'] == 'api' else 'yc spawns'
+    print(('%(mode)s, %(instances)d instances, %(max_workers)d workers: %(wall).2fs wall, %(spawns)d ' + calls)
+          % scenario)
+    if scenario['api']:
+        print('  mock api: %(connections)d connections, %(requests)d requests, %(tokens)d token exchanges, '
+              '%(failures)d injected failures, %(dropped)d dropped connections, %(replayed)d replayed answers'
+              % scenario['api'])
+    print('  %-8s %9s %7s %7s %12s %12s' % ('phase', 'wall s', 'spawns', 'failed', 'run p50/p99', 'call p50/p99'))
+    for phase in scenario['phases']:
+        all_calls = phase['all_calls']
+        print('  %-8s %9.2f %7d %7d %12s %12s' % (
+            phase['phase'], phase['wall'], phase['spawns'], phase['failed_runs'],
+            '%s/%s' % (format_ms(phase['module_runs']['p50']), format_ms(phase['module_runs']['p99'])),
+            '%s/%s' % (format_ms(all_calls['p50']), format_ms(all_calls['p99']))))
+        for command, summary in phase['yc_calls'].items():
+            print('      %-28s %5d calls  p50 %6s ms  p99 %6s ms' % (
+                command, summary['count'], format_ms(summary['p50']), format_ms(summary['p99'])))
+        for error in phase['errors']:
+            print('      error: %s' % (error.strip().splitlines() or [''])[-1][:120])
+        if phase.get('profile'):
+            print('      profile: %s' % phase['profile'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--instances', type=int, nargs='+', default=[1, 10, 50],
+                        help='instance counts to benchmark, 1 to 500')
+    parser.add_argument('--modes', nargs='+', choices=['serial', 'batch'], default=['serial', 'batch'])
+    parser.add_argument('--max-workers', type=int, nargs='+', default=[10],
+                        help='max_workers values of yc_instances to compare')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds every fake yc call takes')
+    parser.add_argument('--jitter', type=float, default=0.2, help='random latency spread, 0.2 is +-20%%')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of fake yc calls that fail')
+    parser.add_argument('--backend', choices=['cli', 'api'], default='cli',
+                        help='run the modules with the fake yc or against fake_yc_api.py')
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help='share of requests whose connection the mock api closes, api backend only')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='run modules under cProfile and save stats of every phase to DIR')
+    parser.add_argument('--json', metavar='FILE', help='also write the results to FILE')
+    args = parser.parse_args()
+
+    if any(count < 1 or count > 500 for count in args.instances):
+        parser.error('--instances must be between 1 and 500')
+    if args.profile and not os.path.isdir(args.profile):
+        os.makedirs(args.profile)
+
+    scenarios = []
+    for count in args.instances:
+        for mode in args.modes:
+            for max_workers in (args.max_workers if mode == 'batch' else [1]):
+                scenario = run_scenario(args, count, mode, max_workers)
+                print_report(scenario)
+                scenarios.append(scenario)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(dict(backend=args.backend, latency=args.latency, jitter=args.jitter,
+                           failure_rate=args.failure_rate, drop_rate=args.drop_rate,
+                           scenarios=scenarios), file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
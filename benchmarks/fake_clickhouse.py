@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Local stand-in for the ClickHouse HTTP interface.
+
+Understands the statements clickhouse_schema sends: CREATE/DROP DATABASE,
+CREATE/DROP TABLE and SELECTs from system.databases, system.tables and
+system.columns with FORMAT JSON, and the ones of the Vector clickhouse sink:
+SELECT 1 and INSERT ... FORMAT JSONEachRow, gzip compressed or not. Inserted
+rows are only counted, SELECT count() FROM a table returns the count.
+Errors carry the ClickHouse error codes. GET /fake_stats returns the numbers
+of connections, requests, and inserts and rows per table as JSON, they are
+also printed on exit.
+
+    python benchmarks/fake_clickhouse.py --port 8123 --latency 0.01
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+import gzip
+import json
+import re
+import signal
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+NAME = r'(?:`(?:[^`\\]|\\.)+`|"(?:[^"\\]|\\.)+"|[\w]+)'
+ON_CLUSTER = r'(?:\s+ON\s+CLUSTER\s+' + NAME + r')?'
+CREATE_DATABASE = re.compile(r'CREATE\s+DATABASE\s+(IF\s+NOT\s+EXISTS\s+)?(' + NAME + ')' + ON_CLUSTER, re.I)
+DROP_DATABASE = re.compile(r'DROP\s+DATABASE\s+(IF\s+EXISTS\s+)?(' + NAME + ')', re.I)
+CREATE_TABLE = re.compile(r'CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?(?:(' + NAME + r')\.)?(' + NAME + ')' +
+                          ON_CLUSTER + r'\s*\((.*)\)\s*ENGINE', re.I | re.S)
+DROP_TABLE = re.compile(r'DROP\s+TABLE\s+(IF\s+EXISTS\s+)?(?:(' + NAME + r')\.)?(' + NAME + ')', re.I)
+INSERT = re.compile(r'INSERT\s+INTO\s+(?:(' + NAME + r')\.)?(' + NAME + r')\s*(?:\([^)]*\)\s*)?FORMAT\s+JSONEachRow\s*',
+                    re.I)
+COUNT = re.compile(r'SELECT\s+count\(\)\s+FROM\s+(?:(' + NAME + r')\.)?(' + NAME + r')\s*$', re.I)
+SELECT_ONE = re.compile(r'SELECT\s+1\s*$', re.I)
+SELECT = re.compile(r'SELECT\s+.*\s+FROM\s+system\.(databases|tables|columns)(?:\s+WHERE\s+database\s+IN\s+\((.*?)\))?',
+                    re.I | re.S)
+
+
+class FakeClickHouseError(Exception):
+
+    def __init__(self, code, msg):
+        super(FakeClickHouseError, self).__init__(msg)
+        self.code = code
+        self.msg = msg
+
+
+def unquote(name):
+    if name and name[0] in '`"':
+        return re.sub(r'\\(.)', r'\1', name[1:-1])
+    return name
+
+
+def split_columns(text):
+    """Split a column list on the commas outside of type parentheses."""
+    columns = []
+    depth = 0
+    current = ''
+    for char in text:
+        if char == ',' and depth == 0:
+            columns.append(current.strip())
+            current = ''
+            continue
+        depth += (char == '(') - (char == ')')
+        current += char
+    if current.strip():
+        columns.append(current.strip())
+    return [re.match(r'(' + NAME + r')\s+(.+)', column).groups() for column in columns]
+
+
+class FakeClickHouse(object):
+
+    def __init__(self):
+        self.databases = {'default': {}, 'system': {}}
+        self.inserts = {}
+        self.lock = threading.Lock()
+
+    def database(self, name):
+        if name not in self.databases:
+            raise FakeClickHouseError(81, 'Database %s doesn\'t exist' % name)
+        return self.databases[name]
+
+    def select(self, source, databases):
+        if source == 'databases':
+            return [dict(name=name) for name in sorted(self.databases)]
+        rows = []
+        for database, tables in sorted(self.databases.items()):
+            if databases is not None and database not in databases:
+                continue
+            for table, columns in sorted(tables.items()):
+                if source == 'tables':
+                    rows.append(dict(database=database, name=table))
+                else:
+                    rows.extend(dict(database=database, table=table, name=unquote(column), type=column_type,
+                                     position=position + 1)
+                                for position, (column, column_type) in enumerate(columns))
+        return rows
+
+    def table(self, database, name):
+        database = database or 'default'
+        if name not in self.database(database):
+            raise FakeClickHouseError(60, 'Table %s.%s doesn\'t exist' % (database, name))
+        return self.inserts.setdefault('%s.%s' % (database, name), dict(inserts=0, rows=0, bytes=0))
+
+    def insert(self, database, name, data):
+        table = self.table(database, name)
+        rows = [line for line in data.splitlines() if line.strip()]
+        for line in rows:
+            try:
+                json.loads(line)
+            except ValueError:
+                raise FakeClickHouseError(117, 'Cannot parse JSON row: ' + line[:100])
+        table['inserts'] += 1
+        table['rows'] += len(rows)
+        table['bytes'] += len(data)
+
+    def execute(self, query):
+        """Run one statement, return the response body."""
+        with self.lock:
+            match = INSERT.match(query.lstrip())
+            if match:
+                self.insert(unquote(match.group(1)), unquote(match.group(2)), query.lstrip()[match.end():])
+                return ''
+        query = query.strip().rstrip(';')
+        with self.lock:
+            if SELECT_ONE.match(query):
+                return '1\n'
+            match = COUNT.match(query)
+            if match:
+                return '%d\n' % self.table(unquote(match.group(1)), unquote(match.group(2)))['rows']
+            match = SELECT.match(query)
+            if match:
+                databases = None
+                if match.group(2) is not None:
+                    databases = set(re.findall(r"'((?:[^'\\]|\\.)*)'", match.group(2)))
+                rows = self.select(match.group(1).lower(), databases)
+                return json.dumps(dict(data=rows, rows=len(rows)))
+            match = CREATE_DATABASE.match(query)
+            if match:
+                name = unquote(match.group(2))
+                if name in self.databases and not match.group(1):
+                    raise FakeClickHouseError(82, 'Database %s already exists' % name)
+                self.databases.setdefault(name, {})
+                return ''
+            match = DROP_DATABASE.match(query)
+            if match:
+                name = unquote(match.group(2))
+                if name not in self.databases and not match.group(1):
+                    raise FakeClickHouseError(81, 'Database %s doesn\'t exist' % name)
+                self.databases.pop(name, None)
+                return ''
+            match = CREATE_TABLE.match(query)
+            if match:
+                database = self.database(unquote(match.group(2)) or 'default')
+                name = unquote(match.group(3))
+                if name in database and not match.group(1):
+                    raise FakeClickHouseError(57, 'Table %s already exists' % name)
+                database.setdefault(name, split_columns(match.group(4)))
+                return ''
+            match = DROP_TABLE.match(query)
+            if match:
+                database = self.database(unquote(match.group(2)) or 'default')
+                name = unquote(match.group(3))
+                if name not in database and not match.group(1):
+                    raise FakeClickHouseError(60, 'Table %s doesn\'t exist' % name)
+                database.pop(name, None)
+                self.inserts.pop('%s.%s' % (unquote(match.group(2)) or 'default', name), None)
+                return ''
+        raise FakeClickHouseError(62, 'Syntax error: fake server does not understand: ' + query[:200])
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.stats['connections'] += 1
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def reply(self, status, body, code=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        if code is not None:
+            self.send_header('X-ClickHouse-Exception-Code', str(code))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_query(self, query):
+        self.server.stats['requests'] += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        user = self.headers.get('X-ClickHouse-User', 'default')
+        if (user, self.headers.get('X-ClickHouse-Key', '')) != (self.server.user, self.server.password):
+            self.reply(403, 'Code: 516. DB::Exception: %s: Authentication failed\n' % user, 516)
+            return
+        try:
+            self.reply(200, self.server.clickhouse.execute(query))
+        except FakeClickHouseError as e:
+            self.reply(500, 'Code: %d. DB::Exception: %s\n' % (e.code, e.msg), e.code)
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/fake_stats':
+            with self.server.clickhouse.lock:
+                stats = dict(self.server.stats, tables=self.server.clickhouse.inserts)
+                self.reply(200, json.dumps(stats))
+            return
+        query = parse_qs(urlparse(self.path).query).get('query', [''])[0]
+        if not query:
+            self.reply(200, 'Ok.\n')
+            return
+        self.handle_query(query)
+
+    def do_POST(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            body = b''
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                chunk = self.rfile.read(size + 2)[:size]
+                if not size:
+                    break
+                body += chunk
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        body = body.decode('utf-8')
+        self.handle_query(parse_qs(urlparse(self.path).query).get('query', [''])[0] + body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8123)
+    parser.add_argument('--user', default='default')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds every request takes')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.clickhouse = FakeClickHouse()
+    server.stats = dict(connections=0, requests=0)
+    server.user, server.password = args.user, args.password
+    server.latency = args.latency
+    server.verbose = args.verbose
+    signal.signal(signal.SIGTERM, interrupt)
+    print('Listening on %s:%d' % (args.host, server.server_address[1]))
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print('%(connections)d connections, %(requests)d requests' % server.stats)
+        for table, inserts in sorted(server.clickhouse.inserts.items()):
+            print('%s: %d inserts, %d rows' % (table, inserts['inserts'], inserts['rows']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Fake yc executable for benchmarks.
+
+Implements the part of the yc CLI the collection calls, keeping instances,
+disks and operations in a JSON file. Behaviour is set with environment
+variables:
+
+FAKE_YC_STATE           state file, default ./fake_yc_state.json
+FAKE_YC_LOG             if set, one JSON line per call is appended to it
+FAKE_YC_LATENCY         seconds every call takes, default 0
+FAKE_YC_JITTER          latency is randomly scaled by 1 +- jitter, default 0
+FAKE_YC_FAILURE_RATE    share of calls failing with a transient error, default 0
+FAKE_YC_OPERATION_TIME  seconds an --async operation takes to finish, default 0
+FAKE_YC_ERRORS          JSON object of call prefix -> error, calls starting with
+                        a prefix, e.g. "compute instance start vm-1", fail with
+                        the error on stderr and rc 1
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import fcntl
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+GIB = 1073741824
+
+
+class FakeYcError(Exception):
+
+    def __init__(self, msg, rc=1):
+        super(FakeYcError, self).__init__(msg)
+        self.msg = msg
+        self.rc = rc
+
+
+def option(args, name, default=None):
+    if name in args:
+        return args[args.index(name) + 1]
+    return default
+
+
+def parse_pairs(value):
+    return dict(pair.split('=', 1) for pair in value.split(',') if pair)
+
+
+def new_id(prefix):
+    return prefix + uuid.uuid4().hex[:17]
+
+
+class FakeCloud(object):
+
+    def __init__(self, state):
+        self.state = state
+        self.instances = state.setdefault('instances', {})
+        self.disks = state.setdefault('disks', {})
+        self.operations = state.setdefault('operations', {})
+        self.groups = state.setdefault('instance_groups', {})
+
+    def instance(self, name):
+        if name not in self.instances:
+            raise FakeYcError('ERROR: instance with name "%s" not found' % name)
+        return self.instances[name]
+
+    def operation(self, args, description, response):
+        """Result of an operation call, an unfinished operation with --async."""
+        if '--async' not in args:
+            return response
+        operation = dict(
+            id=new_id('fd8op'),
+            description=description,
+            created_at=time.time(),
+            done_at=time.time() + float(os.environ.get('FAKE_YC_OPERATION_TIME', '0')),
+            response=response,
+        )
+        self.operations[operation['id']] = operation
+        return dict(id=operation['id'], description=description, done=False)
+
+    def get_operation(self, operation_id):
+        if operation_id not in self.operations:
+            raise FakeYcError('ERROR: operation "%s" not found' % operation_id)
+        operation = dict(self.operations[operation_id])
+        operation['done'] = time.time() >= operation.pop('done_at')
+        if not operation['done']:
+            operation.pop('response')
+        return operation
+
+    def create(self, args):
+        name = option(args, '--name')
+        if name in self.instances:
+            raise FakeYcError('ERROR: instance with name "%s" already exists' % name)
+        boot_disk = parse_pairs(option(args, '--create-boot-disk', ''))
+        disk_id = new_id('fhmdisk')
+        self.disks[disk_id] = dict(id=disk_id, size=str(int(boot_disk.get('size', 10)) * GIB),
+                                   type_id=boot_disk.get('type', 'network-hdd'))
+        address = len(self.instances) + 1
+        vm = dict(
+            id=new_id('fhm'),
+            name=name,
+            description=option(args, '--description', ''),
+            zone_id=option(args, '--zone'),
+            status='RUNNING',
+            platform_id=option(args, '--platform', 'standard-v2'),
+            labels=parse_pairs(option(args, '--labels', '')),
+            resources=dict(memory=str(int(float(option(args, '--memory', '2')) * GIB)),
+                           cores=option(args, '--cores', '2'),
+                           core_fraction=option(args, '--core-fraction', '100')),
+            scheduling_policy=dict(preemptible=True) if '--preemptible' in args else {},
+            boot_disk=dict(disk_id=disk_id),
+            network_interfaces=[dict(primary_v4_address=dict(
+                address='10.%d.%d.%d' % (address // 65536 % 256, address // 256 % 256, address % 256),
+                one_to_one_nat=dict(address='127.0.0.1') if '--public-ip' in args else None))],
+        )
+        self.instances[name] = vm
+        return self.operation(args, 'Create instance', vm)
+
+    def update(self, name, args):
+        vm = self.instance(name)
+        needs_stop = any(arg in args for arg in ('--memory', '--cores', '--core-fraction', '--platform'))
+        needs_stop = needs_stop or any(arg.startswith('--preemptible') for arg in args)
+        if needs_stop and vm['status'] != 'STOPPED':
+            raise FakeYcError('ERROR: instance "%s" must be stopped to change resources' % name)
+        resources = vm['resources']
+        if '--memory' in args:
+            resources['memory'] = str(int(float(option(args, '--memory')) * GIB))
+        if '--cores' in args:
+            resources['cores'] = option(args, '--cores')
+        if '--core-fraction' in args:
+            resources['core_fraction'] = option(args, '--core-fraction')
+        if '--platform' in args:
+            vm['platform_id'] = option(args, '--platform')
+        if '--description' in args:
+            vm['description'] = option(args, '--description')
+        if '--labels' in args:
+            vm['labels'] = parse_pairs(option(args, '--labels'))
+        for arg in args:
+            if arg.startswith('--preemptible='):
+                vm['scheduling_policy'] = dict(preemptible=arg.endswith('true'))
+        return self.operation(args, 'Update instance', vm)
+
+    def set_status(self, name, args, allowed, status, description):
+        vm = self.instance(name)
+        if vm['status'] not in allowed:
+            raise FakeYcError('ERROR: instance "%s" is %s' % (name, vm['status']))
+        vm['status'] = status
+        return self.operation(args, description, vm)
+
+    def instance_command(self, command, args):
+        if command == 'list':
+            return list(self.instances.values())
+        if command == 'create':
+            return self.create(args)
+        name = args[0]
+        if command == 'get':
+            return self.instance(name)
+        if command == 'update':
+            return self.update(name, args)
+        if command == 'stop':
+            return self.set_status(name, args, ('RUNNING', 'STOPPED'), 'STOPPED', 'Stop instance')
+        if command == 'start':
+            return self.set_status(name, args, ('RUNNING', 'STOPPED'), 'RUNNING', 'Start instance')
+        if command == 'restart':
+            return self.set_status(name, args, ('RUNNING',), 'RUNNING', 'Restart instance')
+        if command == 'delete':
+            vm = self.instances.pop(self.instance(name)['name'])
+            self.disks.pop(vm['boot_disk']['disk_id'], None)
+            return self.operation(args, 'Delete instance', {})
+        raise FakeYcError('ERROR: unknown command "compute instance %s"' % command, rc=2)
+
+    def disk_command(self, command, args):
+        if command == 'list':
+            return list(self.disks.values())
+        disk_id = args[0]
+        if disk_id not in self.disks:
+            raise FakeYcError('ERROR: disk "%s" not found' % disk_id)
+        disk = self.disks[disk_id]
+        if command == 'get':
+            return disk
+        if command == 'resize':
+            size = int(option(args, '--size')) * GIB
+            if size < int(disk['size']):
+                raise FakeYcError('ERROR: disk size can not be decreased')
+            disk['size'] = str(size)
+            return self.operation(args, 'Resize disk', disk)
+        raise FakeYcError('ERROR: unknown command "compute disk %s"' % command, rc=2)
+
+    def group(self, name):
+        if name not in self.groups:
+            raise FakeYcError('ERROR: instance group with name "%s" not found' % name)
+        return self.groups[name]
+
+    def apply_group(self, spec, group):
+        """Bring the managed instances of a group to its size at once."""
+        template = spec['instance_template']
+        size = int(spec['scale_policy']['fixed_scale']['size'])
+        instances = group.setdefault('instances', [])
+        del instances[size:]
+        for index in range(len(instances) + 1, size + 1):
+            name = template['name'].replace('{instance.index}', str(index))
+            instances.append(dict(
+                id=new_id('cl1'), instance_id=new_id('fhm'), name=name, fqdn=name + '.ru-central1.internal',
+                status='RUNNING_ACTUAL', zone_id=spec['allocation_policy']['zones'][0]['zone_id'],
+                network_interfaces=[dict(index='0', primary_v4_address=dict(
+                    address='10.1.%d.%d' % (index // 256 % 256, index % 256),
+                    one_to_one_nat=dict(address='127.0.0.1')))]))
+
+    def group_command(self, command, args):
+        if command == 'create':
+            with open(option(args, '--file')) as file:
+                spec = json.load(file)
+            if spec['name'] in self.groups:
+                raise FakeYcError('ERROR: instance group with name "%s" already exists' % spec['name'])
+            group = dict(spec, id=new_id('cl1'), status='ACTIVE')
+            self.apply_group(spec, group)
+            self.groups[spec['name']] = group
+            return self.operation(args, 'Create instance group', spec)
+        group = self.group(option(args, '--name'))
+        if command == 'get':
+            return dict((key, value) for key, value in group.items() if key != 'instances')
+        if command == 'list-instances':
+            return group['instances']
+        if command == 'update':
+            with open(option(args, '--file')) as file:
+                spec = json.load(file)
+            group.update(spec)
+            self.apply_group(spec, group)
+            return self.operation(args, 'Update instance group', spec)
+        if command == 'delete':
+            del self.groups[group['name']]
+            return self.operation(args, 'Delete instance group', {})
+        raise FakeYcError('ERROR: unknown command "compute instance-group %s"' % command, rc=2)
+
+    def call(self, args):
+        if args[:2] == ['config', 'list']:
+            return 'token: fake\ncloud-id: fake-cloud\nfolder-id: fake-folder\n'
+        if args[:2] == ['operation', 'get']:
+            return self.get_operation(args[2])
+        if args[:2] == ['compute', 'instance'] and len(args) > 2:
+            return self.instance_command(args[2], args[3:])
+        if args[:2] == ['compute', 'disk'] and len(args) > 2:
+            return self.disk_command(args[2], args[3:])
+        if args[:2] == ['compute', 'instance-group'] and len(args) > 2:
+            return self.group_command(args[2], args[3:])
+        if args[:3] == ['compute', 'image', 'get-latest-from-family']:
+            return dict(id='fd8image' + args[3][:12], family=args[3], folder_id=option(args, '--folder-id'))
+        if args[:3] == ['vpc', 'subnet', 'list']:
+            return [dict(id='e9bsubnet-' + zone[-1], network_id='enpnetwork', zone_id=zone)
+                    for zone in ('ru-central1-a', 'ru-central1-b', 'ru-central1-d')]
+        raise FakeYcError('ERROR: unknown command "%s"' % ' '.join(args), rc=2)
+
+
+def run(args):
+    """Run one call, return rc, stdout and stderr."""
+    latency = float(os.environ.get('FAKE_YC_LATENCY', '0'))
+    jitter = float(os.environ.get('FAKE_YC_JITTER', '0'))
+    if latency:
+        time.sleep(max(0, latency * random.uniform(1 - jitter, 1 + jitter)))
+    if random.random() < float(os.environ.get('FAKE_YC_FAILURE_RATE', '0')):
+        return 1, '', 'ERROR: rpc error: code = Unavailable desc = fake transient failure\n'
+    call = ' '.join(args)
+    for prefix, error in json.loads(os.environ.get('FAKE_YC_ERRORS') or '{}').items():
+        if call == prefix or call.startswith(prefix + ' '):
+            return 1, '', error + '\n'
+
+    path = os.environ.get('FAKE_YC_STATE', 'fake_yc_state.json')
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path) as file:
+                state = json.load(file)
+        except (IOError, ValueError):
+            state = {}
+        try:
+            output = FakeCloud(state).call(args)
+        except FakeYcError as e:
+            return e.rc, '', e.msg + '\n'
+        with open(path + '.tmp', 'w') as file:
+            json.dump(state, file)
+        os.rename(path + '.tmp', path)
+    if not isinstance(output, str):
+        output = json.dumps(output, indent=2)
+    return 0, output + '\n', ''
+
+
+def main():
+    started = time.time()
+    args = sys.argv[1:]
+    if '--format' in args:
+        index = args.index('--format')
+        args = args[:index] + args[index + 2:]
+    rc, out, err = run(args)
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+    if os.environ.get('FAKE_YC_LOG'):
+        command = ' '.join(args[:3] if args[:1] == ['compute'] else args[:2])
+        record = dict(command=command, args=sys.argv[1:], rc=rc, started=started, elapsed=time.time() - started)
+        with open(os.environ['FAKE_YC_LOG'], 'a') as file:
+            file.write(json.dumps(record) + '\n')
+    sys.exit(rc)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Local mock of the Compute, Operation, VPC and IAM REST APIs.
+
+Implements the requests the api backend (plugins/module_utils/yc_api.py)
+sends, so modules can run with backend=api and api_endpoint pointing here:
+instance list, get by name filter, create, update, start, stop, restart and
+delete, disk list, get and resize, latest image by family, subnet list,
+operation get and IAM token exchange for an OAuth token. Instances are kept
+in memory and returned with camelCase keys like the real API.
+
+Requests need the Bearer token of an earlier token exchange or --iam-token.
+--failure-rate answers a share of requests with 503 Unavailable, --drop-rate
+closes the connection of a share of requests without answering, half of them
+after the request was handled, so the client can not tell whether it ran.
+A request with the Idempotency-Key of an earlier one gets the earlier answer
+and is not run again. GET /fake_stats returns the numbers of connections,
+requests, token exchanges, injected failures, dropped connections and
+replayed answers, they are also printed on exit.
+
+    python benchmarks/fake_yc_api.py --port 8443 --latency 0.05 --failure-rate 0.05 --drop-rate 0.02
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+import json
+import random
+import re
+import signal
+import sys
+import threading
+import time
+import uuid
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GIB = 1073741824
+TOKEN_LIFETIME = 12 * 3600
+ZONES = ('ru-central1-a', 'ru-central1-b', 'ru-central1-d')
+INSTANCE_PATH = re.compile(r'^/compute/v1/instances/([^/:]+)(?::(start|stop|restart))?$')
+DISK_PATH = re.compile(r'^/compute/v1/disks/([^/:]+)$')
+OPERATION_PATH = re.compile(r'^/operations/([^/]+)$')
+
+
+class ApiError(Exception):
+    """Error answer, code is the gRPC code of the body."""
+
+    def __init__(self, status, code, msg):
+        super(ApiError, self).__init__(msg)
+        self.status = status
+        self.code = code
+        self.msg = msg
+
+
+def new_id(prefix):
+    return prefix + uuid.uuid4().hex[:17]
+
+
+def timestamp(value):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(value)) + '.000000Z'
+
+
+def page(items, key, query):
+    """One page of a list answer with nextPageToken, the token is an offset."""
+    size = int(query.get('pageSize', ['1000'])[0])
+    offset = int(query.get('pageToken', ['0'])[0])
+    answer = {key: items[offset:offset + size]}
+    if offset + size < len(items):
+        answer['nextPageToken'] = str(offset + size)
+    return answer
+
+
+class FakeCompute(object):
+    """Instances, disks and operations of one folder."""
+
+    def __init__(self, operation_time):
+        self.operation_time = operation_time
+        self.instances = {}
+        self.disks = {}
+        self.operations = {}
+        self.lock = threading.Lock()
+
+    def operation(self, description, response):
+        operation = dict(id=new_id('fd8op'), description=description, createdAt=timestamp(time.time()),
+                         done_at=time.time() + self.operation_time, response=response)
+        self.operations[operation['id']] = operation
+        return self.get_operation(operation['id'])
+
+    def get_operation(self, operation_id):
+        if operation_id not in self.operations:
+            raise ApiError(404, 5, 'Operation %s not found' % operation_id)
+        operation = dict(self.operations[operation_id])
+        operation['done'] = time.time() >= operation.pop('done_at')
+        if not operation['done']:
+            operation.pop('response')
+        return operation
+
+    def instance(self, instance_id):
+        if instance_id not in self.instances:
+            raise ApiError(404, 5, 'Instance %s not found' % instance_id)
+        return self.instances[instance_id]
+
+    def list_instances(self, query):
+        instances = sorted(self.instances.values(), key=lambda vm: vm['name'])
+        match = re.match(r'^name="(.*)"$', query.get('filter', [''])[0])
+        if match:
+            instances = [vm for vm in instances if vm['name'] == match.group(1)]
+        return page(instances, 'instances', query)
+
+    def create(self, body):
+        if any(vm['name'] == body['name'] for vm in self.instances.values()):
+            raise ApiError(409, 6, 'Instance with name %s already exists' % body['name'])
+        disk_spec = body['bootDiskSpec']['diskSpec']
+        disk_id = new_id('fhmdisk')
+        self.disks[disk_id] = dict(id=disk_id, folderId=body['folderId'], zoneId=body['zoneId'],
+                                   size=disk_spec['size'], typeId=disk_spec['typeId'],
+                                   sourceImageId=disk_spec['imageId'], status='READY')
+        address = len(self.instances) + 1
+        primary = dict(address='10.%d.%d.%d' % (address // 65536 % 256, address // 256 % 256, address % 256))
+        spec = body['networkInterfaceSpecs'][0]
+        if 'oneToOneNatSpec' in spec.get('primaryV4AddressSpec', {}):
+            primary['oneToOneNat'] = dict(address='127.0.0.1', ipVersion='IPV4')
+        vm = dict(
+            id=new_id('fhm'),
+            folderId=body['folderId'],
+            createdAt=timestamp(time.time()),
+            name=body['name'],
+            description=body.get('description', ''),
+            labels=body.get('labels', {}),
+            zoneId=body['zoneId'],
+            platformId=body['platformId'],
+            resources=dict(body['resourcesSpec']),
+            status='RUNNING',
+            bootDisk=dict(mode='READ_WRITE', deviceName=disk_id, autoDelete=True, diskId=disk_id),
+            networkInterfaces=[dict(index='0', subnetId=spec['subnetId'], primaryV4Address=primary)],
+            fqdn=(body.get('hostname') or body['name']) + '.ru-central1.internal',
+            schedulingPolicy=body.get('schedulingPolicy', {}),
+        )
+        self.instances[vm['id']] = vm
+        return self.operation('Create instance', vm)
+
+    def update(self, instance_id, body):
+        vm = self.instance(instance_id)
+        mask = body.get('updateMask', '').split(',')
+        if any(not field.startswith(('labels', 'description')) for field in mask if field) and \
+                vm['status'] != 'STOPPED':
+            raise ApiError(400, 9, 'Instance %s must be stopped to change resources' % vm['name'])
+        for field in mask:
+            if field.startswith('resourcesSpec.'):
+                key = field.split('.', 1)[1]
+                vm['resources'][key] = body['resourcesSpec'][key]
+            elif field == 'platformId':
+                vm['platformId'] = body['platformId']
+            elif field == 'schedulingPolicy.preemptible':
+                vm['schedulingPolicy'] = dict(preemptible=body['schedulingPolicy']['preemptible'])
+            elif field in ('description', 'labels'):
+                vm[field] = body[field]
+        return self.operation('Update instance', vm)
+
+    def set_status(self, instance_id, action):
+        vm = self.instance(instance_id)
+        if action == 'restart' and vm['status'] != 'RUNNING':
+            raise ApiError(400, 9, 'Instance %s is %s' % (vm['name'], vm['status']))
+        vm['status'] = 'STOPPED' if action == 'stop' else 'RUNNING'
+        nat = vm['networkInterfaces'][0]['primaryV4Address'].get('oneToOneNat')
+        if action in ('start', 'restart') and nat:
+            # a dynamic public address changes with every start
+            nat['address'] = '127.0.%d.%d' % (random.randint(1, 254), random.randint(1, 254))
+        return self.operation(action.capitalize() + ' instance', vm)
+
+    def delete(self, instance_id):
+        vm = self.instances.pop(self.instance(instance_id)['id'])
+        self.disks.pop(vm['bootDisk']['diskId'], None)
+        return self.operation('Delete instance', {})
+
+    def disk(self, disk_id):
+        if disk_id not in self.disks:
+            raise ApiError(404, 5, 'Disk %s not found' % disk_id)
+        return self.disks[disk_id]
+
+    def resize_disk(self, disk_id, body):
+        disk = self.disk(disk_id)
+        if int(body['size']) < int(disk['size']):
+            raise ApiError(400, 3, 'Disk size can not be decreased')
+        disk['size'] = body['size']
+        return self.operation('Update disk', disk)
+
+    def handle(self, method, path, query, body):
+        if path == '/compute/v1/instances':
+            if method == 'GET':
+                return self.list_instances(query)
+            return self.create(body)
+        match = INSTANCE_PATH.match(path)
+        if match:
+            instance_id, action = match.groups()
+            if action:
+                return self.set_status(instance_id, action)
+            if method == 'GET':
+                return self.instance(instance_id)
+            if method == 'PATCH':
+                return self.update(instance_id, body)
+            return self.delete(instance_id)
+        if path == '/compute/v1/disks':
+            return page(sorted(self.disks.values(), key=lambda disk: disk['id']), 'disks', query)
+        match = DISK_PATH.match(path)
+        if match:
+            if method == 'PATCH':
+                return self.resize_disk(match.group(1), body)
+            return self.disk(match.group(1))
+        if path == '/compute/v1/images:latestByFamily':
+            family = query['family'][0]
+            return dict(id='fd8image' + family[:12], family=family, folderId=query['folderId'][0])
+        if path == '/vpc/v1/subnets':
+            return dict(subnets=[dict(id='e9bsubnet-' + zone[-1], networkId='enpnetwork', zoneId=zone)
+                                 for zone in ZONES])
+        match = OPERATION_PATH.match(path)
+        if match:
+            return self.get_operation(match.group(1))
+        raise ApiError(404, 12, 'Unknown method %s %s' % (method, path))
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.count('connections')
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def count(self, key):
+        with self.server.compute.lock:
+            self.server.stats[key] += 1
+
+    def reply(self, status, answer):
+        data = json.dumps(answer).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def issue_token(self, body):
+        if not body.get('yandexPassportOauthToken'):
+            self.reply(400, dict(code=3, message='yandexPassportOauthToken is required'))
+            return
+        self.count('tokens')
+        token = 't1.fake.' + uuid.uuid4().hex
+        with self.server.compute.lock:
+            self.server.tokens.add(token)
+        self.reply(200, dict(iamToken=token, expiresAt=timestamp(time.time() + TOKEN_LIFETIME)))
+
+    def handle_request(self, method):
+        parsed = urlparse(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length).decode('utf-8')) if length else {}
+        if parsed.path == '/fake_stats':
+            with self.server.compute.lock:
+                self.reply(200, self.server.stats)
+            return
+        self.count('requests')
+        drop = random.random() < self.server.drop_rate
+        if drop and random.random() < 0.5:
+            # the request is read but neither handled nor answered
+            self.drop()
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if random.random() < self.server.failure_rate:
+            self.count('failures')
+            self.reply(503, dict(code=14, message='fake transient failure'))
+            return
+        if parsed.path == '/iam/v1/tokens' and method == 'POST':
+            self.issue_token(body)
+            return
+        authorization = self.headers.get('Authorization', '')
+        with self.server.compute.lock:
+            valid = authorization[len('Bearer '):] in self.server.tokens
+        if not authorization.startswith('Bearer ') or not valid:
+            self.reply(401, dict(code=16, message='The token is invalid'))
+            return
+        key = self.headers.get('Idempotency-Key')
+        with self.server.compute.lock:
+            replay = self.server.replies.get(key) if key else None
+            if replay is None:
+                try:
+                    replay = 200, self.server.compute.handle(method, parsed.path, parse_qs(parsed.query), body)
+                except ApiError as e:
+                    replay = e.status, dict(code=e.code, message=e.msg)
+                if key:
+                    self.server.replies[key] = replay
+            else:
+                self.server.stats['replayed'] += 1
+        if drop:
+            # handled, but the answer is lost
+            self.drop()
+            return
+        self.reply(*replay)
+
+    def drop(self):
+        self.count('dropped')
+        self.close_connection = True
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PATCH(self):
+        self.handle_request('PATCH')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--iam-token', action='append', default=[], help='IAM token accepted without an exchange')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds every request takes')
+    parser.add_argument('--operation-time', type=float, default=0.0, help='seconds an operation takes to finish')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of requests answered with 503')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='share of requests whose connection is closed')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.compute = FakeCompute(args.operation_time)
+    server.tokens = set(args.iam_token)
+    server.stats = dict(connections=0, requests=0, tokens=0, failures=0, dropped=0, replayed=0)
+    server.replies = {}
+    server.latency = args.latency
+    server.failure_rate = args.failure_rate
+    server.drop_rate = args.drop_rate
+    server.verbose = args.verbose
+    signal.signal(signal.SIGTERM, interrupt)
+    print('Listening on %s:%d' % (args.host, server.server_address[1]))
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print('%(connections)d connections, %(requests)d requests, %(tokens)d token exchanges, '
+              '%(failures)d failures, %(dropped)d dropped' % server.stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    DOCUMENTATION = r'''
+options:
+    backend:
+        description:
+        - How to talk to Yandex cloud.
+        - "I(backend=cli): run the yc command-line utility for every call."
+        - "I(backend=api): call the Compute REST API directly over keep-alive connections shared
+          by all calls of the task."
+        type: str
+        choices: [cli, api]
+        default: cli
+    folder_id:
+        description:
+        - Folder to work in with I(backend=api).
+        - Falls back to the C(YC_FOLDER_ID) environment variable.
+        type: str
+        required: no
+    iam_token:
+        description:
+        - IAM token for I(backend=api). Falls back to the C(YC_IAM_TOKEN) environment variable.
+        - If not set, a token is requested with I(oauth_token) or with C(yc iam create-token)
+          and stored in I(token_cache) until it expires.
+        type: str
+        required: no
+    oauth_token:
+        description:
+        - OAuth token exchanged for an IAM token with I(backend=api).
+        - Falls back to the C(YC_TOKEN) environment variable.
+        type: str
+        required: no
+    token_cache:
+        description:
+        - File the IAM token obtained with I(backend=api) is cached in until it expires.
+        - The token is only reused with the same I(oauth_token) or, for a token from C(yc iam create-token),
+          the same active yc profile.
+        type: path
+        required: no
+        default: ~/.cache/yc_cvl/iam_token.json
+    api_endpoint:
+        description:
+        - Base URL used instead of the public API endpoints with I(backend=api), for example
+          C(http://127.0.0.1:8080) for a local mock server.
+        type: str
+        required: no
+    api_timeout:
+        description:
+        - Timeout in seconds of a single HTTP request with I(backend=api).
+        type: int
+        required: no
+        default: 60
+    trace_file:
+        description:
+        - If set, the timings of all yc calls or API requests are appended to this file as one line of
+          OpenTelemetry (OTLP JSON) trace spans per run, with a root span for the run and a child span per call.
+        type: path
+        required: no
+    retries:
+        description:
+        - How many times a failed yc call or API request is repeated.
+        - Only transient errors (unavailable service, timeouts, another operation in progress on the resource)
+          and exhausted quotas are retried, other errors fail at once.
+        type: int
+        required: no
+        default: 5
+    retry_delay:
+        description:
+        - Base delay in seconds between attempts. The delay doubles with every attempt and a random part of it
+          is used, so parallel workers do not retry in step.
+        - After a quota error the delay is longer and all workers of the task wait.
+        type: float
+        required: no
+        default: 1
+    retry_max_delay:
+        description:
+        - Upper bound in seconds of the delay between attempts.
+        type: float
+        required: no
+        default: 30
+    rate_limit:
+        description:
+        - Maximum yc calls or API requests per second, shared by all parallel workers of a task.
+        - C(0) means no limit.
+        type: float
+        required: no
+        default: 0
+    rate_burst:
+        description:
+        - How many calls may be made at once above I(rate_limit) after an idle period.
+        type: int
+        required: no
+        default: 10
+'''
+
+    PREFLIGHT = r'''
+options:
+    preflight:
+        description:
+        - How to check that yc is installed and configured before doing anything.
+        - "I(preflight=always): run C(yc config list) on every task."
+        - "I(preflight=cached): reuse a successful check stored in I(preflight_cache) for I(preflight_ttl)
+          seconds, or until the yc config file (C(~/.config/yandex-cloud/config.yaml)) changes."
+        - "I(preflight=skip): do not check at all."
+        - With I(backend=api) the check resolves the IAM token instead and is never cached here.
+        type: str
+        choices: [skip, cached, always]
+        default: cached
+    preflight_ttl:
+        description:
+        - Seconds a cached check stays valid.
+        type: int
+        required: no
+        default: 3600
+    preflight_cache:
+        description:
+        - State file on the controller the check result, folder and cloud ids are cached in.
+        type: path
+        required: no
+        default: ~/.cache/yc_cvl/preflight.json
+'''
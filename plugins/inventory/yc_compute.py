@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+name: yc_compute
+
+short_description: Yandex cloud compute instances inventory source
+
+version_added: "1.1.0"
+
+description:
+    - Lists the compute instances of a folder with one call and adds them as hosts.
+    - Hosts are grouped by instance description (C(clickhouse), C(vector), C(lighthouse) for the
+      site created by C(create_site.yml)) and by labels.
+    - C(ansible_host) is the one-to-one NAT address of the first network interface, or its
+      private address when the instance has no public one.
+    - The listing can be stored with an inventory cache plugin, so later runs do not call the cloud
+      until I(cache_timeout) expires.
+    - Uses a YAML configuration file that ends with C(yc_compute.yml) or C(yc_compute.yaml).
+
+options:
+    plugin:
+        description: Token that ensures this is a source file for this plugin.
+        required: true
+        choices: ['timych.yandex_cloud_cvl.yc_compute']
+    group_by_description:
+        description:
+        - Add every host to a group named after the instance description.
+        type: bool
+        default: true
+    group_by_labels:
+        description:
+        - Add every host to a C(label_<key>_<value>) group for each of its labels.
+        - The C(cvl-spec) fingerprint label set by the yc modules is skipped.
+        type: bool
+        default: true
+    running_only:
+        description:
+        - Only add instances in C(RUNNING) status.
+        type: bool
+        default: false
+
+extends_documentation_fragment:
+    - constructed
+    - inventory_cache
+    - timych.yandex_cloud_cvl.yc_backend
+
+author:
+    - Timur Alekseev (@Timych84)
+'''
+
+EXAMPLES = r'''
+# yc_compute.yml
+plugin: timych.yandex_cloud_cvl.yc_compute
+cache: true
+cache_plugin: ansible.builtin.jsonfile
+cache_connection: ~/.cache/yc_cvl/inventory
+cache_timeout: 600
+compose:
+  ansible_user: "'yc-user'"
+
+# Same through the REST API
+plugin: timych.yandex_cloud_cvl.yc_compute
+backend: api
+folder_id: b1gxxxxxxxxxxxxxxxxx
+running_only: true
+keyed_groups:
+  - key: yc_zone_id
+    prefix: zone
+'''
+
+import subprocess
+
+from ansible.errors import AnsibleError
+from ansible.module_utils.common.text.converters import to_text
+from ansible.plugins.inventory import BaseInventoryPlugin, Cacheable, Constructable
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.calls import write_trace
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc import (
+    FINGERPRINT_LABEL,
+    YcError,
+    backend_argument_spec,
+    instance_address,
+    yc_client,
+)
+
+
+class _CommandRunner(object):
+    """Minimal stand-in for AnsibleModule, all the yc backends need from it."""
+
+    def __init__(self, params):
+        self.params = params
+
+    def run_command(self, args):
+        try:
+            process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            return 127, '', to_text(e)
+        out, err = process.communicate()
+        return process.returncode, to_text(out), to_text(err)
+
+
+class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
+
+    NAME = 'timych.yandex_cloud_cvl.yc_compute'
+
+    def verify_file(self, path):
+        valid = False
+        if super(InventoryModule, self).verify_file(path):
+            if path.endswith(('yc_compute.yml', 'yc_compute.yaml')):
+                valid = True
+        return valid
+
+    def _list_instances(self):
+        params = dict((key, self.get_option(key)) for key in backend_argument_spec())
+        cli = yc_client(_CommandRunner(params))
+        try:
+            return cli.list_instances()
+        except YcError as e:
+            raise AnsibleError('Failed to list Yandex cloud instances: %s' % e.msg)
+        finally:
+            if params['trace_file']:
+                write_trace(params['trace_file'], cli.calls, 'yc_compute')
+
+    def _populate(self, instances):
+        strict = self.get_option('strict')
+        for vm in instances:
+            if self.get_option('running_only') and vm.get('status') != 'RUNNING':
+                continue
+            host = self.inventory.add_host(vm['name'])
+            hostvars = dict(
+                yc_id=vm.get('id'),
+                yc_status=vm.get('status'),
+                yc_zone_id=vm.get('zone_id'),
+                yc_description=vm.get('description'),
+                yc_labels=vm.get('labels') or {},
+                host_description=vm.get('description'),
+            )
+            address = instance_address(vm)
+            if address:
+                hostvars['ansible_host'] = address
+            for key, value in hostvars.items():
+                self.inventory.set_variable(host, key, value)
+
+            if self.get_option('group_by_description') and vm.get('description'):
+                group = self.inventory.add_group(self._sanitize_group_name(vm['description']))
+                self.inventory.add_child(group, host)
+            if self.get_option('group_by_labels'):
+                for key, value in hostvars['yc_labels'].items():
+                    if key == FINGERPRINT_LABEL:
+                        continue
+                    group = self.inventory.add_group(self._sanitize_group_name('label_%s_%s' % (key, value)))
+                    self.inventory.add_child(group, host)
+
+            self._set_composite_vars(self.get_option('compose'), hostvars, host, strict=strict)
+            self._add_host_to_composed_groups(self.get_option('groups'), hostvars, host, strict=strict)
+            self._add_host_to_keyed_groups(self.get_option('keyed_groups'), hostvars, host, strict=strict)
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path, cache)
+        self._read_config_data(path)
+
+        cache_key = self.get_cache_key(path)
+        user_cache_setting = self.get_option('cache')
+        attempt_to_read_cache = user_cache_setting and cache
+        cache_needs_update = user_cache_setting and not cache
+
+        instances = None
+        if attempt_to_read_cache:
+            try:
+                instances = self._cache[cache_key]
+            except KeyError:
+                cache_needs_update = True
+        if instances is None:
+            instances = self._list_instances()
+        if cache_needs_update:
+            self._cache[cache_key] = instances
+
+        self._populate(instances)
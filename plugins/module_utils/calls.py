@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import binascii
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+
+class CallLog(object):
+    """Timings of the yc calls or API requests of one module run.
+
+    Calls made inside span() are tagged with the span name, batch modules use
+    it to tell the calls of different instances apart.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.calls = []
+        self.spans = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name):
+        started = time.time()
+        self._local.span = name
+        try:
+            yield
+        finally:
+            self._local.span = None
+            with self._lock:
+                self.spans.append(dict(name=name, started=started, duration=time.time() - started))
+
+    def record(self, started, rc, operation_id=None, attempt=0, **target):
+        """Add a finished call, target is cmd=argv or method and url."""
+        call = dict(target, started=round(started, 3), duration=round(time.time() - started, 3), rc=rc)
+        if operation_id:
+            call['operation_id'] = operation_id
+        if attempt:
+            call['attempt'] = attempt
+        span = getattr(self._local, 'span', None)
+        if span:
+            call['span'] = span
+        with self._lock:
+            self.calls.append(call)
+
+    def timings(self):
+        return sorted(self.calls, key=lambda call: call['started'])
+
+
+def _otel_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, (list, tuple)):
+        return {'arrayValue': {'values': [_otel_value(item) for item in value]}}
+    return {'stringValue': str(value)}
+
+
+def _otel_span(trace_id, parent_id, name, started, duration, attributes, error=False, client=False):
+    span = dict(
+        traceId=trace_id,
+        spanId=binascii.hexlify(os.urandom(8)).decode(),
+        name=name,
+        kind=3 if client else 1,
+        startTimeUnixNano=str(int(started * 1e9)),
+        endTimeUnixNano=str(int((started + duration) * 1e9)),
+        attributes=[dict(key=key, value=_otel_value(value)) for key, value in sorted(attributes.items())
+                    if value is not None],
+        status=dict(code=2 if error else 1),
+    )
+    if parent_id:
+        span['parentSpanId'] = parent_id
+    return span
+
+
+def write_trace(path, call_log, name, failed=False):
+    """Append the calls of a run to path as one OTLP JSON trace line: a root
+    span for the run, a span per span() block and one per call."""
+    trace_id = binascii.hexlify(os.urandom(16)).decode()
+    root = _otel_span(trace_id, None, name, call_log.started, time.time() - call_log.started,
+                      {'ansible.module': name}, failed)
+    spans = [root]
+    parents = {}
+    for span in call_log.spans:
+        spans.append(_otel_span(trace_id, root['spanId'], span['name'], span['started'], span['duration'],
+                                {'yc.instance': span['name']}))
+        parents[span['name']] = spans[-1]['spanId']
+    for call in call_log.timings():
+        if 'cmd' in call:
+            call_name = ' '.join(arg for arg in call['cmd'][:4] if not arg.startswith('-'))
+            attributes = {'process.command_args': call['cmd'], 'process.exit.code': call['rc']}
+        else:
+            call_name = '%s %s' % (call['method'], re.sub(r'\?.*', '', call['url']))
+            attributes = {'http.request.method': call['method'], 'url.full': call['url'],
+                          'http.response.status_code': call['rc']}
+        attributes['yc.operation_id'] = call.get('operation_id')
+        spans.append(_otel_span(trace_id, parents.get(call.get('span'), root['spanId']), call_name,
+                                call['started'], call['duration'], attributes,
+                                not (call['rc'] == 0 or 200 <= call['rc'] < 300), client=True))
+    trace = dict(resourceSpans=[dict(
+        resource=dict(attributes=[dict(key='service.name', value=_otel_value('timych.yandex_cloud_cvl'))]),
+        scopeSpans=[dict(scope=dict(name='timych.yandex_cloud_cvl'), spans=spans)],
+    )])
+    path = os.path.expanduser(path)
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'a') as file:
+        file.write(json.dumps(trace, separators=(',', ':')) + '\n')
+
+
+def finish_calls(module, cli, result, name, failed=False):
+    """Add the call timings to a module result and export them if asked."""
+    result['timings'] = cli.calls.timings()
+    if module.params.get('trace_file'):
+        try:
+            write_trace(module.params['trace_file'], cli.calls, name, failed)
+        except (IOError, OSError) as e:
+            module.warn('Can not write trace file %s: %s' % (module.params['trace_file'], e))
+    return result
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import re
+import ssl
+import time
+
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves.urllib.parse import urlencode
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.calls import CallLog
+
+# Server error codes of statements that found their work already done
+TABLE_ALREADY_EXISTS = 57
+DATABASE_ALREADY_EXISTS = 82
+UNKNOWN_TABLE = 60
+UNKNOWN_DATABASE = 81
+
+
+def clickhouse_argument_spec():
+    """Connection options of modules talking to the ClickHouse HTTP interface."""
+    return dict(
+        login_host=dict(type='str', required=False, default='localhost'),
+        login_port=dict(type='int', required=False, default=8123),
+        login_user=dict(type='str', required=False, default='default'),
+        login_password=dict(type='str', required=False, default='', no_log=True),
+        https=dict(type='bool', required=False, default=False),
+        validate_certs=dict(type='bool', required=False, default=True),
+        timeout=dict(type='int', required=False, default=30),
+    )
+
+
+class ClickHouseError(Exception):
+
+    def __init__(self, msg, code=None, statement=None):
+        super(ClickHouseError, self).__init__(msg)
+        self.msg = msg
+        self.code = code
+        self.statement = statement
+
+    def to_result(self):
+        result = dict(msg=self.msg)
+        if self.code is not None:
+            result['code'] = self.code
+        if self.statement is not None:
+            result['statement'] = self.statement
+        return result
+
+
+class ClickHouseClient(object):
+    """ClickHouse HTTP interface over one keep-alive connection.
+
+    Every statement is one POST request, the connection is opened once and
+    reopened only if the server closed it.
+    """
+
+    def __init__(self, params):
+        self.host = params['login_host']
+        self.port = params['login_port']
+        self.https = params['https']
+        self.validate_certs = params['validate_certs']
+        self.timeout = params['timeout']
+        self.headers = {'X-ClickHouse-User': params['login_user'], 'X-ClickHouse-Key': params['login_password'] or ''}
+        self.calls = CallLog()
+        self._conn = None
+
+    def _connect(self):
+        if not self.https:
+            return http_client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        context = ssl.create_default_context()
+        if not self.validate_certs:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return http_client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=context)
+
+    def _post(self, path, body):
+        # a kept connection may have been closed by the server, retry once on a fresh one
+        for attempt in (0, 1):
+            if self._conn is None:
+                self._conn = self._connect()
+            try:
+                self._conn.request('POST', path, body=body.encode('utf-8'), headers=self.headers)
+                response = self._conn.getresponse()
+                return response.status, response.getheader('X-ClickHouse-Exception-Code'), response.read()
+            except (http_client.HTTPException, OSError) as e:
+                self._conn.close()
+                self._conn = None
+                if attempt:
+                    raise ClickHouseError('Can not connect to ClickHouse at %s:%s: %s' % (self.host, self.port, e))
+
+    def execute(self, statement, settings=None):
+        """Run one statement and return the response text."""
+        path = '/?' + urlencode(settings) if settings else '/'
+        started = time.time()
+        try:
+            status, code, data = self._post(path, statement)
+        except ClickHouseError:
+            self.calls.record(started, -1, method='POST', statement=statement)
+            raise
+        self.calls.record(started, status, method='POST', statement=statement)
+        text = data.decode('utf-8', 'replace')
+        if status != 200:
+            if code is None:
+                match = re.search(r'Code: (\d+)', text)
+                code = match.group(1) if match else None
+            raise ClickHouseError('ClickHouse error: ' + text.strip(), code=int(code) if code else None,
+                                  statement=statement)
+        return text
+
+    def select(self, query):
+        """Run a SELECT and return its rows as dicts."""
+        return json.loads(self.execute(query + ' FORMAT JSON'))['data']
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def quote_identifier(name):
+    return '`%s`' % name.replace('\\', '\\\\').replace('`', '\\`')
+
+
+def quote_string(value):
+    return "'%s'" % value.replace('\\', '\\\\').replace("'", "\\'")
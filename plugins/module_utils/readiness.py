@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import socket
+import time
+
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
+from ansible.module_utils.urls import open_url
+
+
+def probe_port(host, port, connect_timeout=5, banner=None):
+    """Try one TCP connection, optionally reading a banner that must start with ``banner``.
+
+    Returns None when the port is ready, otherwise a short error string.
+    """
+    try:
+        sock = socket.create_connection((host, port), timeout=connect_timeout)
+    except (socket.error, socket.timeout) as e:
+        return str(e)
+    try:
+        if banner:
+            sock.settimeout(connect_timeout)
+            data = sock.recv(256)
+            if not data.startswith(banner.encode('ascii')):
+                return 'unexpected banner: %r' % data[:64]
+        return None
+    except (socket.error, socket.timeout) as e:
+        return str(e)
+    finally:
+        sock.close()
+
+
+def wait_for_port(host, port, deadline, interval=2, connect_timeout=5, banner=None, started=None):
+    """Probe host:port until it is ready or ``deadline`` (time.time() value) passes.
+
+    Returns a dict with ready, seconds elapsed since ``started`` (default: now),
+    attempts and the last error.
+    """
+    if started is None:
+        started = time.time()
+    attempts = 0
+    while True:
+        attempts += 1
+        timeout = max(min(connect_timeout, deadline - time.time()), 0.1)
+        error = probe_port(host, port, timeout, banner)
+        now = time.time()
+        if error is None or now + interval > deadline:
+            return dict(host=host, port=port, ready=error is None,
+                        elapsed=round(now - started, 3), attempts=attempts, error=error)
+        time.sleep(interval)
+
+
+def probe_http(url, timeout=5, validate_certs=True):
+    """GET ``url`` once, None when it answers with a 2xx status, otherwise a short error string."""
+    try:
+        open_url(url, timeout=timeout, validate_certs=validate_certs, follow_redirects='safe').read()
+        return None
+    except HTTPError as e:
+        return 'HTTP %d' % e.code
+    except URLError as e:
+        return str(e.reason)
+    except (http_client.HTTPException, socket.error, socket.timeout) as e:
+        return str(e)
+
+
+def wait_for_http(url, deadline, interval=2, connect_timeout=5, validate_certs=True, started=None):
+    """Request ``url`` until it answers with a 2xx status or ``deadline`` passes.
+
+    Returns a dict like wait_for_port() with url instead of host and port.
+    """
+    if started is None:
+        started = time.time()
+    attempts = 0
+    while True:
+        attempts += 1
+        timeout = max(min(connect_timeout, deadline - time.time()), 0.1)
+        error = probe_http(url, timeout, validate_certs)
+        now = time.time()
+        if error is None or now + interval > deadline:
+            return dict(url=url, ready=error is None,
+                        elapsed=round(now - started, 3), attempts=attempts, error=error)
+        time.sleep(interval)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import copy
+import fnmatch
+import math
+import re
+
+SECTIONS = ('sources', 'transforms', 'sinks')
+
+# sinks that send events in batches and take the batch and buffer options
+BATCHED_SINKS = frozenset([
+    'aws_s3', 'clickhouse', 'datadog_logs', 'elasticsearch', 'gcp_cloud_storage', 'http', 'loki',
+    'splunk_hec_logs', 'vector',
+])
+
+# options without which vector refuses to load a component
+REQUIRED_OPTIONS = {
+    'clickhouse': ('endpoint', 'table'),
+    'console': ('encoding',),
+    'demo_logs': ('format',),
+    'file': ('path', 'encoding'),
+    'http': ('uri', 'encoding'),
+    'socket': ('mode',),
+    'syslog': ('mode',),
+}
+
+# smallest disk buffer vector accepts
+DISK_BUFFER_MIN_SIZE = 268435488
+MEMORY_BUFFER_MIN_EVENTS = 500
+BATCH_MIN_BYTES = 1048576
+
+COMPONENT_ID = re.compile(r'^[^.\s]+$')
+
+
+def _input_exists(name, upstream):
+    if any(char in name for char in '*?['):
+        return bool(fnmatch.filter(upstream, name))
+    # named outputs of transforms, like route.<name> or remap.dropped
+    return name in upstream or name.split('.', 1)[0] in upstream
+
+
+def validate_pipeline(config):
+    """Check a vector config without vector, return the list of errors and
+    the list of warnings."""
+    errors = []
+    warnings = []
+    if not isinstance(config, dict):
+        return ['config must be a dict'], warnings
+    for section in ('sources', 'sinks'):
+        if not isinstance(config.get(section), dict) or not config[section]:
+            errors.append('config has no %s' % section)
+    components = {}
+    for section in SECTIONS:
+        items = config.get(section) or {}
+        if not isinstance(items, dict):
+            errors.append('%s must be a dict' % section)
+            continue
+        for component_id, component in items.items():
+            name = '%s.%s' % (section, component_id)
+            if not COMPONENT_ID.match(component_id):
+                errors.append('%s: component id must not contain dots or spaces' % name)
+            if component_id in components:
+                errors.append('%s: id is already used by %s' % (name, components[component_id][0]))
+                continue
+            if not isinstance(component, dict) or not component.get('type'):
+                errors.append('%s: type is required' % name)
+                continue
+            components[component_id] = (section, component)
+            for option in REQUIRED_OPTIONS.get(component['type'], ()):
+                if component.get(option) in (None, '', {}, []):
+                    errors.append('%s: option %s is required for type %s' % (name, option, component['type']))
+            if component['type'] == 'clickhouse' and component.get('endpoint') and \
+                    not re.match(r'^https?://', str(component['endpoint'])):
+                errors.append('%s: endpoint must be an http or https URL' % name)
+
+    upstream = [component_id for component_id, (section, component) in components.items() if section != 'sinks']
+    consumed = set()
+    for component_id, (section, component) in components.items():
+        if section == 'sources':
+            continue
+        inputs = component.get('inputs')
+        if not isinstance(inputs, list) or not inputs:
+            errors.append('%s.%s: inputs are required' % (section, component_id))
+            continue
+        for name in inputs:
+            if not _input_exists(str(name), upstream):
+                errors.append('%s.%s: input %s is not a source or transform' % (section, component_id, name))
+            consumed.update(fnmatch.filter(upstream, str(name)) or [str(name).split('.', 1)[0]])
+        if component_id in [str(name).split('.', 1)[0] for name in inputs]:
+            errors.append('%s.%s: component is its own input' % (section, component_id))
+
+    # a transform reachable from itself never gets events
+    graph = dict((component_id, [str(name).split('.', 1)[0] for name in component.get('inputs') or []])
+                 for component_id, (section, component) in components.items() if section == 'transforms')
+    visiting = set()
+    done = set()
+
+    def visit(node, path):
+        if node in done or node not in graph:
+            return
+        if node in visiting:
+            errors.append('transforms form a cycle: ' + ' -> '.join(path[path.index(node):] + [node]))
+            return
+        visiting.add(node)
+        for parent in graph[node]:
+            visit(parent, path + [node])
+        visiting.discard(node)
+        done.add(node)
+
+    for node in sorted(graph):
+        visit(node, [])
+
+    for component_id in sorted(set(upstream) - consumed):
+        warnings.append('%s.%s: output is not used by any transform or sink' % (components[component_id][0],
+                                                                                   component_id))
+    return errors, warnings
+
+
+def merge_defaults(defaults, values):
+    """Deep merge of two dicts where values win over defaults."""
+    merged = copy.deepcopy(defaults)
+    for key, value in values.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_defaults(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def sink_tuning(events_per_second, event_size=512, batch_timeout=1.0, buffer_type='disk', buffer_seconds=300):
+    """Batch and buffer options sized for a sustained events_per_second.
+
+    A batch holds what arrives within batch_timeout, so a sink sends about
+    one request per batch_timeout. The buffer holds buffer_seconds of
+    events while the sink is down and blocks the sources when full.
+    """
+    max_events = max(int(math.ceil(events_per_second * batch_timeout)), 1)
+    tuning = dict(batch=dict(
+        max_events=max_events,
+        max_bytes=max(max_events * event_size * 2, BATCH_MIN_BYTES),
+        timeout_secs=batch_timeout,
+    ))
+    if buffer_type == 'disk':
+        tuning['buffer'] = dict(type='disk', when_full='block',
+                                max_size=max(int(events_per_second * event_size * buffer_seconds),
+                                             DISK_BUFFER_MIN_SIZE))
+    else:
+        tuning['buffer'] = dict(type='memory', when_full='block',
+                                max_events=max(int(events_per_second * buffer_seconds), MEMORY_BUFFER_MIN_EVENTS))
+    return tuning
+
+
+def tune_pipeline(config, events_per_second, **kwargs):
+    """Return a copy of config with batch and buffer options of the batched
+    sinks set for events_per_second, and the options set per sink. Options
+    given in config are kept."""
+    config = copy.deepcopy(config)
+    tuned = {}
+    if not events_per_second:
+        return config, tuned
+    defaults = sink_tuning(events_per_second, **kwargs)
+    for sink_id, sink in sorted((config.get('sinks') or {}).items()):
+        if isinstance(sink, dict) and sink.get('type') in BATCHED_SINKS:
+            config['sinks'][sink_id] = merge_defaults(defaults, sink)
+            tuned[sink_id] = dict((key, config['sinks'][sink_id][key]) for key in defaults)
+    return config, tuned
@@ -0,0 +1,837 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.calls import CallLog
+
+GIB = 1073741824
+YC_CONFIG_FILE = '~/.config/yandex-cloud/config.yaml'
+
+
+class YcError(Exception):
+    """Failed yc call or impossible state transition for one instance."""
+
+    def __init__(self, msg, rc=None, stdout=None, stderr=None, cmd=None):
+        super(YcError, self).__init__(msg)
+        self.msg = msg
+        self.rc = rc
+        self.stdout = stdout
+        self.stderr = stderr
+        self.cmd = cmd
+
+    def to_result(self):
+        result = dict(msg=self.msg)
+        for key in ('rc', 'stdout', 'stderr', 'cmd'):
+            value = getattr(self, key)
+            if value is not None:
+                result[key] = value
+        return result
+
+
+def instance_argument_spec():
+    """Options describing one compute instance, shared by yc and yc_instances."""
+    return dict(
+        name=dict(type='str', required=True),
+        description=dict(type='str', required=False),
+        state=dict(
+            type='str',
+            choices=[
+                'present',
+                'terminated',
+                'running',
+                'started',
+                'stopped',
+                'restarted',
+                'rebooted',
+                'absent'],
+            default='present'),
+        update=dict(type='bool', required=False, default=False),
+        fingerprint=dict(type='bool', required=False, default=True),
+        wait=dict(type='bool', required=False, default=True),
+        zone=dict(type='str', required=True),
+        ssh_key=dict(type='str', required=False),
+        hostname=dict(type='str', required=False),
+        labels=dict(type='dict', required=False),
+        platform=dict(type='str', required=False),
+        memory=dict(type='int', required=False, default="2"),
+        cores=dict(type='int', required=False, default="2"),
+        core_fraction=dict(type='int', required=False, default="20", choices=[5, 20, 50, 100]),
+        public_ip=dict(type='bool', required=False, default=True),
+        preemptible=dict(type='bool', required=False, default=False),
+        boot_disk=dict(type='dict', required=False, default={}, options=dict(
+            image_family=dict(type='str', required=False, default="centos-stream-8"),
+            image_folder_id=dict(type='str', required=False, default="standard-images"),
+            size=dict(type='int', required=False, default="10"),
+            type=dict(type='str', required=False, default="network-hdd"),
+        )),
+    )
+
+
+def backend_argument_spec():
+    """Options selecting and configuring the backend, see the yc_backend doc fragment."""
+    return dict(
+        backend=dict(type='str', required=False, choices=['cli', 'api'], default='cli'),
+        folder_id=dict(type='str', required=False),
+        iam_token=dict(type='str', required=False, no_log=True),
+        oauth_token=dict(type='str', required=False, no_log=True),
+        token_cache=dict(type='path', required=False, default='~/.cache/yc_cvl/iam_token.json'),
+        api_endpoint=dict(type='str', required=False),
+        api_timeout=dict(type='int', required=False, default=60),
+        trace_file=dict(type='path', required=False),
+        retries=dict(type='int', required=False, default=5),
+        retry_delay=dict(type='float', required=False, default=1),
+        retry_max_delay=dict(type='float', required=False, default=30),
+        rate_limit=dict(type='float', required=False, default=0),
+        rate_burst=dict(type='int', required=False, default=10),
+    )
+
+
+# Errors worth another attempt: transient server or network trouble and
+# conflicts with an operation still running on the same resource. Quota
+# errors are retried too, but slow down every worker of the run.
+QUOTA_ERRORS = re.compile(r'ResourceExhausted|RESOURCE_EXHAUSTED|[Qq]uota|[Rr]ate limit|Too Many Requests')
+RETRYABLE_ERRORS = re.compile(
+    r'Unavailable|UNAVAILABLE|DeadlineExceeded|DEADLINE_EXCEEDED|code = Internal|code = Aborted|ABORTED|'
+    r'[Oo]peration (is )?(already )?in progress|[Aa]nother operation|[Cc]onnection (reset|refused)|'
+    r'[Tt]imed? ?out|[Tt]emporar')
+
+
+def classify_error(rc, text):
+    """Return 'quota', 'retryable' or 'fatal' for a failed yc call or API
+    request, rc is the exit code or the HTTP status."""
+    text = text or ''
+    if rc == 429 or QUOTA_ERRORS.search(text):
+        return 'quota'
+    if rc in (-1, 500, 502, 503, 504) or RETRYABLE_ERRORS.search(text):
+        return 'retryable'
+    return 'fatal'
+
+
+class RateLimiter(object):
+    """Token bucket shared by all workers of a module run.
+
+    rate is calls per second, 0 disables the limit. pause() holds every
+    caller back, it is used when the cloud reports an exhausted quota.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.time()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.time()
+                wait = self._paused_until - now
+                if wait <= 0 and self.rate <= 0:
+                    return
+                if wait <= 0:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CallPolicy(object):
+    """Rate limit and retry rules of the calls of one client."""
+
+    def __init__(self, params):
+        self.retries = max(params.get('retries') or 0, 0)
+        self.delay = 1 if params.get('retry_delay') is None else params['retry_delay']
+        self.max_delay = 30 if params.get('retry_max_delay') is None else params['retry_max_delay']
+        self.limiter = RateLimiter(params.get('rate_limit') or 0, params.get('rate_burst') or 10)
+
+    def backoff(self, kind, attempt):
+        """Sleep before the next attempt, exponential with full jitter.
+
+        A quota error starts one step further and pauses all workers.
+        """
+        if kind == 'quota':
+            attempt += 1
+        delay = random.uniform(0, min(self.max_delay, self.delay * 2 ** attempt))
+        if kind == 'quota':
+            self.limiter.pause(delay)
+        time.sleep(delay)
+
+    def should_retry(self, kind, attempt):
+        return kind != 'fatal' and attempt < self.retries
+
+
+def yc_client(module):
+    """Return the backend selected by the backend option."""
+    if module.params.get('backend') == 'api':
+        from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc_api import YcApi
+        return YcApi(module)
+    return YcCli(module)
+
+
+def preflight_argument_spec():
+    """Options of the yc config check, see the yc_backend.preflight doc fragment."""
+    return dict(
+        preflight=dict(type='str', required=False, choices=['skip', 'cached', 'always'], default='cached'),
+        preflight_ttl=dict(type='int', required=False, default=3600),
+        preflight_cache=dict(type='path', required=False, default='~/.cache/yc_cvl/preflight.json'),
+    )
+
+
+def save_state(path, data):
+    """Atomically write a small JSON state file readable only by the owner.
+
+    State files only save work, so failing to write one is not an error.
+    """
+    path = os.path.expanduser(path)
+    directory = os.path.dirname(path)
+    try:
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, 0o700)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        pass
+
+
+def load_state(path):
+    path = os.path.expanduser(path)
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _config_mtime():
+    try:
+        return os.path.getmtime(os.path.expanduser(YC_CONFIG_FILE))
+    except OSError:
+        return None
+
+
+def _parse_config_list(out):
+    """Pick folder and cloud ids out of yc config list output."""
+    config = {}
+    for key in ('folder-id', 'cloud-id'):
+        match = re.search(r'^%s:\s*(\S+)' % key, out or '', re.MULTILINE)
+        config[key.replace('-', '_')] = match.group(1) if match else None
+    return config
+
+
+def preflight(module, cli):
+    """Check that the backend is usable, reusing a recent successful yc config list.
+
+    The cached result is dropped after preflight_ttl seconds or as soon as the
+    yc config file changes. Returns a dict with rc, cached, folder_id and cloud_id.
+    """
+    mode = module.params.get('preflight') or 'always'
+    if mode == 'skip':
+        return dict(rc=0, cached=False, skipped=True, folder_id=None, cloud_id=None)
+    if not isinstance(cli, YcCli):
+        rc = cli.check_installed()[0]
+        return dict(rc=rc, cached=False, folder_id=cli.folder_id, cloud_id=None)
+
+    path = module.params['preflight_cache']
+    mtime = _config_mtime()
+    if mode == 'cached':
+        state = load_state(path)
+        if (state and state.get('rc') == 0 and state.get('config_mtime') == mtime and
+                time.time() - state.get('checked_at', 0) < module.params['preflight_ttl']):
+            return dict(rc=0, cached=True, folder_id=state.get('folder_id'), cloud_id=state.get('cloud_id'))
+
+    rc, out, err = cli.check_installed()
+    info = dict(rc=rc, cached=False)
+    info.update(_parse_config_list(out))
+    if mode == 'cached':
+        state = dict(info, checked_at=time.time(), config_mtime=mtime)
+        del state['cached']
+        save_state(path, state)
+    return info
+
+
+def build_yc_params(params):
+    """Map module params to yc compute instance create flags."""
+    return {
+        'name': params['name'],
+        'description': params['description'],
+        'zone': params['zone'],
+        'ssh-key': params['ssh_key'],
+        'hostname': params['hostname'],
+        'labels': params['labels'],
+        'platform': params['platform'],
+        'create-boot-disk': {
+            'image-family': params['boot_disk']['image_family'],
+            'image-folder-id': params['boot_disk']['image_folder_id'],
+            'size': params['boot_disk']['size'],
+            'type': params['boot_disk']['type'],
+        },
+        'memory': params['memory'],
+        'cores': params['cores'],
+        'core-fraction': params['core_fraction'],
+        'public-ip': params['public_ip'],
+        'preemptible': params['preemptible'],
+    }
+
+
+def build_yc_args(yc_params):
+    yc_args = []
+    for key, value in yc_params.items():
+        if isinstance(value, dict):
+            yc_args.append(("--" + key))
+            output = ""
+            for key2, value2 in value.items():
+                output += key2 + "=" + str(value2) + ","
+            output = output[:-1]
+            yc_args.append(output)
+        elif isinstance(value, bool):
+            if value:
+                yc_args.append("--" + key)
+        elif isinstance(value, (str, int)):
+            yc_args.append("--" + key)
+            yc_args.append(str(value))
+    return yc_args
+
+
+# Fields yc compute instance update can change on a running instance and the
+# ones that need it to be stopped. disk-size is a boot disk resize, which is
+# done while the instance is stopped too.
+LIVE_FIELDS = ('description', 'labels')
+RESTART_FIELDS = ('memory', 'cores', 'core-fraction', 'platform', 'preemptible', 'disk-size')
+
+
+# Label holding the fingerprint of the spec an instance was created or
+# updated from. It is not part of the labels the user manages.
+FINGERPRINT_LABEL = 'cvl-spec'
+
+
+def spec_fingerprint(yc_params):
+    """Hash of the managed fields of yc_params, usable as a label value."""
+    spec = dict((key, yc_params[key]) for key in LIVE_FIELDS + RESTART_FIELDS
+                if yc_params.get(key) is not None)
+    spec['disk-size'] = yc_params['create-boot-disk']['size']
+    if spec.get('labels'):
+        spec['labels'] = _user_labels(spec['labels'])
+    data = json.dumps(spec, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:32]
+
+
+def fingerprint_matches(yc_params, info):
+    """True if the instance carries the fingerprint of yc_params, so the
+    field by field comparison (and the boot disk lookup) can be skipped."""
+    labels = (info or {}).get('labels') or {}
+    return labels.get(FINGERPRINT_LABEL) == spec_fingerprint(yc_params)
+
+
+def _user_labels(labels):
+    return dict((key, value) for key, value in (labels or {}).items() if key != FINGERPRINT_LABEL)
+
+
+def boot_disk_id(info):
+    return (info.get('boot_disk') or {}).get('disk_id')
+
+
+def _current_fields(info, disk):
+    resources = info['resources']
+    current = {
+        'description': info.get('description') or '',
+        'labels': _user_labels(info.get('labels')),
+        'memory': int(resources['memory']) / GIB,
+        'cores': int(resources['cores']),
+        'core-fraction': int(resources['core_fraction']),
+        'platform': info.get('platform_id'),
+        'preemptible': bool((info.get('scheduling_policy') or {}).get('preemptible', False)),
+    }
+    if disk is not None:
+        current['disk-size'] = int(disk['size']) / GIB
+    return current
+
+
+def instance_changes(yc_params, info, disk=None, fingerprint=False):
+    """Diff desired yc_params against the current instance.
+
+    Options left unset (None) are not managed. The boot disk size is only
+    compared when ``disk`` (the boot disk as returned by yc) is given, and a
+    disk is never shrunk. Returns a dict with ``live`` and ``restart`` changes,
+    each mapping a field to its current and desired value, and ``skipped`` for
+    changes that can not be applied.
+
+    The fingerprint label is left out of the labels comparison. With
+    fingerprint=True a missing or stale fingerprint is a live change too.
+    """
+    desired = dict((key, yc_params[key]) for key in LIVE_FIELDS + RESTART_FIELDS if key in yc_params)
+    if desired.get('labels') is not None:
+        desired['labels'] = _user_labels(desired['labels'])
+    desired['disk-size'] = yc_params['create-boot-disk']['size']
+    current = _current_fields(info, disk)
+    changes = dict(live={}, restart={}, skipped={})
+    for key, value in desired.items():
+        if value is None or key not in current:
+            continue
+        if key == 'description':
+            value = value or ''
+        if current[key] == value:
+            continue
+        change = dict(current=current[key], desired=value)
+        if key == 'disk-size' and value < current[key]:
+            changes['skipped'][key] = change
+        elif key in LIVE_FIELDS:
+            changes['live'][key] = change
+        else:
+            changes['restart'][key] = change
+    # a partly applied spec must not be marked as applied
+    if fingerprint and not changes['skipped'] and not fingerprint_matches(yc_params, info):
+        changes['live']['fingerprint'] = dict(current=((info.get('labels') or {}).get(FINGERPRINT_LABEL)),
+                                              desired=spec_fingerprint(yc_params))
+    return changes
+
+
+def read_ssh_key(path):
+    try:
+        with open(os.path.expanduser(path), 'r') as file:
+            return file.read().strip()
+    except (IOError, OSError) as e:
+        raise YcError('Can not read ssh key: %s' % e)
+
+
+def instance_group_spec(yc_params, group, image_id, network_id, subnet_id):
+    """Instance group spec in yc (snake_case) form built from the same
+    yc_params a single instance is created from.
+
+    group holds name, size, service_account_id, instance_name,
+    max_unavailable, max_expansion and optionally folder_id.
+    """
+    boot_disk = yc_params['create-boot-disk']
+    interface = {'network_id': network_id, 'subnet_ids': [subnet_id]}
+    if yc_params['public-ip']:
+        interface['primary_v4_address_spec'] = {'one_to_one_nat_spec': {'ip_version': 'IPV4'}}
+    template = {
+        'name': group['instance_name'],
+        'hostname': group['instance_name'],
+        'platform_id': yc_params['platform'] or 'standard-v2',
+        'resources_spec': {
+            'memory': yc_params['memory'] * GIB,
+            'cores': yc_params['cores'],
+            'core_fraction': yc_params['core-fraction'],
+        },
+        'boot_disk_spec': {
+            'mode': 'READ_WRITE',
+            'disk_spec': {'type_id': boot_disk['type'], 'size': boot_disk['size'] * GIB, 'image_id': image_id},
+        },
+        'network_interface_specs': [interface],
+        'scheduling_policy': {'preemptible': bool(yc_params['preemptible'])},
+    }
+    if yc_params['labels']:
+        template['labels'] = yc_params['labels']
+    if yc_params['ssh-key']:
+        template['metadata'] = {'ssh-keys': 'yc-user:' + read_ssh_key(yc_params['ssh-key'])}
+    spec = {
+        'name': group['name'],
+        'service_account_id': group['service_account_id'],
+        'instance_template': template,
+        'scale_policy': {'fixed_scale': {'size': group['size']}},
+        'deploy_policy': {'max_unavailable': group['max_unavailable'], 'max_expansion': group['max_expansion']},
+        'allocation_policy': {'zones': [{'zone_id': yc_params['zone']}]},
+    }
+    if yc_params['description']:
+        spec['description'] = yc_params['description']
+    if group.get('folder_id'):
+        spec['folder_id'] = group['folder_id']
+    return spec
+
+
+def _group_fields(spec):
+    template = spec.get('instance_template') or {}
+    resources = template.get('resources_spec') or {}
+    disk = (template.get('boot_disk_spec') or {}).get('disk_spec') or {}
+    return {
+        'size': int(((spec.get('scale_policy') or {}).get('fixed_scale') or {}).get('size', 0)),
+        'description': spec.get('description') or '',
+        'labels': template.get('labels') or {},
+        'metadata': template.get('metadata') or {},
+        'platform': template.get('platform_id'),
+        'memory': int(resources.get('memory', 0)),
+        'cores': int(resources.get('cores', 0)),
+        'core-fraction': int(resources.get('core_fraction', 100)),
+        'preemptible': bool((template.get('scheduling_policy') or {}).get('preemptible', False)),
+        'disk-type': disk.get('type_id'),
+        'disk-size': int(disk.get('size', 0)),
+    }
+
+
+def instance_group_changes(spec, current):
+    """Fields of the desired group spec that differ from the current group,
+    each mapped to its current and desired value."""
+    desired = _group_fields(spec)
+    actual = _group_fields(current)
+    return dict((key, dict(current=actual[key], desired=value))
+                for key, value in desired.items() if actual[key] != value)
+
+
+class YcCli(object):
+    """Thin wrapper around the yc binary.
+
+    Never calls fail_json itself so it can be shared between worker threads;
+    failures are raised as YcError and reported by the calling module.
+    """
+
+    def __init__(self, module):
+        self.module = module
+        self.calls = CallLog()
+        self.policy = CallPolicy(module.params)
+
+    def run(self, args, check_rc=True):
+        """Run yc, transient and quota errors are retried with backoff."""
+        cmd = ["yc"] + args
+        attempt = 0
+        while True:
+            self.policy.limiter.acquire()
+            started = time.time()
+            rc, out, err = self.module.run_command(cmd)
+            operation = None
+            if rc == 0 and "--async" in args:
+                operation = json.loads(out).get('id')
+            self.calls.record(started, rc, operation, attempt, cmd=cmd)
+            if rc == 0:
+                break
+            kind = classify_error(rc, err or out)
+            if not self.policy.should_retry(kind, attempt):
+                break
+            self.policy.backoff(kind, attempt)
+            attempt += 1
+        if check_rc and rc != 0:
+            raise YcError(err or out, rc=rc, stdout=out, stderr=err, cmd=cmd)
+        return rc, out, err
+
+    def check_installed(self):
+        return self.run(["config", "list"])
+
+    def get_instance(self, name):
+        rc, out, err = self.run(["compute", "instance", "get", name, "--format", "json"], check_rc=False)
+        if rc != 0:
+            return None
+        return json.loads(out)
+
+    def list_instances(self):
+        rc, out, err = self.run(["compute", "instance", "list", "--format", "json"])
+        return json.loads(out or "[]")
+
+    def operation(self, args, wait=True):
+        """Run a yc call that starts a cloud operation, without waiting for it when wait is false."""
+        if not wait:
+            args = args + ["--async"]
+        return self.run(args)
+
+    def get_operation(self, operation_id):
+        rc, out, err = self.run(["operation", "get", operation_id, "--format", "json"])
+        return json.loads(out)
+
+    def create(self, yc_params, wait=True):
+        return self.operation(["compute", "instance", "create"] + build_yc_args(yc_params) + ["--format", "json"], wait)
+
+    def update(self, name, fields, wait=True):
+        """Apply changed fields (see instance_changes) with one yc compute instance update."""
+        args = ["compute", "instance", "update", name]
+        for key, value in sorted(fields.items()):
+            if key == 'labels':
+                args.extend(["--labels", ",".join("%s=%s" % item for item in sorted(value.items()))])
+            elif key == 'preemptible':
+                args.append("--preemptible=" + str(value).lower())
+            else:
+                args.extend(["--" + key, str(value)])
+        return self.operation(args + ["--format", "json"], wait)
+
+    def get_disk(self, disk_id):
+        rc, out, err = self.run(["compute", "disk", "get", disk_id, "--format", "json"])
+        return json.loads(out)
+
+    def list_disks(self):
+        rc, out, err = self.run(["compute", "disk", "list", "--format", "json"])
+        return json.loads(out or "[]")
+
+    def resize_disk(self, disk_id, size, wait=True):
+        return self.operation(["compute", "disk", "resize", disk_id, "--size", str(size), "--format", "json"], wait)
+
+    def stop(self, name, wait=True):
+        return self.operation(["compute", "instance", "stop", name, "--format", "json"], wait)
+
+    def start(self, name, wait=True):
+        return self.operation(["compute", "instance", "start", name, "--format", "json"], wait)
+
+    def restart(self, name, wait=True):
+        return self.operation(["compute", "instance", "restart", name, "--format", "json"], wait)
+
+    def delete(self, name, wait=True):
+        return self.operation(["compute", "instance", "delete", name, "--format", "json"], wait)
+
+    def latest_image_id(self, family, folder_id):
+        rc, out, err = self.run(["compute", "image", "get-latest-from-family", family,
+                                 "--folder-id", folder_id, "--format", "json"])
+        return json.loads(out)['id']
+
+    def zone_subnet(self, zone):
+        """First subnet of the zone as a dict with id and network_id."""
+        rc, out, err = self.run(["vpc", "subnet", "list", "--format", "json"])
+        for subnet in json.loads(out or "[]"):
+            if subnet.get('zone_id') == zone:
+                return subnet
+        raise YcError('No subnet found in zone: ' + zone)
+
+    def get_instance_group(self, name):
+        rc, out, err = self.run(["compute", "instance-group", "get", "--name", name, "--format", "json"],
+                                check_rc=False)
+        if rc != 0:
+            return None
+        return json.loads(out)
+
+    def list_instance_group_instances(self, name):
+        rc, out, err = self.run(["compute", "instance-group", "list-instances", "--name", name, "--format", "json"])
+        return json.loads(out or "[]")
+
+    def _spec_operation(self, args, spec, wait):
+        fd, path = tempfile.mkstemp(prefix='yc_instance_group.', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(spec, file)
+            return self.operation(args + ["--file", path, "--format", "json"], wait)
+        finally:
+            os.unlink(path)
+
+    def create_instance_group(self, spec, wait=True):
+        return self._spec_operation(["compute", "instance-group", "create"], spec, wait)
+
+    def update_instance_group(self, name, spec, wait=True):
+        return self._spec_operation(["compute", "instance-group", "update", "--name", name], spec, wait)
+
+    def delete_instance_group(self, name, wait=True):
+        return self.operation(["compute", "instance-group", "delete", "--name", name, "--format", "json"], wait)
+
+
+def plan_action(yc_params, state, update, info, disk=None, fingerprint=False):
+    """Decide what has to happen to one instance.
+
+    ``info`` is the current instance as returned by yc (or None when it does
+    not exist), ``disk`` its boot disk. Returns the action name or None when
+    nothing needs doing. With fingerprint=True an instance carrying the
+    fingerprint of yc_params is up to date without comparing its fields.
+    """
+    name = yc_params['name']
+    status = info['status'] if info is not None else None
+    if state == 'present':
+        if info is None:
+            return 'create'
+        if update and fingerprint and fingerprint_matches(yc_params, info):
+            return None
+        if update:
+            changes = instance_changes(yc_params, info, disk, fingerprint)
+            if changes['live'] or changes['restart']:
+                return 'update'
+        return None
+    if state in ('absent', 'terminated'):
+        if info is None:
+            raise YcError('No VM exists with name: ' + name)
+        return 'delete'
+    if state == 'stopped':
+        if status != "RUNNING":
+            raise YcError('No VM exists with name: ' + name)
+        return 'stop'
+    if state == 'started':
+        if status != "STOPPED":
+            raise YcError('No VM exists with state STOPPED and name: ' + name)
+        return 'start'
+    if state in ('restarted', 'rebooted'):
+        if status != "RUNNING":
+            raise YcError('No VM exists in state RUNNING with name: ' + name)
+        return 'restart'
+    return None
+
+
+def operation_id(yc_result):
+    return json.loads(yc_result[1])['id']
+
+
+def returned_instance(yc_result):
+    """Instance printed by a finished start, restart or update call, None
+    for other output. A dynamic public address is only known from it."""
+    try:
+        vm = json.loads(yc_result[1])
+    except (TypeError, ValueError):
+        return None
+    return vm if isinstance(vm, dict) and 'resources' in vm else None
+
+
+def apply_update(cli, yc_params, info, disk=None, wait=True, fingerprint=False):
+    """Apply all changes of an instance in as few yc calls as possible.
+
+    Live changes alone are one update call. If anything needs the instance
+    stopped, everything is applied within one stop/update/start cycle, and the
+    instance is only stopped and started again if it was running before.
+    The fingerprint label is written with the same update call. When waited
+    for, ``vm`` is the instance as returned by the last call.
+    """
+    name = yc_params['name']
+    changes = instance_changes(yc_params, info, disk, fingerprint)
+    result = dict(changes=changes, restarted=False)
+    fields = dict((key, change['desired']) for kind in ('live', 'restart')
+                  for key, change in changes[kind].items() if key not in ('disk-size', 'fingerprint'))
+    if 'labels' in fields or 'fingerprint' in changes['live']:
+        # labels are replaced as a whole, keep the fingerprint label in them
+        labels = dict(fields.get('labels', _user_labels(info.get('labels'))))
+        if 'fingerprint' in changes['live']:
+            labels[FINGERPRINT_LABEL] = changes['live']['fingerprint']['desired']
+        elif FINGERPRINT_LABEL in (info.get('labels') or {}):
+            labels[FINGERPRINT_LABEL] = info['labels'][FINGERPRINT_LABEL]
+        fields['labels'] = labels
+    restart = bool(changes['restart']) and info['status'] == "RUNNING"
+
+    steps = []
+    if 'disk-size' in changes['restart']:
+        size = changes['restart']['disk-size']['desired']
+        steps.append(('resize', lambda wait: cli.resize_disk(boot_disk_id(info), size, wait)))
+    if fields:
+        steps.append(('update', lambda wait: cli.update(name, fields, wait)))
+    if restart:
+        cli.stop(name)
+        steps.append(('start', lambda wait: cli.start(name, wait)))
+
+    # report the update call like before, or the last step when it is left running
+    last = len(steps) - 1
+    for index, (kind, step) in enumerate(steps):
+        step_result = step(wait or index < last)
+        if kind == 'update' or 'yc_command_result' not in result or (not wait and index == last):
+            result['yc_command_result'] = step_result
+        if wait and kind in ('update', 'start') and returned_instance(step_result) is not None:
+            result['vm'] = returned_instance(step_result)
+    result['restarted'] = restart
+    return result
+
+
+def apply_action(cli, action, yc_params, info, wait=True, disk=None, fingerprint=False):
+    """Run the yc calls for a planned action and return a per-instance result.
+
+    With wait=False the last operation of the action is only started and its
+    id is returned as ``operation_id``; an update still waits for its earlier
+    steps, because the instance has to be stopped before it is changed.
+    With fingerprint=True created and updated instances get the fingerprint
+    label of yc_params.
+    """
+    name = yc_params['name']
+    result = dict(changed=False)
+    if action is None:
+        if info is not None:
+            result['params'] = "Not changing same instance"
+        return result
+    if action == 'create':
+        if fingerprint:
+            labels = dict(yc_params['labels'] or {})
+            labels[FINGERPRINT_LABEL] = spec_fingerprint(yc_params)
+            yc_params = dict(yc_params, labels=labels)
+        yc_result = cli.create(yc_params, wait)
+        result['yc_command_result'] = yc_result
+        if wait:
+            result['vm'] = json.loads(yc_result[1])
+    elif action == 'update':
+        result['params'] = info['resources']
+        result.update(apply_update(cli, yc_params, info, disk, wait, fingerprint))
+    elif action == 'delete':
+        result['yc_command_result'] = cli.delete(name, wait)
+    elif action == 'stop':
+        result['yc_command_result'] = cli.stop(name, wait)
+    elif action == 'start':
+        result['yc_command_result'] = cli.start(name, wait)
+    elif action == 'restart':
+        result['yc_command_result'] = cli.restart(name, wait)
+    if wait and action in ('start', 'restart') and returned_instance(result['yc_command_result']) is not None:
+        result['vm'] = returned_instance(result['yc_command_result'])
+    if not wait:
+        result['operation_id'] = operation_id(result['yc_command_result'])
+    result['changed'] = True
+    return result
+
+
+def index_instances(instances):
+    """Index a folder listing by name, description, label and status."""
+    snapshot = dict(
+        instances=instances,
+        by_name={},
+        by_description={},
+        by_label={},
+        by_status={},
+    )
+    for vm in instances:
+        name = vm['name']
+        snapshot['by_name'][name] = vm
+        if vm.get('description'):
+            snapshot['by_description'].setdefault(vm['description'], []).append(name)
+        for key, value in (vm.get('labels') or {}).items():
+            snapshot['by_label'].setdefault(key + '=' + value, []).append(name)
+        snapshot['by_status'].setdefault(vm.get('status', 'UNKNOWN'), []).append(name)
+    return snapshot
+
+
+def instance_address(vm, public=True):
+    """Address of the first network interface: one-to-one NAT address if
+    public is true and the instance has one, the private address otherwise."""
+    for interface in vm.get('network_interfaces') or []:
+        address = interface.get('primary_v4_address') or {}
+        nat = address.get('one_to_one_nat') or {}
+        if public and nat.get('address'):
+            return nat['address']
+        if address.get('address'):
+            return address['address']
+    return None
+
+
+def snapshot_by_name(snapshot):
+    """Accept a registered yc_instance_info result or just its by_name dict."""
+    if 'by_name' in snapshot:
+        return snapshot['by_name']
+    return snapshot
+
+
+def instance_item_spec():
+    """Per-item options for batch modules: same as instance_argument_spec() but
+    without defaults, so unset keys fall back to the module-level values."""
+    spec = instance_argument_spec()
+    for option in spec.values():
+        option.pop('default', None)
+        option['required'] = False
+        for suboption in option.get('options', {}).values():
+            suboption.pop('default', None)
+    return spec
+
+
+def merge_instance_params(defaults, item):
+    """Overlay one item from an ``instances`` list on the module-level params."""
+    params = dict(defaults)
+    for key, value in item.items():
+        if value is None:
+            continue
+        if key == 'boot_disk':
+            boot_disk = dict(defaults.get('boot_disk') or {})
+            boot_disk.update((k, v) for k, v in value.items() if v is not None)
+            value = boot_disk
+        params[key] = value
+    return params
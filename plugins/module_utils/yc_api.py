@@ -0,0 +1,533 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import calendar
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves.urllib.parse import urlencode, urlparse
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.calls import CallLog
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc import (
+    GIB,
+    CallPolicy,
+    YC_CONFIG_FILE,
+    YcError,
+    classify_error,
+    read_ssh_key,
+    load_state,
+    save_state,
+)
+
+ENDPOINTS = {
+    'compute': 'https://compute.api.cloud.yandex.net',
+    'operation': 'https://operation.api.cloud.yandex.net',
+    'vpc': 'https://vpc.api.cloud.yandex.net',
+    'iam': 'https://iam.api.cloud.yandex.net',
+}
+
+DEFAULT_PLATFORM = 'standard-v2'
+OPERATION_TIMEOUT = 900
+OPERATION_POLL_INTERVAL = 1
+# yc iam create-token does not report expiry, IAM tokens live for 12 hours
+CLI_TOKEN_LIFETIME = 11 * 3600
+TOKEN_REFRESH_MARGIN = 300
+
+# requests that can be sent again on a fresh connection without an idempotency key
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+# user supplied keys inside these are left as they are by _snake_keys()
+_VERBATIM_KEYS = ('labels', 'metadata')
+
+
+def _snake(key):
+    return re.sub(r'(?<=[a-z0-9])([A-Z])', r'_\1', key).lower()
+
+
+def _snake_keys(obj):
+    """Convert REST (camelCase) keys to the snake_case ones yc --format json prints."""
+    if isinstance(obj, dict):
+        converted = {}
+        for key, value in obj.items():
+            name = _snake(key)
+            converted[name] = value if name in _VERBATIM_KEYS else _snake_keys(value)
+        return converted
+    if isinstance(obj, list):
+        return [_snake_keys(value) for value in obj]
+    return obj
+
+
+def _camel(key):
+    return re.sub(r'_([a-z0-9])', lambda match: match.group(1).upper(), key)
+
+
+def _camel_keys(obj):
+    """Convert yc (snake_case) keys of a spec to the REST (camelCase) ones."""
+    if isinstance(obj, dict):
+        converted = {}
+        for key, value in obj.items():
+            converted[_camel(key)] = value if key in _VERBATIM_KEYS else _camel_keys(value)
+        return converted
+    if isinstance(obj, list):
+        return [_camel_keys(value) for value in obj]
+    return obj
+
+
+def _cli_profile():
+    """Name and settings of the active yc profile as one string, empty if the
+    yc config can not be read. The settings include the cloud and folder ids
+    and the credentials, so a token of another profile or account differs."""
+    try:
+        with open(os.path.expanduser(YC_CONFIG_FILE)) as file:
+            lines = [line.rstrip() for line in file if line.strip()]
+    except (IOError, OSError):
+        return ''
+    current = None
+    profiles = {}
+    section = profile = None
+    for line in lines:
+        indent = len(line) - len(line.lstrip())
+        if indent == 0:
+            section, profile = line.split(':', 1)[0], None
+            if section == 'current':
+                current = line.split(':', 1)[1].strip().strip('"\'')
+        elif section == 'profiles':
+            if profile is None or indent <= profile_indent:
+                profile, profile_indent = line.strip().rstrip(':').strip('"\''), indent
+                profiles[profile] = []
+            else:
+                profiles[profile].append(line.strip())
+    return '\n'.join([current or ''] + sorted(profiles.get(current, [])))
+
+
+def _parse_timestamp(value):
+    """Parse RFC 3339 timestamps returned by IAM, fractional seconds are dropped."""
+    value = re.sub(r'\.\d+', '', value).replace('Z', '+00:00')
+    return calendar.timegm(time.strptime(value[:19], '%Y-%m-%dT%H:%M:%S'))
+
+
+class ConnectionPool(object):
+    """Keep-alive HTTP(S) connections reused by all calls of one module run.
+
+    http.client connections are not thread safe, so every worker takes an idle
+    connection for the duration of one request and hands it back afterwards.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, scheme, netloc):
+        if scheme == 'http':
+            return http_client.HTTPConnection(netloc, timeout=self.timeout)
+        return http_client.HTTPSConnection(netloc, timeout=self.timeout)
+
+    def request(self, method, url, body=None, headers=None):
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.netloc)
+        path = parsed.path + ('?' + parsed.query if parsed.query else '')
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            conn = idle.pop() if idle else None
+        # a pooled connection may have been closed by the server, retry once on a fresh one,
+        # unless the server may have got the request already and would run it twice
+        retry = method in IDEMPOTENT_METHODS or 'Idempotency-Key' in (headers or {})
+        for attempt in (0, 1):
+            if conn is None:
+                conn = self._connect(*key)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http_client.HTTPException, OSError):
+                conn.close()
+                conn = None
+                if attempt or not retry:
+                    raise
+        with self._lock:
+            self._idle[key].append(conn)
+        return response.status, data
+
+    def close(self):
+        with self._lock:
+            for connections in self._idle.values():
+                for conn in connections:
+                    conn.close()
+            self._idle = {}
+
+
+class IamTokenCache(object):
+    """IAM token stored on disk until shortly before it expires.
+
+    source identifies the credentials the token was obtained with: the OAuth
+    token, or the active yc profile for tokens from yc iam create-token.
+    """
+
+    def __init__(self, path, source):
+        self.path = os.path.expanduser(path) if path else None
+        # only reuse a cached token obtained from the same credentials
+        self.source = hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    def load(self):
+        cached = load_state(self.path) if self.path else None
+        if not cached or cached.get('source') != self.source:
+            return None
+        if cached.get('expires_at', 0) - TOKEN_REFRESH_MARGIN <= time.time():
+            return None
+        return cached.get('iam_token')
+
+    def save(self, token, expires_at):
+        if self.path:
+            save_state(self.path, dict(iam_token=token, expires_at=expires_at, source=self.source))
+
+
+class YcApi(object):
+    """Compute REST API client with the same interface as YcCli.
+
+    Every call returns a ``(rc, stdout, stderr)`` tuple like YcCli.run() does,
+    with stdout holding the snake_case JSON yc --format json would print, so
+    callers do not need to know which backend they talk to.
+    """
+
+    def __init__(self, module):
+        self.module = module
+        params = module.params
+        endpoint = params.get('api_endpoint')
+        self.endpoints = dict((name, endpoint.rstrip('/') if endpoint else url)
+                              for name, url in ENDPOINTS.items())
+        self.folder_id = params.get('folder_id') or os.environ.get('YC_FOLDER_ID')
+        self.calls = CallLog()
+        self.policy = CallPolicy(params)
+        self.pool = ConnectionPool(params.get('api_timeout') or 60)
+        self._token = params.get('iam_token') or os.environ.get('YC_IAM_TOKEN')
+        self._oauth_token = params.get('oauth_token') or os.environ.get('YC_TOKEN')
+        self._token_cache = IamTokenCache(params.get('token_cache'),
+                                          'oauth:' + self._oauth_token if self._oauth_token else
+                                          'yc:' + _cli_profile())
+        self._token_lock = threading.Lock()
+        self._ids = {}
+        self._group_ids = {}
+        self._cache = {}
+        self._cache_locks = {}
+        self._cache_lock = threading.Lock()
+
+    # -- transport -------------------------------------------------------
+
+    def _iam_token(self):
+        with self._token_lock:
+            if self._token:
+                return self._token
+            token = self._token_cache.load()
+            if token is None:
+                token, expires_at = self._create_token()
+                self._token_cache.save(token, expires_at)
+            self._token = token
+            return token
+
+    def _create_token(self):
+        if self._oauth_token:
+            status, data = self.pool.request(
+                'POST', self.endpoints['iam'] + '/iam/v1/tokens',
+                body=json.dumps({'yandexPassportOauthToken': self._oauth_token}),
+                headers={'Content-Type': 'application/json'})
+            if status != 200:
+                raise YcError('Can not get IAM token: HTTP %d %s' % (status, data.decode('utf-8', 'replace')))
+            response = json.loads(data)
+            return response['iamToken'], _parse_timestamp(response['expiresAt'])
+        started = time.time()
+        rc, out, err = self.module.run_command(["yc", "iam", "create-token"])
+        self.calls.record(started, rc, cmd=["yc", "iam", "create-token"])
+        if rc != 0:
+            raise YcError('Can not get IAM token, set iam_token or oauth_token: ' + err,
+                          rc=rc, stdout=out, stderr=err, cmd=["yc", "iam", "create-token"])
+        return out.strip(), time.time() + CLI_TOKEN_LIFETIME
+
+    def request(self, method, service, path, body=None, query=None):
+        """Send a request, transient and quota errors are retried with backoff."""
+        url = self.endpoints[service] + path
+        if query:
+            url += '?' + urlencode(query)
+        headers = {'Authorization': 'Bearer ' + self._iam_token()}
+        if method not in IDEMPOTENT_METHODS:
+            # the same key on every attempt, the API runs a repeated request only once
+            headers['Idempotency-Key'] = str(uuid.uuid4())
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        attempt = 0
+        while True:
+            self.policy.limiter.acquire()
+            started = time.time()
+            try:
+                status, data = self.pool.request(method, url, body=body, headers=headers)
+            except (http_client.HTTPException, OSError) as e:
+                self.calls.record(started, -1, None, attempt, method=method, url=url)
+                error = YcError('%s %s failed: %s' % (method, url, e), cmd=[method, url])
+                kind = 'retryable'
+            else:
+                text = data.decode('utf-8', 'replace')
+                if status < 400:
+                    break
+                self.calls.record(started, status, None, attempt, method=method, url=url)
+                error = YcError('%s %s failed: HTTP %d %s' % (method, url, status, text),
+                                rc=status, stdout='', stderr=text, cmd=[method, url])
+                kind = classify_error(status, text)
+            if not self.policy.should_retry(kind, attempt):
+                raise error
+            self.policy.backoff(kind, attempt)
+            attempt += 1
+        response = json.loads(text) if text else {}
+        operation = response.get('id') if isinstance(response, dict) and 'done' in response else None
+        self.calls.record(started, status, operation, attempt, method=method, url=url)
+        return response
+
+    def _cached(self, key, load):
+        """load() run once per module run, workers asking at the same time wait for it."""
+        with self._cache_lock:
+            lock = self._cache_locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self._cache:
+                self._cache[key] = load()
+            return self._cache[key]
+
+    def _result(self, obj):
+        return 0, json.dumps(_snake_keys(obj)), ''
+
+    def _require_folder(self):
+        if not self.folder_id:
+            raise YcError('folder_id (or YC_FOLDER_ID) is required for backend=api')
+        return self.folder_id
+
+    # -- operations ------------------------------------------------------
+
+    def _wait_operation(self, operation):
+        deadline = time.time() + OPERATION_TIMEOUT
+        while not operation.get('done'):
+            if time.time() > deadline:
+                raise YcError('Timed out waiting for operation ' + operation['id'])
+            time.sleep(OPERATION_POLL_INTERVAL)
+            operation = self.request('GET', 'operation', '/operations/' + operation['id'])
+        if 'error' in operation:
+            error = operation['error']
+            raise YcError('Operation %s failed: %s' % (operation['id'], error.get('message', error)),
+                          rc=error.get('code', 1), stdout=json.dumps(operation), stderr='')
+        return operation
+
+    def _operation(self, method, path, body=None, wait=True):
+        operation = self.request(method, 'compute', path, body=body)
+        if not wait:
+            return self._result(operation)
+        operation = self._wait_operation(operation)
+        return self._result(operation.get('response', {}))
+
+    def get_operation(self, operation_id):
+        return _snake_keys(self.request('GET', 'operation', '/operations/' + operation_id))
+
+    # -- instances -------------------------------------------------------
+
+    def check_installed(self):
+        self._iam_token()
+        return 0, '', ''
+
+    def _remember(self, instances):
+        for instance in instances:
+            self._ids[instance['name']] = instance['id']
+
+    def _instance_id(self, name):
+        if name not in self._ids and self.get_instance(name) is None:
+            raise YcError('No VM exists with name: ' + name)
+        return self._ids[name]
+
+    def get_instance(self, name):
+        response = self.request('GET', 'compute', '/compute/v1/instances',
+                                query={'folderId': self._require_folder(), 'filter': 'name="%s"' % name})
+        instances = response.get('instances', [])
+        if not instances:
+            return None
+        self._remember(instances)
+        return _snake_keys(instances[0])
+
+    def list_instances(self):
+        instances = []
+        query = {'folderId': self._require_folder(), 'pageSize': 1000}
+        while True:
+            response = self.request('GET', 'compute', '/compute/v1/instances', query=query)
+            instances.extend(response.get('instances', []))
+            if not response.get('nextPageToken'):
+                break
+            query['pageToken'] = response['nextPageToken']
+        self._remember(instances)
+        return _snake_keys(instances)
+
+    def _zone_subnets(self):
+        """First subnet of every zone of the folder, listed once per run."""
+        def load():
+            subnets = {}
+            query = {'folderId': self._require_folder(), 'pageSize': 1000}
+            while True:
+                response = self.request('GET', 'vpc', '/vpc/v1/subnets', query=query)
+                for subnet in response.get('subnets', []):
+                    subnets.setdefault(subnet['zoneId'], subnet)
+                if not response.get('nextPageToken'):
+                    return subnets
+                query['pageToken'] = response['nextPageToken']
+        return self._cached(('subnets',), load)
+
+    def _subnet_id(self, zone):
+        return self.zone_subnet(zone)['id']
+
+    def _image_id(self, boot_disk):
+        query = {'folderId': boot_disk['image-folder-id'], 'family': boot_disk['image-family']}
+        return self._cached(('image', query['folderId'], query['family']), lambda: self.request(
+            'GET', 'compute', '/compute/v1/images:latestByFamily', query=query)['id'])
+
+    def create(self, yc_params, wait=True):
+        boot_disk = yc_params['create-boot-disk']
+        interface = {'subnetId': self._subnet_id(yc_params['zone'])}
+        if yc_params['public-ip']:
+            interface['primaryV4AddressSpec'] = {'oneToOneNatSpec': {'ipVersion': 'IPV4'}}
+        body = {
+            'folderId': self._require_folder(),
+            'name': yc_params['name'],
+            'zoneId': yc_params['zone'],
+            'platformId': yc_params['platform'] or DEFAULT_PLATFORM,
+            'resourcesSpec': {
+                'memory': str(yc_params['memory'] * GIB),
+                'cores': str(yc_params['cores']),
+                'coreFraction': str(yc_params['core-fraction']),
+            },
+            'bootDiskSpec': {
+                'autoDelete': True,
+                'diskSpec': {
+                    'typeId': boot_disk['type'],
+                    'size': str(boot_disk['size'] * GIB),
+                    'imageId': self._image_id(boot_disk),
+                },
+            },
+            'networkInterfaceSpecs': [interface],
+            'schedulingPolicy': {'preemptible': bool(yc_params['preemptible'])},
+        }
+        if yc_params['description']:
+            body['description'] = yc_params['description']
+        if yc_params['hostname']:
+            body['hostname'] = yc_params['hostname']
+        if yc_params['labels']:
+            body['labels'] = yc_params['labels']
+        if yc_params['ssh-key']:
+            body['metadata'] = {'ssh-keys': 'yc-user:' + read_ssh_key(yc_params['ssh-key'])}
+        return self._operation('POST', '/compute/v1/instances', body=body, wait=wait)
+
+    def update(self, name, fields, wait=True):
+        """Apply changed fields (see instance_changes) with one PATCH request."""
+        body = {}
+        mask = []
+        resources = {'memory': 'memory', 'cores': 'cores', 'core-fraction': 'coreFraction'}
+        for key, value in fields.items():
+            if key in resources:
+                value = value * GIB if key == 'memory' else value
+                body.setdefault('resourcesSpec', {})[resources[key]] = str(int(value))
+                mask.append('resourcesSpec.' + resources[key])
+            elif key == 'platform':
+                body['platformId'] = value
+                mask.append('platformId')
+            elif key == 'preemptible':
+                body['schedulingPolicy'] = {'preemptible': bool(value)}
+                mask.append('schedulingPolicy.preemptible')
+            else:
+                body[key] = value
+                mask.append(key)
+        body['updateMask'] = ','.join(sorted(mask))
+        return self._operation('PATCH', '/compute/v1/instances/' + self._instance_id(name), body=body, wait=wait)
+
+    def get_disk(self, disk_id):
+        return _snake_keys(self.request('GET', 'compute', '/compute/v1/disks/' + disk_id))
+
+    def list_disks(self):
+        disks = []
+        query = {'folderId': self._require_folder(), 'pageSize': 1000}
+        while True:
+            response = self.request('GET', 'compute', '/compute/v1/disks', query=query)
+            disks.extend(response.get('disks', []))
+            if not response.get('nextPageToken'):
+                break
+            query['pageToken'] = response['nextPageToken']
+        return _snake_keys(disks)
+
+    def resize_disk(self, disk_id, size, wait=True):
+        body = {'updateMask': 'size', 'size': str(int(size * GIB))}
+        return self._operation('PATCH', '/compute/v1/disks/' + disk_id, body=body, wait=wait)
+
+    def stop(self, name, wait=True):
+        return self._operation('POST', '/compute/v1/instances/%s:stop' % self._instance_id(name), wait=wait)
+
+    def start(self, name, wait=True):
+        return self._operation('POST', '/compute/v1/instances/%s:start' % self._instance_id(name), wait=wait)
+
+    def restart(self, name, wait=True):
+        return self._operation('POST', '/compute/v1/instances/%s:restart' % self._instance_id(name), wait=wait)
+
+    def delete(self, name, wait=True):
+        return self._operation('DELETE', '/compute/v1/instances/' + self._instance_id(name), wait=wait)
+
+    # -- instance groups -------------------------------------------------
+
+    def latest_image_id(self, family, folder_id):
+        return self._image_id({'image-family': family, 'image-folder-id': folder_id})
+
+    def zone_subnet(self, zone):
+        """First subnet of the zone as a dict with id and network_id."""
+        subnets = self._zone_subnets()
+        if zone not in subnets:
+            raise YcError('No subnet found in zone: ' + zone)
+        return _snake_keys(subnets[zone])
+
+    def _instance_group_id(self, name):
+        if name not in self._group_ids and self.get_instance_group(name) is None:
+            raise YcError('No instance group exists with name: ' + name)
+        return self._group_ids[name]
+
+    def get_instance_group(self, name):
+        response = self.request('GET', 'compute', '/compute/v1/instanceGroups',
+                                query={'folderId': self._require_folder(), 'filter': 'name="%s"' % name})
+        groups = response.get('instanceGroups', [])
+        if not groups:
+            return None
+        self._group_ids[name] = groups[0]['id']
+        return _snake_keys(groups[0])
+
+    def list_instance_group_instances(self, name):
+        instances = []
+        path = '/compute/v1/instanceGroups/%s/instances' % self._instance_group_id(name)
+        query = {'pageSize': 1000}
+        while True:
+            response = self.request('GET', 'compute', path, query=query)
+            instances.extend(response.get('instances', []))
+            if not response.get('nextPageToken'):
+                break
+            query['pageToken'] = response['nextPageToken']
+        return _snake_keys(instances)
+
+    def create_instance_group(self, spec, wait=True):
+        body = _camel_keys(spec)
+        body.setdefault('folderId', self._require_folder())
+        return self._operation('POST', '/compute/v1/instanceGroups', body=body, wait=wait)
+
+    def update_instance_group(self, name, spec, wait=True):
+        body = _camel_keys(dict((key, value) for key, value in spec.items() if key not in ('name', 'folder_id')))
+        body['updateMask'] = ','.join(sorted(body))
+        return self._operation('PATCH', '/compute/v1/instanceGroups/' + self._instance_group_id(name),
+                               body=body, wait=wait)
+
+    def delete_instance_group(self, name, wait=True):
+        return self._operation('DELETE', '/compute/v1/instanceGroups/' + self._instance_group_id(name), wait=wait)
@@ -0,0 +1,404 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: clickhouse_schema
+
+short_description: Create and drop ClickHouse databases and tables over the HTTP interface
+
+version_added: "1.1.0"
+
+description:
+    - Brings the databases and tables of a ClickHouse server to the given list without running C(clickhouse-client).
+    - The existing databases and tables are read once, then only the statements for the missing
+      (or, with I(state=absent), the remaining) objects are sent, one after another over one kept alive
+      HTTP connection. Nothing is sent when the schema is already in place.
+    - Existing tables are never altered. Columns of tables defined with I(columns) are compared and the
+      difference is returned as I(drift).
+    - A statement that fails because its object was created or dropped in the meantime is not an error.
+options:
+    databases:
+        description:
+        - Databases, in the format of C(clickhouse_dbs_custom) of the clickhouse role.
+        type: list
+        elements: dict
+        required: no
+        default: []
+        suboptions:
+            name:
+                description:
+                - Name of the database.
+                type: str
+                required: yes
+            state:
+                description:
+                - Whether the database should exist. Dropping a database drops its tables.
+                choices: [present, absent]
+                type: str
+                default: present
+            engine:
+                description:
+                - Engine of the database, for example C(Lazy(3600)). Server default if not set.
+                type: str
+                required: no
+            cluster:
+                description:
+                - Cluster to run the statements of this database on, overrides I(cluster).
+                type: str
+                required: no
+    tables:
+        description:
+        - Tables, each defined by a complete I(query) or by I(columns) and the engine options.
+        - The database of a table is created if it does not exist.
+        type: list
+        elements: dict
+        required: no
+        default: []
+        suboptions:
+            name:
+                description:
+                - Name of the table, C(database.table) or just the table name with I(database).
+                type: str
+                required: yes
+            database:
+                description:
+                - Database of the table if I(name) has none.
+                type: str
+                default: default
+            state:
+                description:
+                - Whether the table should exist.
+                choices: [present, absent]
+                type: str
+                default: present
+            query:
+                description:
+                - C(CREATE TABLE) statement of the table, sent as it is when the table is missing.
+                type: str
+                required: no
+            columns:
+                description:
+                - Column names mapped to their types, in table order.
+                type: dict
+                required: no
+            engine:
+                description:
+                - Table engine with its parameters.
+                type: str
+                default: MergeTree
+            order_by:
+                description:
+                - C(ORDER BY) expression, C(tuple()) for MergeTree engines if not set.
+                type: str
+                required: no
+            partition_by:
+                description:
+                - C(PARTITION BY) expression.
+                type: str
+                required: no
+            settings:
+                description:
+                - Table settings.
+                type: dict
+                required: no
+    cluster:
+        description:
+        - Run the statements C(ON CLUSTER), so one run from one host creates the schema on every node.
+        - Only the schema of the connected server is read, use it with C(run_once).
+        type: str
+        required: no
+    login_host:
+        description:
+        - Host of the ClickHouse HTTP interface.
+        type: str
+        default: localhost
+    login_port:
+        description:
+        - Port of the ClickHouse HTTP interface.
+        type: int
+        default: 8123
+    login_user:
+        description:
+        - ClickHouse user.
+        type: str
+        default: default
+    login_password:
+        description:
+        - Password of I(login_user).
+        type: str
+        default: ''
+    https:
+        description:
+        - Connect with TLS.
+        type: bool
+        default: false
+    validate_certs:
+        description:
+        - Validate the server certificate with I(https=true).
+        type: bool
+        default: true
+    timeout:
+        description:
+        - Seconds to wait for every HTTP request.
+        type: int
+        default: 30
+
+author:
+    - Timur Alekseev (@Timych84)
+'''
+
+EXAMPLES = r'''
+# Database and syslog table from playbooks/clickhouse.yml
+- name: Create schema
+  timych.yandex_cloud_cvl.clickhouse_schema:
+    login_host: 127.0.0.1
+    databases: "{{ clickhouse_dbs_custom }}"
+    tables:
+      - name: logs.syslogd
+        query: "{{ clickhouse_syslog_table_query }}"
+
+# The same table defined by its columns, on every node of a cluster
+- name: Create schema
+  timych.yandex_cloud_cvl.clickhouse_schema:
+    cluster: logs_cluster
+    tables:
+      - name: logs.syslogd
+        columns:
+          PRIORITY: Int8
+          SYSLOG_FACILITY: Int8
+          SYSLOG_IDENTIFIER: String
+          host: String
+          message: String
+          source_type: String
+          timestamp: DateTime
+        engine: MergeTree
+        order_by: timestamp
+  run_once: true
+'''
+
+RETURN = r'''
+statements:
+    description: Statements sent to the server, or that would be sent in check mode, in order
+    type: list
+    returned: always
+    sample: ["CREATE DATABASE IF NOT EXISTS `logs`"]
+created:
+    description: Databases and tables created, tables as C(database.table)
+    type: list
+    returned: always
+    sample: ["logs", "logs.syslogd"]
+dropped:
+    description: Databases and tables dropped
+    type: list
+    returned: always
+    sample: []
+drift:
+    description: Columns of existing tables defined with I(columns) that are I(missing) in the table or I(extra) in it
+    type: dict
+    returned: always
+    sample: {"logs.syslogd": {"missing": ["severity"], "extra": []}}
+timings:
+    description: Every HTTP request of the run with its I(statement), I(started), I(duration) and I(rc) (HTTP status)
+    type: list
+    returned: always
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.clickhouse import (
+    DATABASE_ALREADY_EXISTS,
+    TABLE_ALREADY_EXISTS,
+    UNKNOWN_DATABASE,
+    UNKNOWN_TABLE,
+    ClickHouseClient,
+    ClickHouseError,
+    clickhouse_argument_spec,
+    quote_identifier,
+    quote_string,
+)
+
+# error codes meaning the statement found its object already created or dropped,
+# by the kind of the statement
+DONE_CODES = dict(
+    created=(DATABASE_ALREADY_EXISTS, TABLE_ALREADY_EXISTS),
+    dropped=(UNKNOWN_DATABASE, UNKNOWN_TABLE),
+)
+
+
+def table_name(table):
+    """Database and name of a table item."""
+    if '.' in table['name']:
+        return tuple(table['name'].split('.', 1))
+    return table['database'], table['name']
+
+
+def on_cluster(cluster):
+    return ' ON CLUSTER ' + quote_identifier(cluster) if cluster else ''
+
+
+def create_table_statement(database, name, table, cluster):
+    if table['query']:
+        return table['query'].strip().rstrip(';').strip()
+    columns = ', '.join('%s %s' % (quote_identifier(column), column_type)
+                        for column, column_type in table['columns'].items())
+    statement = 'CREATE TABLE IF NOT EXISTS %s.%s%s (%s) ENGINE = %s' % (
+        quote_identifier(database), quote_identifier(name), on_cluster(cluster), columns, table['engine'])
+    if table['partition_by']:
+        statement += ' PARTITION BY ' + table['partition_by']
+    if table['order_by']:
+        statement += ' ORDER BY ' + table['order_by']
+    elif table['engine'].split('(')[0].endswith('MergeTree'):
+        statement += ' ORDER BY tuple()'
+    if table['settings']:
+        statement += ' SETTINGS ' + ', '.join('%s = %s' % (key, value) for key, value in table['settings'].items())
+    return statement
+
+
+def read_schema(client, databases, compared):
+    """Existing databases, tables of the given databases and columns of the
+    compared tables, columns are only read if one of those exists."""
+    existing = set(row['name'] for row in client.select('SELECT name FROM system.databases'))
+    names = ', '.join(quote_string(database) for database in sorted(databases & existing))
+    tables = set()
+    columns = {}
+    if names:
+        for row in client.select('SELECT database, name FROM system.tables WHERE database IN (%s)' % names):
+            tables.add((row['database'], row['name']))
+    if compared & tables:
+        for row in client.select('SELECT database, table, name FROM system.columns WHERE database IN (%s) '
+                                 'ORDER BY database, table, position' % names):
+            columns.setdefault((row['database'], row['table']), []).append(row['name'])
+    return existing, tables, columns
+
+
+def plan(params, existing, tables, columns):
+    """Statements to run in order, with the object each creates or drops."""
+    cluster = params['cluster']
+    creates = []
+    drops = []
+    planned = set()
+
+    def create_database(name, engine=None, database_cluster=None):
+        if name in existing or name in planned:
+            return
+        planned.add(name)
+        statement = 'CREATE DATABASE IF NOT EXISTS %s%s' % (quote_identifier(name), on_cluster(database_cluster))
+        if engine:
+            statement += ' ENGINE = ' + engine
+        creates.append(('created', name, statement))
+
+    absent_databases = set()
+    for database in params['databases']:
+        database_cluster = database['cluster'] or cluster
+        if database['state'] == 'present':
+            create_database(database['name'], database['engine'], database_cluster)
+        elif database['name'] in existing:
+            absent_databases.add(database['name'])
+            drops.append(('dropped', database['name'], 'DROP DATABASE IF EXISTS %s%s' % (
+                quote_identifier(database['name']), on_cluster(database_cluster))))
+
+    drift = {}
+    table_creates = []
+    table_drops = []
+    for table in params['tables']:
+        database, name = table_name(table)
+        full_name = '%s.%s' % (database, name)
+        if table['state'] == 'absent':
+            if (database, name) in tables and database not in absent_databases:
+                table_drops.append(('dropped', full_name, 'DROP TABLE IF EXISTS %s.%s%s' % (
+                    quote_identifier(database), quote_identifier(name), on_cluster(cluster))))
+        elif (database, name) not in tables:
+            create_database(database, database_cluster=cluster)
+            table_creates.append(('created', full_name, create_table_statement(database, name, table, cluster)))
+        elif table['columns'] and (database, name) in columns:
+            current = columns[(database, name)]
+            missing = [column for column in table['columns'] if column not in current]
+            extra = [column for column in current if column not in table['columns']]
+            if missing or extra:
+                drift[full_name] = dict(missing=missing, extra=extra)
+    return creates + table_creates + table_drops + drops, drift
+
+
+def run_module():
+    table_options = dict(
+        name=dict(type='str', required=True),
+        database=dict(type='str', required=False, default='default'),
+        state=dict(type='str', choices=['present', 'absent'], default='present'),
+        query=dict(type='str', required=False),
+        columns=dict(type='dict', required=False),
+        engine=dict(type='str', required=False, default='MergeTree'),
+        order_by=dict(type='str', required=False),
+        partition_by=dict(type='str', required=False),
+        settings=dict(type='dict', required=False),
+    )
+    module_args = dict(
+        databases=dict(type='list', elements='dict', required=False, default=[], options=dict(
+            name=dict(type='str', required=True),
+            state=dict(type='str', choices=['present', 'absent'], default='present'),
+            engine=dict(type='str', required=False),
+            cluster=dict(type='str', required=False),
+        )),
+        tables=dict(type='list', elements='dict', required=False, default=[], options=table_options,
+                    mutually_exclusive=[('query', 'columns')]),
+        cluster=dict(type='str', required=False),
+    )
+    module_args.update(clickhouse_argument_spec())
+
+    result = dict(
+        changed=False,
+        statements=[],
+        created=[],
+        dropped=[],
+        drift={},
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    for table in module.params['tables']:
+        if table['state'] == 'present' and not (table['query'] or table['columns']):
+            module.fail_json(msg='query or columns is required for table ' + table['name'], **result)
+
+    client = ClickHouseClient(module.params)
+    try:
+        databases = set(database['name'] for database in module.params['databases'])
+        databases.update(table_name(table)[0] for table in module.params['tables'])
+        compared = set(table_name(table) for table in module.params['tables']
+                       if table['columns'] and table['state'] == 'present')
+        existing, tables, columns = read_schema(client, databases, compared)
+
+        statements, result['drift'] = plan(module.params, existing, tables, columns)
+        result['statements'] = [statement for kind, name, statement in statements]
+        for kind, name, statement in statements:
+            if not module.check_mode:
+                try:
+                    client.execute(statement)
+                except ClickHouseError as e:
+                    if e.code not in DONE_CODES[kind]:
+                        raise
+                    continue
+            result[kind].append(name)
+            result['changed'] = True
+    except ClickHouseError as e:
+        result.update(e.to_result())
+        result['timings'] = client.calls.timings()
+        module.fail_json(**result)
+    finally:
+        client.close()
+
+    result['timings'] = client.calls.timings()
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: inventory_file
+
+short_description: Keep a YAML inventory file of created instances up to date
+
+version_added: "1.1.0"
+
+description:
+    - Merges hosts into an inventory file in the format of the C(ansible.builtin.yaml) inventory plugin,
+      every group with its I(hosts) and their variables.
+    - Hosts come from the results of M(timych.yandex_cloud_cvl.yc) and M(timych.yandex_cloud_cvl.yc_instances),
+      grouped by the instance description, or are given with I(hosts). Instances deleted by
+      M(timych.yandex_cloud_cvl.yc_instances) and hosts given with I(state=absent) are removed, a
+      M(timych.yandex_cloud_cvl.yc) result of I(state=absent) does not name its instance and removes nothing.
+      Hosts that are not given are kept as they are.
+    - Only the I(hosts) of top level groups are managed. Group I(vars), I(children), hosts below I(children) and
+      groups without hosts written by hand are kept as they are.
+    - The file is rendered with sorted keys and written atomically only when its content changes.
+    - With I(json_path) the same inventory is also written as JSON, which Ansible loads faster than YAML.
+    - Runs on the controller, use it in a play on the control host.
+options:
+    path:
+        description:
+        - Path of the inventory file.
+        type: path
+        required: yes
+    instances:
+        description:
+        - Instances, either instance dicts or per-instance results with a I(vm) key.
+        - Per-item results of M(timych.yandex_cloud_cvl.yc_instances) with I(action=delete) remove the instance,
+          results without I(vm) are skipped.
+        type: list
+        elements: dict
+        required: no
+        default: []
+    groups:
+        description:
+        - Groups every instance is added to besides the one named by its description.
+        type: list
+        elements: str
+        required: no
+        default: []
+    host_vars:
+        description:
+        - Variables every instance gets besides I(ansible_host).
+        type: dict
+        required: no
+        default: {}
+    private_ip:
+        description:
+        - Use the private address of I(instances) as I(ansible_host) instead of the one-to-one NAT one.
+        type: bool
+        required: no
+        default: false
+    hosts:
+        description:
+        - Hosts to add or remove besides I(instances).
+        type: list
+        elements: dict
+        required: no
+        default: []
+        suboptions:
+            name:
+                description:
+                - Inventory name of the host.
+                type: str
+                required: yes
+            groups:
+                description:
+                - Groups of the host.
+                type: list
+                elements: str
+                required: no
+                default: []
+            vars:
+                description:
+                - Variables of the host, for example I(ansible_host).
+                type: dict
+                required: no
+                default: {}
+            state:
+                description:
+                - C(absent) removes the host from every group.
+                choices: [present, absent]
+                type: str
+                default: present
+    json_path:
+        description:
+        - If set, the inventory is also written to this path as JSON.
+        type: path
+        required: no
+
+extends_documentation_fragment:
+    - files
+
+author:
+    - Timur Alekseev (@Timych84)
+'''
+
+EXAMPLES = r'''
+# Inventory of the instances created by yc_instances
+- name: Write inventory
+  timych.yandex_cloud_cvl.inventory_file:
+    path: gen_inv.yml
+    json_path: gen_inv.json
+    instances: "{{ instace_result.instances }}"
+    mode: '0644'
+
+# Remove deleted instances
+- name: Remove destroyed hosts
+  timych.yandex_cloud_cvl.inventory_file:
+    path: gen_inv.yml
+    instances: "{{ destroy_result.instances }}"
+'''
+
+RETURN = r'''
+added:
+    description: Hosts that were not in the file
+    type: list
+    returned: always
+    sample: ["vector-02"]
+updated:
+    description: Hosts whose groups or variables changed
+    type: list
+    returned: always
+    sample: ["vector-01"]
+removed:
+    description: Hosts removed from the file
+    type: list
+    returned: always
+    sample: []
+hosts:
+    description: Number of hosts in the file
+    type: int
+    returned: always
+    sample: 3
+checksum:
+    description: SHA1 checksum of the rendered inventory file
+    type: str
+    returned: always
+    sample: 6a8c81291f3d2861d070a78d207a7cccb1727332
+'''
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import traceback
+
+from ansible.module_utils.basic import AnsibleModule, missing_required_lib
+from ansible.module_utils.common.text.converters import to_bytes
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc import instance_address
+
+try:
+    import yaml
+    HAS_YAML = True
+    YAML_IMPORT_ERROR = None
+except ImportError:
+    HAS_YAML = False
+    YAML_IMPORT_ERROR = traceback.format_exc()
+
+
+def read_inventory(path):
+    """Group entries of an existing inventory file, as written."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        data = yaml.safe_load(file) or {}
+    if not isinstance(data, dict):
+        raise ValueError('%s is not a YAML inventory' % path)
+    for group, entry in data.items():
+        if entry is not None and not isinstance(entry, dict):
+            raise ValueError('group %s of %s is not a mapping' % (group, path))
+    return data
+
+
+def inventory_hosts(inventory):
+    """Hosts of the groups of an inventory, as group -> host -> vars."""
+    groups = {}
+    for group, entry in inventory.items():
+        hosts = (entry or {}).get('hosts') or {}
+        groups[group] = dict((host, host_vars or {}) for host, host_vars in hosts.items())
+    return groups
+
+
+def replace_hosts(inventory, groups):
+    """Inventory with the hosts of every group set from groups.
+
+    Everything else of a group entry, such as vars and children, is kept,
+    as are groups without hosts. A group that only held hosts is dropped
+    when its last host is removed.
+    """
+    result = {}
+    for group in set(inventory) | set(groups):
+        entry = inventory.get(group)
+        if groups.get(group):
+            result[group] = dict(entry or {}, hosts=groups[group])
+            continue
+        if entry and entry.get('hosts'):
+            entry = dict((key, value) for key, value in entry.items() if key != 'hosts')
+            if not entry:
+                continue
+        result[group] = copy.deepcopy(entry)
+    return result
+
+
+def host_entries(groups):
+    """Groups and vars of every host of an inventory."""
+    entries = {}
+    for group, hosts in groups.items():
+        for host, host_vars in hosts.items():
+            entry = entries.setdefault(host, dict(groups=set(), vars=host_vars))
+            entry['groups'].add(group)
+    return entries
+
+
+def desired_hosts(module):
+    """Hosts to set, as name -> (groups, vars), and names to remove."""
+    params = module.params
+    present = {}
+    absent = set()
+    for instance in params['instances']:
+        if instance.get('action') == 'delete':
+            absent.add(instance['name'])
+            continue
+        # module results carry changed, instance dicts do not
+        vm = instance.get('vm') if 'changed' in instance else instance
+        if not vm or 'name' not in vm:
+            continue
+        host_vars = dict(params['host_vars'])
+        address = instance_address(vm, public=not params['private_ip'])
+        if address is not None:
+            host_vars['ansible_host'] = address
+        groups = set(params['groups'])
+        if vm.get('description'):
+            groups.add(vm['description'])
+        if not groups:
+            module.fail_json(msg='Instance %s has no description and groups is empty' % vm['name'])
+        present[vm['name']] = (groups, host_vars)
+    for host in params['hosts']:
+        if host['state'] == 'absent':
+            absent.add(host['name'])
+            present.pop(host['name'], None)
+        else:
+            if not host['groups']:
+                module.fail_json(msg='groups are required for host ' + host['name'])
+            present[host['name']] = (set(host['groups']), host['vars'])
+    return present, absent - set(present)
+
+
+def merge(groups, present, absent):
+    """New inventory with present hosts set and absent ones removed."""
+    groups = copy.deepcopy(groups)
+    current = host_entries(groups)
+    changes = dict(added=[], updated=[], removed=[])
+    for name in sorted(absent):
+        if name in current:
+            changes['removed'].append(name)
+    for name, (host_groups, host_vars) in sorted(present.items()):
+        if name not in current:
+            changes['added'].append(name)
+            continue
+        # a host keeps its address if it has none now, e.g. a stopped instance without NAT
+        if 'ansible_host' not in host_vars and 'ansible_host' in current[name]['vars']:
+            host_vars = dict(host_vars, ansible_host=current[name]['vars']['ansible_host'])
+            present[name] = (host_groups, host_vars)
+        if current[name]['groups'] != host_groups or current[name]['vars'] != host_vars:
+            changes['updated'].append(name)
+    for name in changes['removed'] + changes['updated']:
+        for hosts in groups.values():
+            hosts.pop(name, None)
+    for name in changes['added'] + changes['updated']:
+        host_groups, host_vars = present[name]
+        for group in host_groups:
+            groups.setdefault(group, {})[name] = dict(host_vars)
+    groups = dict((group, hosts) for group, hosts in groups.items() if hosts)
+    return groups, changes
+
+
+def write_file(module, path, content):
+    """Write content to path atomically if it differs, return whether it did."""
+    try:
+        with open(path, 'rb') as file:
+            if file.read() == content:
+                return False
+    except (IOError, OSError):
+        pass
+    if module.check_mode:
+        return True
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.inventory_file.')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        module.atomic_move(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return True
+
+
+def run_module():
+    module_args = dict(
+        path=dict(type='path', required=True),
+        instances=dict(type='list', elements='dict', required=False, default=[]),
+        groups=dict(type='list', elements='str', required=False, default=[]),
+        host_vars=dict(type='dict', required=False, default={}),
+        private_ip=dict(type='bool', required=False, default=False),
+        hosts=dict(type='list', elements='dict', required=False, default=[], options=dict(
+            name=dict(type='str', required=True),
+            groups=dict(type='list', elements='str', required=False, default=[]),
+            vars=dict(type='dict', required=False, default={}),
+            state=dict(type='str', choices=['present', 'absent'], default='present'),
+        )),
+        json_path=dict(type='path', required=False),
+    )
+
+    result = dict(
+        changed=False,
+        added=[],
+        updated=[],
+        removed=[],
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        add_file_common_args=True,
+        supports_check_mode=True
+    )
+
+    if not HAS_YAML:
+        module.fail_json(msg=missing_required_lib('PyYAML'), exception=YAML_IMPORT_ERROR)
+
+    path = module.params['path']
+    try:
+        current = read_inventory(path)
+    except (IOError, OSError, ValueError, yaml.YAMLError) as e:
+        module.fail_json(msg='Can not read inventory %s: %s' % (path, e), **result)
+
+    present, absent = desired_hosts(module)
+    groups, changes = merge(inventory_hosts(current), present, absent)
+    result.update(changes)
+    inventory = replace_hosts(current, groups)
+    result['hosts'] = len(host_entries(groups))
+
+    content = to_bytes(yaml.safe_dump(inventory, default_flow_style=False, sort_keys=True, explicit_start=True))
+    result['checksum'] = hashlib.sha1(content).hexdigest()
+    paths = [(path, content)]
+    if module.params['json_path']:
+        paths.append((module.params['json_path'], to_bytes(json.dumps(inventory, sort_keys=True) + '\n')))
+    for file_path, file_content in paths:
+        try:
+            result['changed'] = write_file(module, file_path, file_content) or result['changed']
+        except (IOError, OSError) as e:
+            module.fail_json(msg='Can not write %s: %s' % (file_path, e), **result)
+        if os.path.exists(file_path):
+            file_args = module.load_file_common_arguments(module.params, path=file_path)
+            result['changed'] = module.set_fs_attributes_if_different(file_args, result['changed'])
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -15,19 +15,59 @@ short_description: Module for writing content to file
 # i.e. the version is of the form "2.5.0" and not "2.4".
 version_added: "1.0.0"
 
-description:  Module for writing content to file
+description:
+    - Module for writing content to file.
+    - Content is written to a temporary file in the same directory, synced to disk and renamed
+      over the destination, so readers never see a partly written file.
 
 options:
     path:
         description:
         - Remote absolute path of file to write content.
+        - Required unless I(files) is used.
         type: path
-        required: yes
+        required: no
+    files:
+        description:
+        - List of files to write in one invocation instead of I(path).
+        - Every item takes I(path), I(content), I(content_b64), I(content_compressed), I(compression),
+          I(checksum), I(force), I(mode), I(owner) and I(group), options not set in an item are taken
+          from the module level.
+        type: list
+        elements: dict
+        required: no
     content:
         description:
         - Content to write to file.
+        - May be omitted when I(checksum) is set and the file is only checked.
+        - Mutually exclusive with I(content_b64) and I(content_compressed).
+        type: str
+        required: no
+    content_b64:
+        description:
+        - Base64 encoded content to write to file, use it for binary data.
+        type: str
+        required: no
+    content_compressed:
+        description:
+        - Base64 encoded compressed content to write to file, see I(compression).
+        - The content is decompressed while it is written, the whole decoded content is never held in memory.
+        type: str
+        required: no
+    compression:
+        description:
+        - Compression format of I(content_compressed).
+        type: str
+        choices: [ gzip, bzip2, xz ]
+        default: gzip
+    checksum:
+        description:
+        - Known checksum of the decoded content in C(<algorithm>:<hexdigest>) form, for example C(sha256:9f86d0...).
+          Any algorithm of python hashlib can be used, C(sha256) is assumed without a prefix.
+        - If set, the existing file is compared with the checksum instead of with I(content),
+          so the controller does not have to send the content when it knows its digest.
         type: str
-        required: yes
+        required: no
     force:
         description:
         - Influence whether the remote file must always be replaced.
@@ -35,10 +75,8 @@ options:
         - If C(false), the content will be written only if the destination does not exist.
         type: bool
         default: false
-# Specify this value according to your collection
-# in format of namespace.collection.doc_fragment_name
-# extends_documentation_fragment:
-#     - my_namespace.my_collection.my_doc_fragment_name
+extends_documentation_fragment:
+    - files
 
 author:
     - Timur Alekseev (@Timych84)
@@ -56,6 +94,28 @@ EXAMPLES = r'''
     path: "/home/user/myfile.txt"
     content: "my new content"
     force: true
+# Only check a big file against a digest known on the controller
+- name: Check content
+  timych.yandex_cloud_cvl.my_own_module:
+    path: "/home/user/big.txt"
+    checksum: "sha256:{{ lookup('file', 'big.txt') | hash('sha256') }}"
+# Write many config fragments in one task
+- name: Write config fragments
+  timych.yandex_cloud_cvl.my_own_module:
+    force: true
+    mode: '0644'
+    files:
+      - path: /etc/app/conf.d/10-main.conf
+        content: "{{ main_conf }}"
+      - path: /etc/app/conf.d/20-extra.conf
+        content: "{{ extra_conf }}"
+        mode: '0600'
+# Send a big generated artifact compressed
+- name: Write artifact
+  timych.yandex_cloud_cvl.my_own_module:
+    path: /opt/app/data.json
+    content_compressed: "{{ lookup('file', 'data.json.gz.b64') }}"
+    force: true
 '''
 
 RETURN = r'''
@@ -73,21 +133,240 @@ same_content:
 target_content:
     description: Content shoud be written to target
     type: str
-    returned: always
+    returned: when I(path) is used
     sample: 'test content'
+files:
+    description: Result of every item of I(files) with I(path), I(file_exists), I(same_content) and I(changed)
+    type: list
+    returned: when I(files) is used
+    sample: [{"path": "/etc/app/conf.d/10-main.conf", "file_exists": true, "same_content": true, "changed": false,
+              "bytes_written": 0, "elapsed": 0.001}]
+bytes_written:
+    description: Number of bytes written to the file, 0 if it was not written
+    type: int
+    returned: when I(path) is used
+    sample: 1048576
+elapsed:
+    description: Seconds spent comparing and writing the file
+    type: float
+    returned: when I(path) is used
+    sample: 0.042
 '''
+import base64
+import hashlib
 import os
-# import hashlib
+import tempfile
+import time
+import zlib
 
 from ansible.module_utils.basic import AnsibleModule
 
+CHUNK_SIZE = 64 * 1024
+# base64 characters that decode to CHUNK_SIZE bytes
+B64_CHUNK_SIZE = CHUNK_SIZE // 3 * 4
+CONTENT_KEYS = ('content', 'content_b64', 'content_compressed')
+
+
+def file_matches(path, data):
+    """Compare file with bytes without reading the whole file into memory.
+
+    Different size is a mismatch without reading the file, otherwise blocks
+    are compared until the first differing one.
+    """
+    if os.path.getsize(path) != len(data):
+        return False
+    view = memoryview(data)
+    offset = 0
+    with open(path, 'rb') as file:
+        while True:
+            block = file.read(CHUNK_SIZE)
+            if not block:
+                return True
+            if block != view[offset:offset + len(block)]:
+                return False
+            offset += len(block)
+
+
+def stream_matches(path, chunks):
+    """Compare file with an iterable of bytes, reading both block by block."""
+    with open(path, 'rb') as file:
+        for chunk in chunks:
+            if file.read(len(chunk)) != chunk:
+                return False
+        return not file.read(1)
+
+
+def b64_chunks(text):
+    """Decode base64 text piece by piece.
+
+    Whitespace is removed first, wherever it is, so every piece starts on a
+    4 character boundary.
+    """
+    text = ''.join(text.split())
+    for offset in range(0, len(text), B64_CHUNK_SIZE):
+        yield base64.b64decode(text[offset:offset + B64_CHUNK_SIZE])
+
+
+def _decompressor(compression):
+    if compression == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS), zlib.error
+    if compression == 'bzip2':
+        import bz2
+        return bz2.BZ2Decompressor(), (OSError, EOFError)
+    import lzma
+    return lzma.LZMADecompressor(), (lzma.LZMAError, EOFError)
+
+
+def decompress_chunks(chunks, compression):
+    """Decompress an iterable of bytes, never yielding more than CHUNK_SIZE
+    at once, so a highly compressed input does not expand in memory."""
+    decompressor, errors = _decompressor(compression)
+    try:
+        for chunk in chunks:
+            if compression == 'gzip':
+                while chunk:
+                    block = decompressor.decompress(chunk, CHUNK_SIZE)
+                    chunk = decompressor.unconsumed_tail
+                    if block:
+                        yield block
+            else:
+                block = decompressor.decompress(chunk, CHUNK_SIZE)
+                while True:
+                    if block:
+                        yield block
+                    if decompressor.eof or decompressor.needs_input:
+                        break
+                    block = decompressor.decompress(b'', CHUNK_SIZE)
+        if compression == 'gzip':
+            block = decompressor.flush()
+            if block:
+                yield block
+    except errors as e:
+        raise ValueError('Failed to decompress %s content: %s' % (compression, e))
+    if not decompressor.eof:
+        raise ValueError('Compressed %s content is truncated' % compression)
+
+
+def content_chunks(spec):
+    """Bytes of the wanted content as an iterable, decoded lazily."""
+    if spec['content'] is not None:
+        return [spec['content'].encode('utf-8')]
+    if spec['content_b64'] is not None:
+        return b64_chunks(spec['content_b64'])
+    return decompress_chunks(b64_chunks(spec['content_compressed']), spec['compression'])
+
+
+def file_checksum(path, algorithm):
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_checksum(checksum):
+    """Split '<algorithm>:<hexdigest>', sha256 is assumed without a prefix."""
+    if ':' in checksum:
+        algorithm, value = checksum.split(':', 1)
+    else:
+        algorithm, value = 'sha256', checksum
+    algorithm = algorithm.strip().lower()
+    if algorithm not in hashlib.algorithms_available:
+        raise ValueError('Unsupported checksum algorithm: %s' % algorithm)
+    return algorithm, value.strip().lower()
+
+
+def write_atomic(module, path, chunks):
+    """Write chunks of bytes to a temporary file next to path, fsync it and
+    rename it over path, so the file is either old or complete new content.
+
+    Returns the number of bytes written.
+    """
+    written = 0
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix='.%s.' % os.path.basename(path), dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            for chunk in chunks:
+                file.write(chunk)
+                written += len(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        module.atomic_move(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    # make the rename itself durable
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return written
+
+
+def process_file(module, spec):
+    """Compare one file with the wanted content and write it if needed.
+
+    Raises ValueError or EnvironmentError, the caller reports the error.
+    """
+    started = time.time()
+    path = spec['path']
+    has_content = any(spec[key] is not None for key in CONTENT_KEYS)
+    result = dict(path=path, changed=False, file_exists=os.path.exists(path), bytes_written=0)
+    # If file exists check that content in query and in file same
+    if result['file_exists']:
+        if spec['checksum']:
+            # Compare streamed hash of the file with the known one
+            algorithm, expected = parse_checksum(spec['checksum'])
+            result['same_content'] = file_checksum(path, algorithm) == expected
+        elif spec['content'] is not None:
+            # Compare size first and then block by block, stop at first difference
+            result['same_content'] = file_matches(path, spec['content'].encode('utf-8'))
+        else:
+            # Decode again while comparing, the decoded content is not kept
+            result['same_content'] = stream_matches(path, content_chunks(spec))
+
+    # Without force existing file is never replaced, with force only if content differs
+    if not result['file_exists'] or (spec['force'] and not result['same_content']):
+        if not has_content:
+            raise ValueError('content is required to write the file')
+        # Check that path exists and create it if needed
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        result['bytes_written'] = write_atomic(module, path, content_chunks(spec))
+        result['same_content'] = False
+        result['changed'] = True
+
+    file_args = module.load_file_common_arguments(spec, path=path)
+    result['changed'] = module.set_fs_attributes_if_different(file_args, result['changed'])
+    result['elapsed'] = round(time.time() - started, 3)
+    return result
+
 
 def run_module():
     # define available arguments/parameters a user can pass to the module
     module_args = dict(
-        path=dict(type='str', required=True),
-        content=dict(type='str', required=True),
-        force=dict(type='bool', default=False)
+        path=dict(type='str', required=False),
+        content=dict(type='str', required=False),
+        content_b64=dict(type='str', required=False),
+        content_compressed=dict(type='str', required=False),
+        compression=dict(type='str', required=False, default='gzip', choices=['gzip', 'bzip2', 'xz']),
+        checksum=dict(type='str', required=False),
+        force=dict(type='bool', default=False),
+        files=dict(type='list', elements='dict', required=False, options=dict(
+            path=dict(type='str', required=True),
+            content=dict(type='str', required=False),
+            content_b64=dict(type='str', required=False),
+            content_compressed=dict(type='str', required=False),
+            compression=dict(type='str', required=False, choices=['gzip', 'bzip2', 'xz']),
+            checksum=dict(type='str', required=False),
+            force=dict(type='bool', required=False),
+            mode=dict(type='raw', required=False),
+            owner=dict(type='str', required=False),
+            group=dict(type='str', required=False),
+        ), mutually_exclusive=[CONTENT_KEYS]),
     )
 
     # seed the result dict in the object
@@ -105,6 +384,9 @@ def run_module():
     # supports check mode
     module = AnsibleModule(
         argument_spec=module_args,
+        required_one_of=[('path', 'files')],
+        mutually_exclusive=[('path', 'files'), CONTENT_KEYS],
+        add_file_common_args=True,
         supports_check_mode=True
     )
     # if the user is working with this module in only check mode we do not
@@ -117,56 +399,42 @@ def run_module():
     # part where your module will do what it needs to do)
     # use whatever logic you need to determine whether or not this module
     # made any modifications to your target
-    result['file_exists'] = os.path.exists(module.params['path'])
-    result['target_content'] = module.params['content']
-    # If file exists and force not true check that content in query and in file same
-    if (os.path.exists(module.params['path']) and module.params['force'] is False):
-        # Usinig read all content from file and compare with content on query
+    if module.params['path'] is not None:
+        if all(module.params[key] is None for key in CONTENT_KEYS + ('checksum',)):
+            module.fail_json(msg='one of the following is required: %s, checksum' % ', '.join(CONTENT_KEYS), **result)
+        result['target_content'] = module.params['content']
         try:
-            with open(module.params['path'], 'r') as file:
-                file_content = file.read()
-                if file_content == module.params['content']:
-                    result['changed'] = False
-                    result['same_content'] = True
-                    module.exit_json(**result)
-                else:
-                    result['changed'] = False
-                    result['same_content'] = False
-                    module.exit_json(**result)
-        except Exception as e:
-            module.fail_json(msg='Error reading existing file: %s' % e, **result)
-        # Using compare with hash of contens(slower)
-        # content_hash = hashlib.sha1(module.params['content'].encode()).hexdigest()
-        # try:
-        #     with open(module.params['path'], 'rb') as file:
-        #         file_content = file.read()
-        #         file_hash = hashlib.sha1(file_content).hexdigest()
-        #         if file_hash == content_hash:
-        #             result['changed'] = False
-        #             module.exit_json(**result)
-        # except Exception as e:
-        #     print(f'Error reading existing file: {e}')
-        #     module.fail_json(msg='Error reading existing file: %s' % e, **result)
-
-    # Check that path exists and create it if needed
-    dir = os.path.dirname(module.params['path'])
-    if not os.path.exists(dir):
-        try:
-            os.makedirs(dir)
-        except Exception as e:
-            module.fail_json(msg='Error creating directory: %s' % e, **result)
+            result.update(process_file(module, module.params))
+        except ValueError as e:
+            module.fail_json(msg=str(e), **result)
+        except EnvironmentError as e:
+            module.fail_json(msg='Error writing file: %s' % e, **result)
+        del result['path']
+        module.exit_json(**result)
 
-    # Write content to file
-    try:
-        with open(module.params['path'], 'w') as file:
+    # Write every item of files, options not set in the item come from module level
+    result['files'] = []
+    failed = []
+    for item in module.params['files']:
+        spec = dict(module.params)
+        if any(item[key] is not None for key in CONTENT_KEYS):
+            # content of the item replaces the module level one whatever its form
+            spec.update((key, None) for key in CONTENT_KEYS)
+        spec.update((key, value) for key, value in item.items() if value is not None)
+        if all(spec[key] is None for key in CONTENT_KEYS + ('checksum',)):
+            file_result = dict(path=spec['path'], failed=True,
+                               msg='one of the following is required: %s, checksum' % ', '.join(CONTENT_KEYS))
+        else:
             try:
-                file.write(module.params['content'])
-                result['same_content'] = False
-                result['changed'] = True
-            except Exception as e:
-                module.fail_json(msg='Error writing file: %s' % e, **result)
-    except Exception as e:
-        module.fail_json(msg='Error opening file: %s' % e, **result)
+                file_result = process_file(module, spec)
+            except (ValueError, EnvironmentError) as e:
+                file_result = dict(path=spec['path'], failed=True, msg=str(e))
+        if file_result.get('failed'):
+            failed.append(spec['path'])
+        result['files'].append(file_result)
+    result['changed'] = any(file_result.get('changed') for file_result in result['files'])
+    if failed:
+        module.fail_json(msg='Error writing files: %s' % ', '.join(failed), **result)
 
     # in the event of a successful module execution, you will want to
     # simple AnsibleModule.exit_json(), passing the key/value results
@@ -0,0 +1,221 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: systemd_unit_wait
+
+short_description: Wait until one systemd unit is active, and optionally healthy
+
+version_added: "1.1.0"
+
+description:
+    - Polls the state of one unit with C(systemctl show) until it reaches I(state) or I(timeout) passes.
+      Unlike M(ansible.builtin.service_facts) no other service of the host is looked at, so a poll takes
+      milliseconds and can be done often.
+    - Returns as soon as the unit is in I(state). With I(health_url) the URL is then requested until it
+      answers with a 2xx status, within the same I(timeout).
+    - Fails at once, with the last lines of the unit journal, if the unit does not exist or has failed.
+options:
+    name:
+        description:
+        - Name of the unit, C(.service) is appended if it has no suffix.
+        type: str
+        required: yes
+    state:
+        description:
+        - C(active) waits for the unit to run, C(inactive) for it to stop.
+        choices: [active, inactive]
+        type: str
+        default: active
+    timeout:
+        description:
+        - Overall deadline in seconds, the health check included.
+        type: int
+        required: no
+        default: 60
+    interval:
+        description:
+        - Seconds between polls of the unit state and of I(health_url).
+        type: float
+        required: no
+        default: 0.5
+    health_url:
+        description:
+        - URL to request once the unit is active, for example C(http://127.0.0.1:8686/health) of the Vector API.
+        type: str
+        required: no
+    connect_timeout:
+        description:
+        - Timeout in seconds of one I(health_url) request.
+        type: float
+        required: no
+        default: 5
+    validate_certs:
+        description:
+        - Validate the certificate of an https I(health_url).
+        type: bool
+        required: no
+        default: true
+    journal_lines:
+        description:
+        - Lines of the unit journal returned when the unit fails, C(0) to not read the journal.
+        type: int
+        required: no
+        default: 20
+
+author:
+    - Timur Alekseev (@Timych84)
+'''
+
+EXAMPLES = r'''
+# Wait for Vector after the restart handler
+- name: Wait for vector
+  timych.yandex_cloud_cvl.systemd_unit_wait:
+    name: vector
+    timeout: 40
+
+# Also wait for the Vector API to report healthy
+- name: Wait for vector
+  timych.yandex_cloud_cvl.systemd_unit_wait:
+    name: vector
+    health_url: http://127.0.0.1:8686/health
+'''
+
+RETURN = r'''
+unit:
+    description: Name of the unit and its last polled properties
+    type: dict
+    returned: always
+    sample: {"name": "vector.service", "ActiveState": "active", "SubState": "running", "LoadState": "loaded",
+             "Result": "success", "MainPID": "12345", "NRestarts": "0"}
+attempts:
+    description: How many times the unit state was polled
+    type: int
+    returned: always
+    sample: 3
+health:
+    description: Result of the I(health_url) check with I(ready), I(elapsed), I(attempts) and the last I(error)
+    type: dict
+    returned: when I(health_url) is set and the unit reached I(state)
+    sample: {"url": "http://127.0.0.1:8686/health", "ready": true, "elapsed": 1.2, "attempts": 2, "error": null}
+journal:
+    description: Last lines of the unit journal
+    type: list
+    returned: when the unit does not reach I(state)
+elapsed:
+    description: Seconds spent waiting
+    type: float
+    returned: always
+    sample: 1.5
+'''
+
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.readiness import wait_for_http
+
+PROPERTIES = ('ActiveState', 'SubState', 'LoadState', 'Result', 'MainPID', 'NRestarts')
+
+
+def unit_name(name):
+    return name if '.' in name else name + '.service'
+
+
+def show_unit(module, systemctl, unit):
+    """Properties of one unit as printed by systemctl show."""
+    command = [systemctl, 'show', unit]
+    for prop in PROPERTIES:
+        command.append('--property=' + prop)
+    rc, out, err = module.run_command(command)
+    if rc != 0:
+        module.fail_json(msg='systemctl show %s failed: %s' % (unit, err.strip()), rc=rc)
+    return dict(line.split('=', 1) for line in out.splitlines() if '=' in line)
+
+
+def read_journal(module, unit, lines):
+    journalctl = module.get_bin_path('journalctl')
+    if not lines or journalctl is None:
+        return []
+    rc, out, err = module.run_command([journalctl, '--unit', unit, '--lines', str(lines), '--no-pager', '--quiet'])
+    return out.splitlines() if rc == 0 else []
+
+
+def wait_for_unit(module, systemctl, unit, state, deadline, interval):
+    """Poll the unit until it is in state, has failed or the deadline passes.
+
+    Returns the last properties, the number of polls and an error or None.
+    """
+    attempts = 0
+    while True:
+        attempts += 1
+        properties = show_unit(module, systemctl, unit)
+        active_state = properties.get('ActiveState')
+        if properties.get('LoadState') == 'not-found':
+            return properties, attempts, 'Unit %s not found' % unit
+        if active_state == state:
+            return properties, attempts, None
+        if state == 'active' and active_state == 'failed':
+            return properties, attempts, 'Unit %s failed: %s' % (unit, properties.get('Result'))
+        if time.time() + interval > deadline:
+            return properties, attempts, 'Unit %s is %s (%s), not %s' % (
+                unit, active_state, properties.get('SubState'), state)
+        time.sleep(interval)
+
+
+def run_module():
+    module_args = dict(
+        name=dict(type='str', required=True),
+        state=dict(type='str', choices=['active', 'inactive'], default='active'),
+        timeout=dict(type='int', required=False, default=60),
+        interval=dict(type='float', required=False, default=0.5),
+        health_url=dict(type='str', required=False),
+        connect_timeout=dict(type='float', required=False, default=5),
+        validate_certs=dict(type='bool', required=False, default=True),
+        journal_lines=dict(type='int', required=False, default=20),
+    )
+
+    result = dict(
+        changed=False,
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    params = module.params
+    unit = unit_name(params['name'])
+    systemctl = module.get_bin_path('systemctl', required=True)
+    started = time.time()
+    deadline = started + params['timeout']
+
+    properties, result['attempts'], error = wait_for_unit(module, systemctl, unit, params['state'], deadline,
+                                                          params['interval'])
+    result['unit'] = dict(properties, name=unit)
+    if error is None and params['health_url'] and params['state'] == 'active':
+        result['health'] = wait_for_http(params['health_url'], deadline, interval=params['interval'],
+                                         connect_timeout=params['connect_timeout'],
+                                         validate_certs=params['validate_certs'], started=started)
+        if not result['health']['ready']:
+            error = 'Unit %s is active, but %s is not healthy: %s' % (unit, params['health_url'],
+                                                                      result['health']['error'])
+    result['elapsed'] = round(time.time() - started, 3)
+
+    if error is not None:
+        result['journal'] = read_journal(module, unit, params['journal_lines'])
+        module.fail_json(msg=error, **result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
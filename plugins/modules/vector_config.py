@@ -0,0 +1,247 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: vector_config
+
+short_description: Validate, tune and write a Vector pipeline config
+
+version_added: "1.1.0"
+
+description:
+    - Checks the sources, transforms and sinks of a Vector config before it is written, so a wrong config fails
+      the task instead of the service restart. Component types, required options, inputs that do not exist and
+      transform cycles are found without Vector. With I(validate) the rendered file is also checked with
+      C(vector validate --no-environment) before it replaces I(dest).
+    - With I(target_events_per_second) the batch and buffer options of batched sinks, such as C(clickhouse),
+      are sized for that rate. Options set in I(config) are kept.
+    - The config is rendered with sorted keys and written atomically only when it differs from I(dest),
+      so a restart handler notified by the task only runs for real changes.
+options:
+    config:
+        description:
+        - Vector config with I(sources), I(sinks), optional I(transforms) and global options such as I(api).
+        type: dict
+        required: yes
+    dest:
+        description:
+        - Path of the config file, C(.json) files are written as JSON and others as YAML.
+        type: path
+        required: yes
+    target_events_per_second:
+        description:
+        - Sustained rate the batched sinks are sized for, their options are not changed if not set.
+        - A batch gets what arrives within I(batch_timeout) and the buffer I(buffer_seconds) worth of events.
+        type: int
+        required: no
+    event_size:
+        description:
+        - Average size of an event in bytes, used to size batches and the disk buffer.
+        type: int
+        required: no
+        default: 512
+    batch_timeout:
+        description:
+        - Seconds a sink collects events before sending a batch.
+        type: float
+        required: no
+        default: 1.0
+    buffer_type:
+        description:
+        - Buffer of the tuned sinks. C(disk) keeps events over a restart and is at least 256MiB.
+        type: str
+        choices: [disk, memory]
+        default: disk
+    buffer_seconds:
+        description:
+        - Seconds of events the buffer holds while a sink can not send, sources are blocked when it is full.
+        type: int
+        required: no
+        default: 300
+    validate:
+        description:
+        - C(auto) runs C(vector validate --no-environment) on the new file if vector is installed,
+          C(always) fails if it is not, C(never) only does the offline checks.
+        type: str
+        choices: [auto, always, never]
+        default: auto
+    vector_path:
+        description:
+        - Path of the vector binary, looked up in C(PATH) if not set.
+        type: path
+        required: no
+
+extends_documentation_fragment:
+    - files
+
+author:
+    - Timur Alekseev (@Timych84)
+'''
+
+EXAMPLES = r'''
+# Config of vector_role sized for 2000 events/s
+- name: Vector config
+  timych.yandex_cloud_cvl.vector_config:
+    config: "{{ vector_config }}"
+    dest: /etc/vector/vector.yml
+    target_events_per_second: 2000
+    mode: 0644
+  notify: Restart vector service
+'''
+
+RETURN = r'''
+dest:
+    description: Path of the config file
+    type: str
+    returned: always
+    sample: /etc/vector/vector.yml
+checksum:
+    description: SHA1 checksum of the rendered config
+    type: str
+    returned: always
+    sample: 2a1e4b0c0f3a8d9e7c6b5a4f3e2d1c0b9a8f7e6d
+tuned:
+    description: Batch and buffer options of every tuned sink
+    type: dict
+    returned: always
+    sample: {"clickhouse_syslog": {"batch": {"max_events": 2000, "max_bytes": 2048000, "timeout_secs": 1.0},
+             "buffer": {"type": "disk", "when_full": "block", "max_size": 307200000}}}
+validated:
+    description: Whether the file was checked with vector validate
+    type: bool
+    returned: always
+    sample: true
+errors:
+    description: Problems found in I(config)
+    type: list
+    returned: on failure
+    sample: ["sinks.clickhouse_syslog: input journald is not a source or transform"]
+'''
+
+import hashlib
+import json
+import os
+import tempfile
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.common.text.converters import to_bytes, to_native
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.vector import (
+    tune_pipeline,
+    validate_pipeline,
+)
+
+try:
+    import yaml
+    HAS_YAML = True
+except ImportError:
+    HAS_YAML = False
+
+
+def render(config, dest):
+    """Config file content, the same for the same config."""
+    if dest.endswith('.json') or not HAS_YAML:
+        # JSON is valid YAML as well
+        return json.dumps(config, indent=2, sort_keys=True) + '\n'
+    return yaml.safe_dump(config, default_flow_style=False, sort_keys=True)
+
+
+def read_file(path):
+    try:
+        with open(path, 'rb') as file:
+            return file.read()
+    except (IOError, OSError):
+        return None
+
+
+def run_module():
+    module_args = dict(
+        config=dict(type='dict', required=True),
+        dest=dict(type='path', required=True),
+        target_events_per_second=dict(type='int', required=False),
+        event_size=dict(type='int', required=False, default=512),
+        batch_timeout=dict(type='float', required=False, default=1.0),
+        buffer_type=dict(type='str', choices=['disk', 'memory'], default='disk'),
+        buffer_seconds=dict(type='int', required=False, default=300),
+        validate=dict(type='str', choices=['auto', 'always', 'never'], default='auto'),
+        vector_path=dict(type='path', required=False),
+    )
+
+    result = dict(
+        changed=False,
+        validated=False,
+        tuned={},
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        add_file_common_args=True,
+        supports_check_mode=True
+    )
+
+    params = module.params
+    dest = params['dest']
+    result['dest'] = dest
+
+    errors, warnings = validate_pipeline(params['config'])
+    if params['target_events_per_second'] is not None and params['target_events_per_second'] < 1:
+        errors.append('target_events_per_second must be positive')
+    if errors:
+        module.fail_json(msg='Invalid vector config: ' + '; '.join(errors), errors=errors, **result)
+    for warning in warnings:
+        module.warn(warning)
+
+    config, result['tuned'] = tune_pipeline(
+        params['config'], params['target_events_per_second'], event_size=params['event_size'],
+        batch_timeout=params['batch_timeout'], buffer_type=params['buffer_type'],
+        buffer_seconds=params['buffer_seconds'])
+    content = to_bytes(render(config, dest))
+    result['checksum'] = hashlib.sha1(content).hexdigest()
+    current = read_file(dest)
+
+    vector = None
+    if params['validate'] != 'never':
+        vector = params['vector_path'] or module.get_bin_path('vector', required=params['validate'] == 'always')
+        if params['vector_path'] and not os.access(vector, os.X_OK):
+            module.fail_json(msg='vector_path is not executable: ' + vector, **result)
+
+    if current != content:
+        result['changed'] = True
+        if module._diff:
+            result['diff'] = dict(before=to_native(current or b''), after=to_native(content),
+                                  before_header=dest, after_header=dest)
+        if not module.check_mode:
+            directory = os.path.dirname(dest) or '.'
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.vector_config.',
+                                            suffix=os.path.splitext(dest)[1])
+            try:
+                with os.fdopen(fd, 'wb') as file:
+                    file.write(content)
+                    file.flush()
+                    os.fsync(file.fileno())
+                if vector:
+                    rc, out, err = module.run_command([vector, 'validate', '--no-environment', tmp_path])
+                    if rc != 0:
+                        module.fail_json(msg='vector validate failed: %s' % (out + err).strip(), rc=rc, **result)
+                    result['validated'] = True
+                module.atomic_move(tmp_path, dest)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    file_args = module.load_file_common_arguments(params, path=dest)
+    if os.path.exists(dest):
+        result['changed'] = module.set_fs_attributes_if_different(file_args, result['changed'])
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -39,14 +39,44 @@ options:
         choices: [present, terminated, started, stopped, rebooted, absent]
         type: str
         default: present
-     update:
+    fingerprint:
         description:
-        - Set to true if needed to update instance configuration.
-        - Only cores, memory and core_fraction supported
-        - Requres reboot instance
+        - If true, created and updated instances get a C(cvl-spec) label with a hash of the managed options.
+        - With I(update=true) an instance whose label matches the options is left as it is without comparing
+          its fields or looking up its boot disk, so with I(current_state_from) an unchanged instance costs no
+          yc call at all.
+        - The label is not compared with I(labels) and is kept when I(labels) are replaced.
+          Instances created without it get it on the first run with I(update=true).
+        type: bool
+        required: no
+        default: true
+    update:
+        description:
+        - Set to true if needed to update configuration of an existing instance.
+        - I(description) and I(labels) are changed on the running instance.
+        - I(memory), I(cores), I(core_fraction), I(platform), I(preemptible) and growing the boot disk
+          to I(boot_disk.size) need the instance stopped. All of them are applied within one
+          stop/update/start cycle, and an instance that was stopped before is left stopped.
+        - Options that are not set are not changed, the boot disk is never shrunk.
         type: bool
         required: no
         default: false
+    current_state_from:
+        description:
+        - Result of M(timych.yandex_cloud_cvl.yc_instance_info) (or its I(by_name) dict) to take
+          the current state of the instance from instead of running C(yc compute instance get).
+        - Instances missing from the snapshot are treated as not existing.
+        type: dict
+        required: no
+    wait:
+        description:
+        - If false, the operation is started with C(--async) and its id is returned as I(operation_id)
+          instead of waiting for it to finish.
+        - Use M(timych.yandex_cloud_cvl.yc_operation_wait) to wait for the returned operations.
+        - With I(update=true) only the final start of the instance is not waited for.
+        type: bool
+        required: no
+        default: true
     zone:
         description:
         - The zone of the instance to create.
@@ -62,6 +92,16 @@ options:
         - Hostname of instance to be created.
         type: str
         required: no
+    labels:
+        description:
+        - Labels of the instance. Replace all existing labels when updated.
+        type: dict
+        required: no
+    platform:
+        description:
+        - Platform of the instance, for example C(standard-v3). yc default is used if not set.
+        type: str
+        required: no
     memory:
         description:
         - How much memory instance should have(GB)
@@ -119,12 +159,11 @@ options:
                 - Type of the boot disk of instance to create.
                 type: str
                 required: no
-                default=network-hdd
+                default: network-hdd
 
-# Specify this value according to your collection
-# in format of namespace.collection.doc_fragment_name
-# extends_documentation_fragment:
-#     - my_namespace.my_collection.my_doc_fragment_name
+extends_documentation_fragment:
+    - timych.yandex_cloud_cvl.yc_backend
+    - timych.yandex_cloud_cvl.yc_backend.preflight
 
 author:
     - Timur Alekseev (@Timych84)
@@ -166,6 +205,29 @@ EXAMPLES = r'''
         state: absent
         zone: ru-central1-a
 
+# Start instance creation without waiting for it
+- name: Create instance
+    timych.yandex_cloud_cvl.yc:
+        name: "compute-instance-1"
+        state: present
+        wait: false
+        zone: ru-central1-a
+    register: create_result
+
+- name: Wait for instance creation
+    timych.yandex_cloud_cvl.yc_operation_wait:
+        operation_ids:
+          - "{{ create_result.operation_id }}"
+
+# Create compute instance through the REST API instead of yc
+- name: Create instance
+    timych.yandex_cloud_cvl.yc:
+        name: "compute-instance-1"
+        state: present
+        zone: ru-central1-a
+        backend: api
+        folder_id: b1gxxxxxxxxxxxxxxxxx
+
 # Update compute instance
 - name: Update instance
     timych.yandex_cloud_cvl.yc:
@@ -186,6 +248,26 @@ yc_check_installed_rc:
     type: int
     returned: always
     sample: 0
+preflight:
+    description:
+    - Result of the yc configuration check, see I(preflight).
+    - I(cached) is true when the result of an earlier check was reused.
+    type: dict
+    returned: always
+    sample: {"rc": 0, "cached": true, "folder_id": "b1gxxxxxxxxxxxxxxxxx", "cloud_id": "b1gyyyyyyyyyyyyyyyyy"}
+changes:
+    description:
+    - Changes found by I(update=true), with current and desired value of every changed field.
+    - I(live) changes were applied to the running instance, I(restart) ones needed it stopped,
+      I(skipped) ones could not be applied.
+    type: dict
+    returned: when instance was updated
+    sample: {"live": {}, "restart": {"memory": {"current": 2, "desired": 4}}, "skipped": {}}
+restarted:
+    description: Whether the instance was stopped and started again by the update
+    type: bool
+    returned: when instance was updated
+    sample: true
 vm:
     description: Created instance info
     type: json
@@ -196,47 +278,47 @@ yc_command_result:
     type: str
     returned: always
     sample: all output from yc command
+operation_id:
+    description: Id of the started operation
+    type: str
+    returned: when I(wait=false) and instance was changed
+    sample: fhm2ah7r7u1mf4v3dnh5
+timings:
+    description:
+    - Every yc call or API request of the run in start order, with I(cmd) (yc argv) or I(method) and I(url),
+      I(started) (epoch seconds), I(duration) in seconds, I(rc) (exit code or HTTP status), I(operation_id)
+      when an operation was started and I(span) with the instance name in batch runs.
+    - Set I(trace_file) to also export them as trace spans.
+    type: list
+    returned: always
+    sample: [{"cmd": ["yc", "compute", "instance", "stop", "vector-01", "--format", "json"], "started": 1700000000.123,
+              "duration": 21.4, "rc": 0}]
 '''
 
-import json
-# import hashlib
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.calls import finish_calls
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc import (
+    YcError,
+    backend_argument_spec,
+    apply_action,
+    boot_disk_id,
+    build_yc_params,
+    fingerprint_matches,
+    instance_argument_spec,
+    plan_action,
+    preflight,
+    preflight_argument_spec,
+    snapshot_by_name,
+    yc_client,
+)
 
 
 def run_module():
     # define available arguments/parameters a user can pass to the module
-    module_args = dict(
-        name=dict(type='str', required=True),
-        description=dict(type='str', required=False),
-        state=dict(
-            type='str',
-            choices=[
-                'present',
-                'terminated',
-                'running',
-                'started',
-                'stopped',
-                'restarted',
-                'rebooted',
-                'absent'],
-            default='present'),
-        update=dict(type='bool', required=False, default=False),
-        zone=dict(type='str', required=True),
-        ssh_key=dict(type='str', required=False),
-        hostname=dict(type='str', required=False),
-        memory=dict(type='int', required=False, default="2"),
-        cores=dict(type='int', required=False, default="2"),
-        core_fraction=dict(type='int', required=False, default="20", choices=[5,20,50,100]),
-        public_ip=dict(type='bool', required=False, default=True),
-        preemptible=dict(type='bool', required=False, default=False),
-        boot_disk=dict(type='dict', required=False, default={}, options=dict(
-            image_family=dict(type='str', required=False, default="centos-stream-8"),
-            image_folder_id=dict(type='str', required=False, default="standard-images"),
-            size=dict(type='int', required=False, default="10"),
-            type=dict(type='str', required=False, default="network-hdd"),
-        )),
-    )
+    module_args = instance_argument_spec()
+    module_args.update(backend_argument_spec())
+    module_args.update(preflight_argument_spec())
+    module_args['current_state_from'] = dict(type='dict', required=False)
 
     # seed the result dict in the object
     # we primarily care about changed and state
@@ -267,140 +349,37 @@ def run_module():
     # use whatever logic you need to determine whether or not this module
     # made any modifications to your target
 
-    yc_params = {
-        'name': module.params['name'],
-        'description': module.params['description'],
-        'zone': module.params['zone'],
-        'ssh-key': module.params['ssh_key'],
-        'hostname': module.params['hostname'],
-        'create-boot-disk': {
-            'image-family': module.params['boot_disk']['image_family'],
-            'image-folder-id': module.params['boot_disk']['image_folder_id'],
-            'size': module.params['boot_disk']['size'],
-            'type': module.params['boot_disk']['type'],
-        },
-        'memory': (module.params['memory']),
-        'cores': module.params['cores'],
-        'core-fraction': module.params['core_fraction'],
-        'public-ip': module.params['public_ip'],
-        'preemptible': module.params['preemptible'],
-    }
-    yc_args = []
-    for key, value in yc_params.items():
-        if isinstance(value, dict):
-            yc_args.append(("--" + key))
-            output = ""
-            for key2, value2 in value.items():
-                # output += f"{key2}={value2}," #only Python3
-                output += key2 + "=" + str(value2) + ","
-            output = output[:-1]
-            yc_args.append(output)
-        elif isinstance(value, bool):
-            yc_args.append("--" + key)
-        elif isinstance(value, (str, int)):
-            yc_args.append("--" + key)
-            yc_args.append(str(value))
-
-    yc_check_installed = module.run_command(["yc",  "config", "list"], check_rc=True)
-    result['yc_check_installed_rc'] = yc_check_installed[0]
-    # result['yc_check_installed'] = yc_check_installed
-
-    yc_compute_instance_get = module.run_command(["yc", "compute", "instance", "get", yc_params['name'], "--format", "json"])
-    # result['yc_compute_instance_get'] = yc_compute_instance_get
-    if yc_compute_instance_get[0] == 0:
-        yc_compute_instance_info = json.loads(yc_compute_instance_get[1])
-
-    if (module.params['state'] == 'present'):
-        if (yc_compute_instance_get[0] != 0):
-            yc_args.extend(["--format", "json-rest"])
-            create_instance_command = "yc compute instance create"
-            yc_full_command = create_instance_command.split() + yc_args + ["--format", "json"]
-            # yc_joined = (' '.join(yc_full_command))
-            yc_result = module.run_command(yc_full_command, check_rc=True)
-            # result['yc_joined'] = yc_joined
-            # result['create'] = yc_result[1]
-            # result['message'] = yc_result
-            result['yc_command_result'] = yc_result
-            result['vm'] = json.loads(yc_result[1])
-            result['changed'] = True
-        else:
-            if ((module.params['update'] is True) and
-               ((yc_params['memory'] != int(yc_compute_instance_info['resources']['memory'])/1073741824) or
-               (yc_params['cores'] != int(yc_compute_instance_info['resources']['cores'])) or
-               (yc_params['core-fraction'] != int(yc_compute_instance_info['resources']['core_fraction'])))):
-                result['params'] = yc_compute_instance_info['resources']
-                yc_stop = module.run_command(["yc", "compute", "instance", "stop", yc_params['name']], check_rc=True)
-                # result['yc_stop'] = yc_stop
-                yc_update = module.run_command(["yc",
-                                                "compute",
-                                                "instance",
-                                                "update",
-                                                yc_params['name'],
-                                                "--memory",
-                                                str(yc_params['memory']),
-                                                "--cores",
-                                                str(yc_params['cores']),
-                                                "--core-fraction",
-                                                str(yc_params['core-fraction']),
-                                                "--format", "json"],
-                                               check_rc=True)
-                result['yc_command_result'] = yc_update
-                yc_start = module.run_command(["yc",
-                                               "compute",
-                                               "instance",
-                                               "start",
-                                               yc_params['name'],
-                                               "--format", "json"],
-                                              check_rc=True)
-                # result['yc_start'] = yc_start
-                result['changed'] = True
-            else:
-                result['changed'] = False
-                result['params'] = "Not changing same instance"
-
-            # module.fail_json(msg=('VM exists with name: ' + yc_params['name']), **result)
+    yc_params = build_yc_params(module.params)
+    cli = yc_client(module)
 
-    if (module.params['state'] == 'absent') or (module.params['state'] == 'terminated'):
-        if (yc_compute_instance_get[0] == 0):
-            yc_delete = module.run_command(["yc", "compute", "instance", "delete", yc_params['name'], "--format", "json"], check_rc=True)
-            result['yc_command_result'] = yc_delete
-            result['changed'] = True
-        else:
-            module.fail_json(msg=('No VM exists with name: ' + yc_params['name']), **result)
-
-    if (module.params['state'] == 'stopped'):
-        if (yc_compute_instance_get[0] == 0) and (yc_compute_instance_info['status'] == "RUNNING"):
-            yc_stop = module.run_command(["yc", "compute", "instance", "stop", yc_params['name'], "--format", "json"], check_rc=True)
-            result['yc_command_result'] = yc_stop
-            result['changed'] = True
-        else:
-            module.fail_json(msg=('No VM exists with name: ' + yc_params['name']), **result)
+    try:
+        result['preflight'] = preflight(module, cli)
+        result['yc_check_installed_rc'] = result['preflight']['rc']
 
-    if (module.params['state'] == 'started'):
-        if (yc_compute_instance_get[0] == 0) and (yc_compute_instance_info['status'] == "STOPPED") :
-            yc_start = module.run_command(["yc", "compute", "instance", "start", yc_params['name'], "--format", "json"], check_rc=True)
-            result['yc_command_result'] = yc_start
-            result['changed'] = True
+        if module.params['current_state_from'] is not None:
+            yc_compute_instance_info = snapshot_by_name(module.params['current_state_from']).get(yc_params['name'])
         else:
-            module.fail_json(msg=('No VM exists with state STOPPED and name: ' + yc_params['name']), **result)
-
-    if (module.params['state'] == 'restarted') or (module.params['state'] == 'rebooted'):
-        if (yc_compute_instance_get[0] == 0) and (yc_compute_instance_info['status'] == "RUNNING"):
-            yc_restart = module.run_command(["yc", "compute", "instance", "restart", yc_params['name'], "--format", "json"], check_rc=True)
-            result['yc_command_result'] = yc_restart
-            result['changed'] = True
-        else:
-            module.fail_json(msg=('No VM exists in state RUNNING with name: ' + yc_params['name']), **result)
-
-    # during the execution of the module, if there is an exception or a
-    # conditional state that effectively causes a failure, run
-    # AnsibleModule.fail_json() to pass in the message and the result
-    # if module.params['name'] == 'fail me':
-    #     module.fail_json(msg='You requested this to fail', **result)
+            yc_compute_instance_info = cli.get_instance(yc_params['name'])
+        fingerprint = module.params['fingerprint']
+        disk = None
+        # an instance with a matching fingerprint is up to date, its disk is not needed
+        if (module.params['update'] and module.params['state'] == 'present' and
+                yc_compute_instance_info is not None and boot_disk_id(yc_compute_instance_info) and
+                not (fingerprint and fingerprint_matches(yc_params, yc_compute_instance_info))):
+            disk = cli.get_disk(boot_disk_id(yc_compute_instance_info))
+        action = plan_action(yc_params, module.params['state'], module.params['update'], yc_compute_instance_info,
+                             disk, fingerprint)
+        result.update(apply_action(cli, action, yc_params, yc_compute_instance_info, module.params['wait'], disk,
+                                   fingerprint))
+    except YcError as e:
+        result.update(e.to_result())
+        finish_calls(module, cli, result, 'yc', failed=True)
+        module.fail_json(**result)
 
     # in the event of a successful module execution, you will want to
     # simple AnsibleModule.exit_json(), passing the key/value results
 
+    finish_calls(module, cli, result, 'yc')
     module.exit_json(**result)
 
 
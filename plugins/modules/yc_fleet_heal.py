@@ -0,0 +1,396 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: yc_fleet_heal
+
+short_description: Start stopped (preempted) Yandex cloud compute instances, recreating those that do not start
+
+version_added: "1.1.0"
+
+description:
+    - Brings back preemptible instances stopped by the cloud. Lists the folder once, selects instances by
+      I(names), I(labels) and I(description) and starts every selected instance in I(statuses) at the same time.
+      Instances that are already running are reported and left alone, so the task can run on a schedule.
+    - With I(recreate) an instance whose start fails because the instance itself is broken, a failed
+      precondition or a boot disk that is not found, is deleted and created again. Any other error, above all
+      authentication, permission and invalid argument errors, as well as quota, capacity and transient errors,
+      never leads to a recreation, the create would fail the same way after the delete.
+    - The name, description, labels, zone, hostname, platform, cores, memory, core fraction and preemptibility
+      of a recreated instance are taken from the listing, the boot disk and the SSH key from I(boot_disk) and
+      I(ssh_key).
+      An item of I(instances) with the same name overrides both, so the list given to
+      M(timych.yandex_cloud_cvl.yc_instances) can be passed as is.
+    - A recreated instance gets a new boot disk, data on the old one is lost. Nothing is touched unless
+      I(boot_disk) and I(ssh_key) are set, at module level or in the item, for every instance to heal.
+options:
+    names:
+        description:
+        - Names of the instances to heal.
+        type: list
+        elements: str
+        required: no
+    labels:
+        description:
+        - Labels an instance must all have to be healed.
+        type: dict
+        required: no
+    description:
+        description:
+        - Descriptions an instance must have one of to be healed, for example C(clickhouse).
+        type: list
+        elements: str
+        required: no
+    statuses:
+        description:
+        - Statuses of the instances to heal. Instances in other statuses are left alone.
+        type: list
+        elements: str
+        required: no
+        default: [STOPPED]
+    recreate:
+        description:
+        - Delete and create an instance again if starting it fails with a failed precondition or a boot disk
+          that is not found.
+        - Needs I(boot_disk) and I(ssh_key).
+        type: bool
+        required: no
+        default: false
+    instances:
+        description:
+        - Specs of the instances to recreate, items accept the options of M(timych.yandex_cloud_cvl.yc).
+        - Options an item sets win over the listing and the module options.
+        type: list
+        elements: dict
+        required: no
+        default: []
+    max_workers:
+        description:
+        - How many yc calls may run at the same time.
+        type: int
+        required: no
+        default: 10
+    wait:
+        description:
+        - Wait for the start and create operations. With I(wait=false) their ids are returned in
+          I(operation_ids) and an instance is only recreated if the start call itself fails.
+        type: bool
+        required: no
+        default: true
+
+# Options of recreated instances that the listing does not have (ssh_key, public_ip, boot_disk, fingerprint)
+# and fallbacks for the ones it has are the same as in the yc module. boot_disk has no default here.
+
+extends_documentation_fragment:
+    - timych.yandex_cloud_cvl.yc_backend
+    - timych.yandex_cloud_cvl.yc_backend.preflight
+
+author:
+    - Timur Alekseev (@Timych84)
+'''
+
+EXAMPLES = r'''
+# Bring back the preempted instances of the site
+- name: Heal site instances
+  timych.yandex_cloud_cvl.yc_fleet_heal:
+    description:
+      - clickhouse
+      - vector
+      - lighthouse
+  register: heal_result
+
+# Start instances labeled env=test, recreating the ones that can not be started
+- name: Heal test instances
+  timych.yandex_cloud_cvl.yc_fleet_heal:
+    labels:
+      env: test
+    recreate: true
+    ssh_key: "~/.ssh/id_rsa.pub"
+    boot_disk:
+      image_family: centos-stream-8
+      size: 10
+'''
+
+RETURN = r'''
+yc_check_installed_rc:
+    description: Check if yc installed and configured
+    type: int
+    returned: always
+    sample: 0
+preflight:
+    description: Result of the yc configuration check, see I(preflight).
+    type: dict
+    returned: always
+    sample: {"rc": 0, "cached": true, "folder_id": "b1gxxxxxxxxxxxxxxxxx", "cloud_id": "b1gyyyyyyyyyyyyyyyyy"}
+instances:
+    description:
+    - Per-instance results of the healed instances, sorted by name.
+    - Every item has I(name), I(status) before the run, I(action) (C(start) or C(recreate)), I(changed) and,
+      when known, I(vm), I(start_error) and I(operation_id).
+    type: list
+    returned: always
+running:
+    description: Names of selected instances that were already running
+    type: list
+    returned: always
+    sample: ["clickhouse-01"]
+skipped:
+    description: Names of selected instances in other statuses than I(statuses) and C(RUNNING), with their status
+    type: dict
+    returned: always
+    sample: {"vector-01": "STOPPING"}
+started:
+    description: Names of the instances that were started
+    type: list
+    returned: always
+    sample: ["vector-01", "lighthouse-01"]
+recreated:
+    description: Names of the instances that were deleted and created again
+    type: list
+    returned: always
+    sample: []
+operation_ids:
+    description: Ids of operations started with I(wait=false)
+    type: list
+    returned: success
+    sample: ["fhm2ah7r7u1mf4v3dnh5"]
+failed_instances:
+    description: Names of instances that could neither be started nor recreated
+    type: list
+    returned: on failure
+timings:
+    description:
+    - Every yc call or API request of the run in start order, with I(span) set to the instance name.
+      See M(timych.yandex_cloud_cvl.yc_instances).
+    type: list
+    returned: always
+'''
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.calls import finish_calls
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc import (
+    FINGERPRINT_LABEL,
+    GIB,
+    YcError,
+    apply_action,
+    backend_argument_spec,
+    build_yc_params,
+    classify_error,
+    instance_argument_spec,
+    instance_item_spec,
+    merge_instance_params,
+    preflight,
+    preflight_argument_spec,
+    yc_client,
+)
+
+
+# Start errors after which the instance itself is broken, so creating it
+# again can help. Denied errors win over them: the create would fail the
+# same way, but only after the delete. "code": N is the gRPC code in API
+# answers and operation errors.
+BROKEN_INSTANCE_ERRORS = re.compile(
+    r'FailedPrecondition|FAILED_PRECONDITION|"code": ?9\b|'
+    r'NotFound[^\n]*[Dd]isk|[Dd]isk[^\n]*(not found|NotFound|NOT_FOUND)')
+DENIED_ERRORS = re.compile(
+    r'PermissionDenied|PERMISSION_DENIED|[Pp]ermission denied|Unauthenticated|UNAUTHENTICATED|'
+    r'InvalidArgument|INVALID_ARGUMENT|IAM token|"code": ?(3|7|16)\b')
+
+
+def recreatable(error):
+    """True if a failed start of an instance is worth a delete and create."""
+    if error.rc in (401, 403):
+        return False
+    text = '\n'.join(part for part in (error.msg, error.stderr, error.stdout) if part)
+    if DENIED_ERRORS.search(text) or classify_error(error.rc, text) != 'fatal':
+        return False
+    return bool(BROKEN_INSTANCE_ERRORS.search(text))
+
+
+def selected(vm, names, labels, descriptions):
+    """True if vm matches every selector that is set."""
+    if names is not None and vm['name'] not in names:
+        return False
+    if descriptions is not None and vm.get('description') not in descriptions:
+        return False
+    vm_labels = vm.get('labels') or {}
+    return all(vm_labels.get(key) == str(value) for key, value in (labels or {}).items())
+
+
+def listed_params(vm):
+    """Instance options recorded in a listing, as yc module params."""
+    resources = vm.get('resources') or {}
+    params = dict(
+        name=vm['name'],
+        description=vm.get('description') or None,
+        zone=vm.get('zone_id'),
+        labels=dict((key, value) for key, value in (vm.get('labels') or {}).items()
+                    if key != FINGERPRINT_LABEL) or None,
+        platform=vm.get('platform_id'),
+        hostname=vm['fqdn'].split('.')[0] if vm.get('fqdn') else None,
+        preemptible=bool((vm.get('scheduling_policy') or {}).get('preemptible', False)),
+    )
+    if resources.get('memory'):
+        params['memory'] = int(resources['memory']) // GIB
+    if resources.get('cores'):
+        params['cores'] = int(resources['cores'])
+    if resources.get('core_fraction'):
+        params['core_fraction'] = int(resources['core_fraction'])
+    return params
+
+
+def run_module():
+    module_args = instance_argument_spec()
+    for key in ('name', 'state', 'update', 'wait', 'description', 'labels'):
+        del module_args[key]
+    module_args['zone']['required'] = False
+    # a recreated instance must not silently get a default disk
+    boot_disk_defaults = dict((key, option.pop('default'))
+                              for key, option in module_args['boot_disk']['options'].items())
+    del module_args['boot_disk']['default']
+    module_args.update(
+        names=dict(type='list', elements='str', required=False),
+        labels=dict(type='dict', required=False),
+        description=dict(type='list', elements='str', required=False),
+        statuses=dict(type='list', elements='str', required=False, default=['STOPPED']),
+        recreate=dict(type='bool', required=False, default=False),
+        instances=dict(type='list', elements='dict', required=False, default=[], options=instance_item_spec()),
+        max_workers=dict(type='int', required=False, default=10),
+        wait=dict(type='bool', required=False, default=True),
+    )
+    module_args.update(backend_argument_spec())
+    module_args.update(preflight_argument_spec())
+
+    result = dict(
+        changed=False,
+        instances=[],
+        running=[],
+        skipped={},
+        started=[],
+        recreated=[],
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        required_one_of=[('names', 'labels', 'description')],
+        supports_check_mode=True
+    )
+
+    params = module.params
+    if params['max_workers'] < 1:
+        module.fail_json(msg='max_workers must be at least 1', **result)
+
+    defaults = dict((key, value) for key, value in params.items() if key in instance_argument_spec())
+    defaults.update(name=None, state='present', update=False, description=None, labels=None)
+    specs = dict((item['name'], item) for item in params['instances'] if item.get('name'))
+    statuses = [status.upper() for status in params['statuses']]
+
+    cli = yc_client(module)
+    try:
+        result['preflight'] = preflight(module, cli)
+        result['yc_check_installed_rc'] = result['preflight']['rc']
+        listing = cli.list_instances()
+    except YcError as e:
+        result.update(e.to_result())
+        finish_calls(module, cli, result, 'yc_fleet_heal', failed=True)
+        module.fail_json(**result)
+
+    jobs = []
+    for vm in sorted(listing, key=lambda vm: vm['name']):
+        if not selected(vm, params['names'], params['labels'], params['description']):
+            continue
+        status = vm.get('status')
+        if status == 'RUNNING':
+            result['running'].append(vm['name'])
+        elif status not in statuses:
+            result['skipped'][vm['name']] = status
+        else:
+            item_result = dict(name=vm['name'], status=status, action='start', changed=False, vm=vm)
+            result['instances'].append(item_result)
+            jobs.append((item_result, vm))
+
+    if params['recreate']:
+        unspecified = [vm['name'] for item_result, vm in jobs
+                       if not (params['boot_disk'] or specs.get(vm['name'], {}).get('boot_disk')) or
+                       not (params['ssh_key'] or specs.get(vm['name'], {}).get('ssh_key'))]
+        if unspecified:
+            finish_calls(module, cli, result, 'yc_fleet_heal', failed=True)
+            module.fail_json(msg='recreate needs boot_disk and ssh_key for instances: ' + ', '.join(unspecified),
+                             **result)
+
+    if module.check_mode:
+        result['changed'] = bool(jobs)
+        finish_calls(module, cli, result, 'yc_fleet_heal')
+        module.exit_json(**result)
+
+    def recreate_params(vm):
+        spec = merge_instance_params(defaults, listed_params(vm))
+        spec = merge_instance_params(spec, specs.get(vm['name'], {}))
+        spec['boot_disk'] = dict(boot_disk_defaults, **dict(
+            (key, value) for key, value in (spec['boot_disk'] or {}).items() if value is not None))
+        if not spec.get('zone'):
+            raise YcError('zone of instance %s is unknown, set zone' % vm['name'])
+        return spec
+
+    def heal(job):
+        item_result, vm = job
+        wait = params['wait']
+        with cli.calls.span(item_result['name']):
+            try:
+                item_result.update(apply_action(cli, 'start', dict(name=vm['name']), vm, wait))
+                return
+            except YcError as e:
+                if not params['recreate'] or not recreatable(e):
+                    item_result.update(e.to_result())
+                    item_result['failed'] = True
+                    return
+                item_result['start_error'] = e.msg
+            # the name is only free again once the delete is done
+            item_result['action'] = 'recreate'
+            try:
+                spec = recreate_params(vm)
+                apply_action(cli, 'delete', dict(name=vm['name']), vm, True)
+                item_result['changed'] = True
+                item_result.update(apply_action(cli, 'create', build_yc_params(spec), None, wait,
+                                                fingerprint=spec['fingerprint']))
+            except YcError as e:
+                item_result.update(e.to_result())
+                item_result['failed'] = True
+
+    with ThreadPoolExecutor(max_workers=params['max_workers']) as executor:
+        list(executor.map(heal, jobs))
+
+    for item_result in result['instances']:
+        if item_result.get('failed'):
+            continue
+        if item_result['action'] == 'start':
+            result['started'].append(item_result['name'])
+        else:
+            result['recreated'].append(item_result['name'])
+    result['changed'] = any(item_result['changed'] for item_result in result['instances'])
+    result['operation_ids'] = [item_result['operation_id'] for item_result in result['instances']
+                               if 'operation_id' in item_result]
+    failed = [item_result['name'] for item_result in result['instances'] if item_result.get('failed')]
+    if failed:
+        result['failed_instances'] = failed
+        finish_calls(module, cli, result, 'yc_fleet_heal', failed=True)
+        module.fail_json(msg='Failed to heal instances: ' + ', '.join(failed), **result)
+
+    finish_calls(module, cli, result, 'yc_fleet_heal')
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,403 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: yc_instance_group
+
+short_description: Fixed size Yandex cloud instance group created from one instance template
+
+version_added: "1.1.0"
+
+description:
+    - Creates, scales, updates and deletes a fixed size instance group. All instances of the group are created
+      from one template built from the same options as M(timych.yandex_cloud_cvl.yc) takes for one instance.
+    - Creating the group or changing its size is one cloud operation, whatever the number of instances.
+    - Template changes are rolled out by the group according to I(max_unavailable) and I(max_expansion).
+      The image of an existing group is kept, so a newer image in I(boot_disk.image_family) does not recreate
+      the instances.
+    - Only the instances added or removed by the run are reported.
+options:
+    name:
+        description:
+        - Name of the instance group.
+        type: str
+        required: yes
+    description:
+        description:
+        - Description of the instance group.
+        type: str
+        required: no
+    state:
+        description:
+        - C(present) creates the group or brings it to I(size) and the template, C(absent) deletes it with its
+          instances.
+        choices: [present, absent]
+        type: str
+        default: present
+    size:
+        description:
+        - Number of instances in the group. Required with I(state=present).
+        type: int
+        required: no
+    instance_name:
+        description:
+        - Name and hostname template of the instances, C({instance.index}) is replaced by the instance number.
+        - Defaults to C(<name>-{instance.index}).
+        type: str
+        required: no
+    service_account_id:
+        description:
+        - Service account the group manages its instances with, needs the C(editor) role in the folder.
+        - Required to create the group.
+        type: str
+        required: no
+    max_unavailable:
+        description:
+        - How many instances may be stopped at once while a template change is rolled out.
+        type: int
+        required: no
+        default: 1
+    max_expansion:
+        description:
+        - How many instances may be created above I(size) while a template change is rolled out.
+        type: int
+        required: no
+        default: 0
+    wait:
+        description:
+        - Wait until the group has I(size) running instances of the current template.
+        - If false, the operation is only started and its id is returned as I(operation_id).
+        type: bool
+        required: no
+        default: true
+    wait_timeout:
+        description:
+        - Seconds to wait for the instances with I(wait=true).
+        type: int
+        required: no
+        default: 600
+    zone:
+        description:
+        - The zone of the instances.
+        type: str
+        required: yes
+    ssh_key:
+        description:
+        - Path to ssh key for user 'yc-user' created on every instance.
+        - A different key updates the template metadata of an existing group. Without it the metadata is kept.
+        type: str
+        required: no
+    labels:
+        description:
+        - Labels of the instances.
+        type: dict
+        required: no
+    platform:
+        description:
+        - Platform of the instances, C(standard-v2) if not set.
+        type: str
+        required: no
+    memory:
+        description:
+        - How much memory every instance should have(GB)
+        type: int
+        required: no
+        default: 2
+    cores:
+        description:
+        - How much cores every instance should have
+        type: int
+        required: no
+        default: 2
+    core_fraction:
+        description:
+        - What core_fraction every instance should have
+        type: int
+        required: no
+        choices: [5,20,50,100]
+        default: 20
+    public_ip:
+        description:
+        - If true, every instance gets a one-to-one NAT public IP.
+        type: bool
+        required: no
+        default: true
+    preemptible:
+        description:
+        - If true, instances are preemptible.
+        type: bool
+        required: no
+        default: False
+    boot_disk:
+        description:
+        - Boot disk of every instance.
+        type: dict
+        required: no
+        suboptions:
+            image_family:
+                description:
+                - Image_family of the instances, the latest image of it is used when the group is created.
+                type: str
+                required: no
+                default: centos-stream-8
+            image_folder_id:
+                description:
+                - image_folder_id of the image family.
+                type: str
+                required: no
+                default: standard-images
+            size:
+                description:
+                - Size of the boot disk(GB).
+                type: int
+                required: no
+                default: 10
+            type:
+                description:
+                - Type of the boot disk.
+                type: str
+                required: no
+                default: network-hdd
+
+extends_documentation_fragment:
+    - timych.yandex_cloud_cvl.yc_backend
+    - timych.yandex_cloud_cvl.yc_backend.preflight
+
+author:
+    - Timur Alekseev (@Timych84)
+'''
+
+EXAMPLES = r'''
+# Run five Vector collectors from one template
+- name: Vector collectors
+  timych.yandex_cloud_cvl.yc_instance_group:
+    name: vector
+    description: vector
+    size: 5
+    service_account_id: aje0123456789abcdefg
+    zone: ru-central1-a
+    ssh_key: "~/.ssh/id_rsa.pub"
+    preemptible: true
+  register: vector_group
+
+- name: Add new collectors to inventory
+  ansible.builtin.add_host:
+    name: "{{ item.name }}"
+    ansible_host: "{{ item.network_interfaces[0].primary_v4_address.one_to_one_nat.address }}"
+    groups: vector
+  loop: "{{ vector_group.added }}"
+
+# Delete the group and its instances
+- name: Delete vector collectors
+  timych.yandex_cloud_cvl.yc_instance_group:
+    name: vector
+    zone: ru-central1-a
+    state: absent
+'''
+
+RETURN = r'''
+action:
+    description: What was done, one of C(create), C(scale), C(update), C(delete), or null when nothing changed
+    type: str
+    returned: always
+    sample: scale
+changes:
+    description:
+    - Fields that differ from the existing group, each with its I(current) and I(desired) value.
+    - Memory and disk size are in bytes.
+    type: dict
+    returned: always
+    sample: {"size": {"current": 3, "desired": 5}}
+previous_size:
+    description: Number of instances before the run
+    type: int
+    returned: always
+    sample: 3
+size:
+    description: Number of instances after the run
+    type: int
+    returned: when I(wait=true)
+    sample: 5
+added:
+    description: Managed instances the group got during the run, as printed by yc compute instance-group list-instances
+    type: list
+    returned: when I(wait=true)
+removed:
+    description: Managed instances the group lost during the run
+    type: list
+    returned: when I(wait=true)
+operation_id:
+    description: Id of the started operation
+    type: str
+    returned: when I(wait=false) and the group was changed
+    sample: cl1a2b3c4d5e6f7g8h9i
+timings:
+    description: Every yc call or API request of the run, see M(timych.yandex_cloud_cvl.yc)
+    type: list
+    returned: always
+'''
+
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.calls import finish_calls
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc import (
+    YcError,
+    backend_argument_spec,
+    build_yc_params,
+    instance_argument_spec,
+    instance_group_changes,
+    instance_group_spec,
+    operation_id,
+    preflight,
+    preflight_argument_spec,
+    yc_client,
+)
+
+WAIT_INTERVAL = 5
+
+
+def wait_for_group(cli, name, size, deadline):
+    """Poll the managed instances until there are size of them, all running
+    the current template, or the deadline passes."""
+    while True:
+        instances = cli.list_instance_group_instances(name)
+        if len(instances) == size and all(instance.get('status') == 'RUNNING_ACTUAL' for instance in instances):
+            return instances, True
+        if time.time() >= deadline:
+            return instances, False
+        time.sleep(min(WAIT_INTERVAL, max(deadline - time.time(), 0)))
+
+
+def run_module():
+    module_args = instance_argument_spec()
+    for key in ('update', 'fingerprint', 'hostname'):
+        del module_args[key]
+    module_args['state'] = dict(type='str', choices=['present', 'absent'], default='present')
+    module_args.update(
+        size=dict(type='int', required=False),
+        instance_name=dict(type='str', required=False),
+        service_account_id=dict(type='str', required=False),
+        max_unavailable=dict(type='int', required=False, default=1),
+        max_expansion=dict(type='int', required=False, default=0),
+        wait_timeout=dict(type='int', required=False, default=600),
+    )
+    module_args.update(backend_argument_spec())
+    module_args.update(preflight_argument_spec())
+
+    result = dict(
+        changed=False,
+        action=None,
+        changes={},
+        previous_size=0,
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        required_if=[('state', 'present', ['size'])],
+        supports_check_mode=True
+    )
+
+    params = module.params
+    name = params['name']
+    if params['size'] is not None and params['size'] < 0:
+        module.fail_json(msg='size must not be negative', **result)
+
+    cli = yc_client(module)
+    try:
+        result['preflight'] = preflight(module, cli)
+        current = cli.get_instance_group(name)
+        before = cli.list_instance_group_instances(name) if current is not None else []
+        result['previous_size'] = len(before)
+
+        spec = None
+        if params['state'] == 'absent':
+            if current is not None:
+                result['action'] = 'delete'
+        else:
+            group = dict(
+                name=name,
+                size=params['size'],
+                service_account_id=params['service_account_id'],
+                instance_name=params['instance_name'] or name + '-{instance.index}',
+                max_unavailable=params['max_unavailable'],
+                max_expansion=params['max_expansion'],
+                folder_id=params['folder_id'],
+            )
+            yc_params = build_yc_params(dict(params, hostname=None))
+            if current is None:
+                if not params['service_account_id']:
+                    raise YcError('service_account_id is required to create instance group: ' + name)
+                result['action'] = 'create'
+                if not module.check_mode:
+                    boot_disk = yc_params['create-boot-disk']
+                    subnet = cli.zone_subnet(params['zone'])
+                    image_id = cli.latest_image_id(boot_disk['image-family'], boot_disk['image-folder-id'])
+                    spec = instance_group_spec(yc_params, group, image_id, subnet['network_id'], subnet['id'])
+            else:
+                # keep image and network of the group, only what the options describe is managed
+                template = current['instance_template']
+                interface = template['network_interface_specs'][0]
+                group['service_account_id'] = group['service_account_id'] or current.get('service_account_id')
+                spec = instance_group_spec(yc_params, group, template['boot_disk_spec']['disk_spec'].get('image_id'),
+                                           interface.get('network_id'), (interface.get('subnet_ids') or [None])[0])
+                if template.get('metadata') and not yc_params['ssh-key']:
+                    spec['instance_template']['metadata'] = template['metadata']
+                if yc_params['labels'] is None and template.get('labels'):
+                    spec['instance_template']['labels'] = template['labels']
+                if yc_params['platform'] is None:
+                    spec['instance_template']['platform_id'] = template.get('platform_id')
+                if yc_params['description'] is None and current.get('description'):
+                    spec['description'] = current['description']
+                result['changes'] = instance_group_changes(spec, current)
+                if result['changes']:
+                    result['action'] = 'scale' if list(result['changes']) == ['size'] else 'update'
+
+        if result['action'] is not None:
+            result['changed'] = True
+        if module.check_mode or result['action'] is None:
+            finish_calls(module, cli, result, 'yc_instance_group')
+            module.exit_json(**result)
+
+        if result['action'] == 'create':
+            yc_result = cli.create_instance_group(spec, params['wait'])
+        elif result['action'] == 'delete':
+            yc_result = cli.delete_instance_group(name, params['wait'])
+        else:
+            yc_result = cli.update_instance_group(name, spec, params['wait'])
+
+        if not params['wait']:
+            result['operation_id'] = operation_id(yc_result)
+        else:
+            after = []
+            if result['action'] != 'delete':
+                after, ready = wait_for_group(cli, name, params['size'], time.time() + params['wait_timeout'])
+                if not ready:
+                    result['instances'] = after
+                    raise YcError('Instance group %s did not get %d running instances in %d seconds'
+                                  % (name, params['size'], params['wait_timeout']))
+            known = set(instance['name'] for instance in before)
+            kept = set(instance['name'] for instance in after)
+            result['size'] = len(after)
+            result['added'] = [instance for instance in after if instance['name'] not in known]
+            result['removed'] = [instance for instance in before if instance['name'] not in kept]
+    except YcError as e:
+        result.update(e.to_result())
+        finish_calls(module, cli, result, 'yc_instance_group', failed=True)
+        module.fail_json(**result)
+
+    finish_calls(module, cli, result, 'yc_instance_group')
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: yc_instance_info
+
+short_description: Snapshot of all Yandex cloud compute instances in a folder
+
+version_added: "1.1.0"
+
+description:
+    - Lists every compute instance of the folder with one (paginated) call and indexes
+      the result by name, description, label and status.
+    - The registered result can be passed to I(current_state_from) of M(timych.yandex_cloud_cvl.yc)
+      and M(timych.yandex_cloud_cvl.yc_instances), so they do not look the instances up themselves.
+    - The snapshot is not refreshed by later tasks, register it again after instances were changed.
+
+extends_documentation_fragment:
+    - timych.yandex_cloud_cvl.yc_backend
+
+author:
+    - Timur Alekseev (@Timych84)
+'''
+
+EXAMPLES = r'''
+- name: Get all instances
+  timych.yandex_cloud_cvl.yc_instance_info:
+  register: yc_snapshot
+
+- name: Update instance without another lookup
+  timych.yandex_cloud_cvl.yc:
+    name: "{{ item }}"
+    state: present
+    update: true
+    zone: ru-central1-a
+    memory: 4
+    current_state_from: "{{ yc_snapshot }}"
+  loop: "{{ yc_snapshot.by_description['clickhouse'] | default([]) }}"
+'''
+
+RETURN = r'''
+instances:
+    description: All instances of the folder as printed by yc compute instance list
+    type: list
+    returned: always
+by_name:
+    description: Instances indexed by name
+    type: dict
+    returned: always
+by_description:
+    description: Instance names grouped by description
+    type: dict
+    returned: always
+    sample: {"clickhouse": ["clickhouse-01"], "vector": ["vector-01", "vector-02"]}
+by_label:
+    description: Instance names grouped by C(key=value) of every label
+    type: dict
+    returned: always
+    sample: {"env=prod": ["clickhouse-01", "vector-01"]}
+by_status:
+    description: Instance names grouped by status
+    type: dict
+    returned: always
+    sample: {"RUNNING": ["clickhouse-01"], "STOPPED": ["vector-01"]}
+count:
+    description: Number of instances
+    type: int
+    returned: always
+    sample: 2
+timings:
+    description:
+    - Every yc call or API request of the run in start order, with I(cmd) (yc argv) or I(method) and I(url),
+      I(started) (epoch seconds), I(duration) in seconds, I(rc) (exit code or HTTP status), I(operation_id)
+      when an operation was started and I(span) with the instance name in batch runs.
+    - Set I(trace_file) to also export them as trace spans.
+    type: list
+    returned: always
+    sample: [{"cmd": ["yc", "compute", "instance", "list", "--format", "json"], "started": 1700000000.123,
+              "duration": 1.2, "rc": 0}]
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.calls import finish_calls
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc import (
+    YcError,
+    backend_argument_spec,
+    index_instances,
+    yc_client,
+)
+
+
+def run_module():
+    module_args = backend_argument_spec()
+
+    result = dict(
+        changed=False,
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    cli = yc_client(module)
+    try:
+        instances = cli.list_instances()
+    except YcError as e:
+        result.update(e.to_result())
+        finish_calls(module, cli, result, 'yc_instance_info', failed=True)
+        module.fail_json(**result)
+
+    result.update(index_instances(instances))
+    result['count'] = len(instances)
+
+    finish_calls(module, cli, result, 'yc_instance_info')
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,508 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: yc_instances
+
+short_description: Reconcile a list of Yandex cloud compute instances in one run
+
+version_added: "1.1.0"
+
+description:
+    - Batch form of M(timych.yandex_cloud_cvl.yc).
+    - Lists the folder once, builds a create/update/delete plan for every item of I(instances)
+      and runs the required yc calls concurrently.
+    - Every option of M(timych.yandex_cloud_cvl.yc) except I(name) can be set at module level
+      and is used as a default for items that do not set it themselves.
+options:
+    instances:
+        description:
+        - List of instances to reconcile.
+        - Every item accepts the same options as M(timych.yandex_cloud_cvl.yc), I(name) is required.
+        type: list
+        elements: dict
+        required: yes
+    max_workers:
+        description:
+        - How many yc calls may run at the same time.
+        type: int
+        required: no
+        default: 10
+    strategy:
+        description:
+        - "I(strategy=parallel): apply all changes at once, limited by I(max_workers) only."
+        - "I(strategy=rolling): update and restart existing instances in batches of I(max_parallel),
+          moving to the next batch only when every instance of the current one passes I(health_check).
+          Creates, deletes, starts and stops are still done in parallel before the first batch."
+        - On the first failed or unhealthy batch the remaining instances are left untouched.
+        type: str
+        choices: [parallel, rolling]
+        default: parallel
+    max_parallel:
+        description:
+        - Batch size for I(strategy=rolling), a number of instances or a percentage like C(25%).
+        type: str
+        required: no
+        default: 25%
+    health_check:
+        description:
+        - Readiness probe for I(strategy=rolling), run on every restarted instance of a batch.
+        - Without it a batch is healthy as soon as its yc calls succeeded.
+        type: dict
+        required: no
+        suboptions:
+            port:
+                description:
+                - TCP port to probe, for example C(22), C(8123) for Clickhouse or C(8686) for the Vector API.
+                type: int
+                required: yes
+            banner:
+                description:
+                - If set, data sent by the server must start with this string.
+                type: str
+                required: no
+            timeout:
+                description:
+                - Seconds every batch may take to become healthy.
+                type: int
+                required: no
+                default: 300
+            interval:
+                description:
+                - Seconds between probes of the same instance.
+                type: float
+                required: no
+                default: 2
+            private_ip:
+                description:
+                - Probe the private address instead of the one-to-one NAT one.
+                type: bool
+                required: no
+                default: false
+    state:
+        description:
+        - Default goal state for the instances, see M(timych.yandex_cloud_cvl.yc).
+        choices: [present, terminated, started, stopped, rebooted, absent]
+        type: str
+        default: present
+    update:
+        description:
+        - Default for I(update), see M(timych.yandex_cloud_cvl.yc).
+        type: bool
+        default: false
+    fingerprint:
+        description:
+        - Default for I(fingerprint), see M(timych.yandex_cloud_cvl.yc).
+        - Instances with a matching fingerprint label need neither the disk listing nor a field comparison,
+          so an unchanged fleet costs one instance listing.
+        type: bool
+        default: true
+    current_state_from:
+        description:
+        - Result of M(timych.yandex_cloud_cvl.yc_instance_info) (or its I(by_name) dict) to take
+          the current state of the instances from instead of running C(yc compute instance list).
+        - Instances missing from the snapshot are treated as not existing.
+        type: dict
+        required: no
+    wait:
+        description:
+        - Default for I(wait), see M(timych.yandex_cloud_cvl.yc).
+        - Ids of all started operations are returned in I(operation_ids).
+        type: bool
+        default: true
+    zone:
+        description:
+        - Default zone of the instances. Must be set here or in every item.
+        type: str
+        required: no
+
+# Remaining module level options (description, ssh_key, hostname, memory, cores, core_fraction,
+# public_ip, preemptible, boot_disk) are the same as in the yc module.
+
+extends_documentation_fragment:
+    - timych.yandex_cloud_cvl.yc_backend
+    - timych.yandex_cloud_cvl.yc_backend.preflight
+
+author:
+    - Timur Alekseev (@Timych84)
+'''
+
+EXAMPLES = r'''
+# Create three instances with shared settings
+- name: Create site instances
+  timych.yandex_cloud_cvl.yc_instances:
+    zone: ru-central1-a
+    ssh_key: "~/.ssh/id_rsa.pub"
+    update: true
+    preemptible: true
+    max_workers: 5
+    instances:
+      - name: clickhouse-01
+        description: clickhouse
+        hostname: clickhouse-01
+        memory: 4
+      - name: vector-01
+        description: vector
+        hostname: vector-01
+      - name: lighthouse-01
+        description: lighthouse
+        hostname: lighthouse-01
+
+# Resize a Clickhouse tier four nodes at a time, waiting for port 8123 after each batch
+- name: Resize clickhouse
+  timych.yandex_cloud_cvl.yc_instances:
+    zone: ru-central1-a
+    update: true
+    memory: 16
+    strategy: rolling
+    max_parallel: 4
+    health_check:
+      port: 8123
+    instances:
+      - name: clickhouse-01
+      - name: clickhouse-02
+      - name: clickhouse-03
+      - name: clickhouse-04
+      - name: clickhouse-05
+      - name: clickhouse-06
+      - name: clickhouse-07
+      - name: clickhouse-08
+
+# Destroy instances
+- name: Destroy site instances
+  timych.yandex_cloud_cvl.yc_instances:
+    zone: ru-central1-a
+    state: absent
+    instances:
+      - name: clickhouse-01
+      - name: vector-01
+      - name: lighthouse-01
+'''
+
+RETURN = r'''
+yc_check_installed_rc:
+    description: Check if yc installed and configured
+    type: int
+    returned: always
+    sample: 0
+preflight:
+    description:
+    - Result of the yc configuration check, see I(preflight).
+    - I(cached) is true when the result of an earlier check was reused.
+    type: dict
+    returned: always
+    sample: {"rc": 0, "cached": true, "folder_id": "b1gxxxxxxxxxxxxxxxxx", "cloud_id": "b1gyyyyyyyyyyyyyyyyy"}
+plan:
+    description: Names of the instances grouped by planned action
+    type: dict
+    returned: always
+    sample: {"create": ["vector-01"], "update": [], "delete": [], "unchanged": ["clickhouse-01"]}
+instances:
+    description:
+    - Per-instance results in the order of I(instances).
+    - Every item has I(name), I(action), I(changed) and, when known, I(vm) and I(yc_command_result).
+    type: list
+    returned: always
+operation_ids:
+    description: Ids of operations started with I(wait=false)
+    type: list
+    returned: success
+    sample: ["fhm2ah7r7u1mf4v3dnh5", "fhmv0dj0nmvdu3rdh2a0"]
+batches:
+    description:
+    - Batches of I(strategy=rolling) in the order they ran.
+    - Every batch has its I(instances), whether it was I(healthy), seconds spent in yc calls (I(update_elapsed)),
+      in the health check (I(health_elapsed)) and in total (I(elapsed)).
+    type: list
+    returned: when I(strategy=rolling)
+    sample: [{"instances": ["ch-01", "ch-02"], "healthy": true, "update_elapsed": 74.2, "health_elapsed": 21.5,
+              "elapsed": 95.7}]
+failed_instances:
+    description: Names of instances that could not be reconciled
+    type: list
+    returned: on failure
+skipped_instances:
+    description: Names of instances left untouched because an earlier rolling batch failed
+    type: list
+    returned: on failure
+timings:
+    description:
+    - Every yc call or API request of the run in start order, with I(cmd) (yc argv) or I(method) and I(url),
+      I(started) (epoch seconds), I(duration) in seconds, I(rc) (exit code or HTTP status), I(operation_id)
+      when an operation was started and I(span) with the instance name in batch runs.
+    - Set I(trace_file) to also export them as trace spans.
+    type: list
+    returned: always
+    sample: [{"cmd": ["yc", "compute", "instance", "stop", "vector-01", "--format", "json"], "started": 1700000000.123,
+              "duration": 21.4, "rc": 0}]
+'''
+
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.readiness import wait_for_port
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.calls import finish_calls
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc import (
+    YcError,
+    backend_argument_spec,
+    apply_action,
+    boot_disk_id,
+    build_yc_params,
+    fingerprint_matches,
+    instance_address,
+    instance_argument_spec,
+    instance_item_spec,
+    merge_instance_params,
+    plan_action,
+    preflight,
+    preflight_argument_spec,
+    snapshot_by_name,
+    yc_client,
+)
+
+PLAN_KEYS = ['create', 'update', 'delete', 'start', 'stop', 'restart', 'unchanged']
+# actions that take running instances down and are rolled out batch by batch
+ROLLING_ACTIONS = ('update', 'restart')
+
+
+def batch_size(max_parallel, total):
+    """Number of instances per batch from a count or a percentage of total."""
+    value = max_parallel.strip()
+    try:
+        if value.endswith('%'):
+            size = int(math.ceil(total * float(value[:-1]) / 100))
+        else:
+            size = int(value)
+    except ValueError:
+        raise ValueError('max_parallel must be a number or a percentage: ' + max_parallel)
+    return max(size, 1)
+
+
+def run_module():
+    module_args = instance_argument_spec()
+    del module_args['name']
+    module_args['zone']['required'] = False
+    module_args.update(
+        instances=dict(type='list', elements='dict', required=True, options=instance_item_spec()),
+        max_workers=dict(type='int', required=False, default=10),
+        strategy=dict(type='str', required=False, choices=['parallel', 'rolling'], default='parallel'),
+        max_parallel=dict(type='str', required=False, default='25%'),
+        health_check=dict(type='dict', required=False, options=dict(
+            port=dict(type='int', required=True),
+            banner=dict(type='str', required=False),
+            timeout=dict(type='int', required=False, default=300),
+            interval=dict(type='float', required=False, default=2),
+            private_ip=dict(type='bool', required=False, default=False),
+        )),
+    )
+    module_args.update(backend_argument_spec())
+    module_args.update(preflight_argument_spec())
+    module_args['current_state_from'] = dict(type='dict', required=False)
+
+    result = dict(
+        changed=False,
+        plan=dict((key, []) for key in PLAN_KEYS),
+        instances=[],
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    if module.params['max_workers'] < 1:
+        module.fail_json(msg='max_workers must be at least 1', **result)
+    try:
+        batch_size(module.params['max_parallel'], 1)
+    except ValueError as e:
+        module.fail_json(msg=str(e), **result)
+
+    defaults = dict((key, value) for key, value in module.params.items()
+                    if key in instance_argument_spec())
+    items = []
+    for item in module.params['instances']:
+        params = merge_instance_params(defaults, item)
+        if not params.get('zone'):
+            module.fail_json(msg='zone is required for instance: ' + params['name'], **result)
+        items.append(params)
+
+    names = [params['name'] for params in items]
+    if len(set(names)) != len(names):
+        module.fail_json(msg='Instance names must be unique', **result)
+
+    rolling = module.params['strategy'] == 'rolling'
+    if rolling and not all(params['wait'] for params in items):
+        module.fail_json(msg='strategy=rolling needs wait=true for all instances', **result)
+
+    cli = yc_client(module)
+    try:
+        result['preflight'] = preflight(module, cli)
+        result['yc_check_installed_rc'] = result['preflight']['rc']
+        if module.params['current_state_from'] is not None:
+            current = snapshot_by_name(module.params['current_state_from'])
+        else:
+            current = dict((vm['name'], vm) for vm in cli.list_instances())
+    except YcError as e:
+        result.update(e.to_result())
+        finish_calls(module, cli, result, 'yc_instances', failed=True)
+        module.fail_json(**result)
+
+    # one disk listing instead of a disk lookup per updated instance
+    disks = {}
+
+    def needs_disk(params):
+        info = current.get(params['name'])
+        return (params['update'] and params['state'] == 'present' and info is not None and
+                not (params['fingerprint'] and fingerprint_matches(build_yc_params(params), info)))
+
+    if any(needs_disk(params) for params in items):
+        try:
+            disks = dict((disk['id'], disk) for disk in cli.list_disks())
+        except YcError as e:
+            result.update(e.to_result())
+            finish_calls(module, cli, result, 'yc_instances', failed=True)
+            module.fail_json(**result)
+
+    # Work out the plan up front, so nothing is touched if any item is invalid
+    jobs = []
+    failed = []
+    for params in items:
+        yc_params = build_yc_params(params)
+        info = current.get(params['name'])
+        disk = disks.get(boot_disk_id(info)) if info is not None else None
+        item_result = dict(name=params['name'], changed=False)
+        if info is not None:
+            item_result['vm'] = info
+        try:
+            action = plan_action(yc_params, params['state'], params['update'], info, disk, params['fingerprint'])
+        except YcError as e:
+            item_result.update(e.to_result())
+            item_result['failed'] = True
+            failed.append(params['name'])
+            action = None
+        else:
+            result['plan'][action or 'unchanged'].append(params['name'])
+        item_result['action'] = action
+        result['instances'].append(item_result)
+        jobs.append((item_result, action, yc_params, info, disk, params['wait'], params['fingerprint']))
+
+    if failed:
+        result['failed_instances'] = failed
+        finish_calls(module, cli, result, 'yc_instances', failed=True)
+        module.fail_json(msg='Can not reconcile instances: ' + ', '.join(failed), **result)
+
+    if module.check_mode:
+        result['changed'] = any(job[1] is not None for job in jobs)
+        finish_calls(module, cli, result, 'yc_instances')
+        module.exit_json(**result)
+
+    def reconcile(job):
+        item_result, action, yc_params, info, disk, wait, fingerprint = job
+        try:
+            with cli.calls.span(item_result['name']):
+                item_result.update(apply_action(cli, action, yc_params, info, wait, disk, fingerprint))
+        except YcError as e:
+            item_result.update(e.to_result())
+            item_result['failed'] = True
+
+    pending = [job for job in jobs if job[1] is not None]
+    rolling_jobs = [job for job in pending if rolling and job[1] in ROLLING_ACTIONS]
+    parallel_jobs = [job for job in pending if job not in rolling_jobs]
+
+    def healthy(batch):
+        """Probe every restarted instance of a batch, addresses are taken from a
+        fresh listing because a dynamic public address changes on restart."""
+        check = module.params['health_check']
+        restarted = [job[0]['name'] for job in batch if job[0].get('restarted') or job[1] == 'restart']
+        if not check or not restarted:
+            return True
+        started = time.time()
+        deadline = started + check['timeout']
+        try:
+            listing = dict((vm['name'], vm) for vm in cli.list_instances())
+        except YcError as e:
+            for job in batch:
+                job[0]['health'] = dict(ready=False, error='Can not list instances: ' + e.msg)
+            return False
+
+        def probe(item_result):
+            vm = listing.get(item_result['name'])
+            address = instance_address(vm, public=not check['private_ip']) if vm else None
+            if address is None:
+                item_result['health'] = dict(ready=False, error='instance has no address')
+            else:
+                item_result['vm'] = vm
+                item_result['health'] = wait_for_port(address, check['port'], deadline,
+                                                      interval=check['interval'], banner=check['banner'],
+                                                      started=started)
+            return item_result['health']['ready']
+
+        targets = [job[0] for job in batch if job[0]['name'] in restarted]
+        with ThreadPoolExecutor(max_workers=len(targets)) as probes:
+            return all(list(probes.map(probe, targets)))
+
+    with ThreadPoolExecutor(max_workers=module.params['max_workers']) as executor:
+        list(executor.map(reconcile, parallel_jobs))
+
+        if rolling:
+            result['batches'] = []
+            size = batch_size(module.params['max_parallel'], len(rolling_jobs))
+            if any(job[0].get('failed') for job in parallel_jobs):
+                for job in rolling_jobs:
+                    job[0]['skipped'] = True
+                rolling_jobs = []
+            for start in range(0, len(rolling_jobs), size):
+                batch = rolling_jobs[start:start + size]
+                started = time.time()
+                list(executor.map(reconcile, batch))
+                updated = time.time()
+                batch_ok = not any(job[0].get('failed') for job in batch) and healthy(batch)
+                finished = time.time()
+                result['batches'].append(dict(
+                    instances=[job[0]['name'] for job in batch],
+                    healthy=batch_ok,
+                    update_elapsed=round(updated - started, 3),
+                    health_elapsed=round(finished - updated, 3),
+                    elapsed=round(finished - started, 3),
+                ))
+                if not batch_ok:
+                    for job in batch:
+                        health = job[0].get('health', dict(ready=True))
+                        if not job[0].get('failed') and not health['ready']:
+                            job[0]['failed'] = True
+                            job[0]['msg'] = 'Instance not healthy after update'
+                            if health.get('error'):
+                                job[0]['msg'] += ': ' + health['error']
+                    for job in rolling_jobs[start + size:]:
+                        job[0]['skipped'] = True
+                    break
+
+    result['changed'] = any(item_result['changed'] for item_result in result['instances'])
+    result['operation_ids'] = [item_result['operation_id'] for item_result in result['instances']
+                               if 'operation_id' in item_result]
+    failed = [item_result['name'] for item_result in result['instances'] if item_result.get('failed')]
+    skipped = [item_result['name'] for item_result in result['instances'] if item_result.get('skipped')]
+    if failed or skipped:
+        result['failed_instances'] = failed
+        result['skipped_instances'] = skipped
+        finish_calls(module, cli, result, 'yc_instances', failed=True)
+        module.fail_json(msg='Failed to reconcile instances: ' + ', '.join(failed) +
+                         ('; not updated: ' + ', '.join(skipped) if skipped else ''), **result)
+
+    finish_calls(module, cli, result, 'yc_instances')
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
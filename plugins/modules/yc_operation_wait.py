@@ -0,0 +1,218 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: yc_operation_wait
+
+short_description: Wait for Yandex cloud operations to finish
+
+version_added: "1.1.0"
+
+description:
+    - Polls a list of operations started with I(wait=false) by M(timych.yandex_cloud_cvl.yc)
+      or M(timych.yandex_cloud_cvl.yc_instances) until all of them are done.
+    - All pending operations are polled together every round, the delay between rounds grows
+      from I(poll_interval) up to I(max_poll_interval).
+options:
+    operation_ids:
+        description:
+        - Ids of operations to wait for.
+        type: list
+        elements: str
+        required: yes
+    timeout:
+        description:
+        - Overall deadline in seconds for all operations.
+        type: int
+        required: no
+        default: 600
+    poll_interval:
+        description:
+        - Delay in seconds before the second polling round.
+        type: float
+        required: no
+        default: 2
+    max_poll_interval:
+        description:
+        - Upper limit in seconds for the delay between polling rounds.
+        type: float
+        required: no
+        default: 30
+    backoff:
+        description:
+        - Factor the delay between polling rounds is multiplied by after every round.
+        type: float
+        required: no
+        default: 1.5
+    max_workers:
+        description:
+        - How many operations may be polled at the same time.
+        type: int
+        required: no
+        default: 10
+    fail_on_error:
+        description:
+        - If true, the task fails when any of the operations finished with an error.
+        type: bool
+        required: no
+        default: true
+
+extends_documentation_fragment:
+    - timych.yandex_cloud_cvl.yc_backend
+
+author:
+    - Timur Alekseev (@Timych84)
+'''
+
+EXAMPLES = r'''
+# Start creating several instances and wait for all of them in one step
+- name: Create instances
+  timych.yandex_cloud_cvl.yc_instances:
+    zone: ru-central1-a
+    wait: false
+    instances:
+      - name: vector-01
+      - name: vector-02
+      - name: vector-03
+  register: create_result
+
+- name: Wait for instances
+  timych.yandex_cloud_cvl.yc_operation_wait:
+    operation_ids: "{{ create_result.operation_ids }}"
+    timeout: 300
+'''
+
+RETURN = r'''
+operations:
+    description: Final state of every operation, indexed by operation id
+    type: dict
+    returned: always
+    sample: {"fhm2ah7r7u1mf4v3dnh5": {"done": true, "description": "Create instance", "elapsed": 41.2}}
+pending:
+    description: Ids of operations that were not done before the deadline
+    type: list
+    returned: always
+    sample: []
+failed_operations:
+    description: Ids of operations that finished with an error
+    type: list
+    returned: always
+    sample: []
+elapsed:
+    description: Seconds spent waiting
+    type: float
+    returned: always
+    sample: 42.5
+timings:
+    description:
+    - Every yc call or API request of the run in start order, with I(cmd) (yc argv) or I(method) and I(url),
+      I(started) (epoch seconds), I(duration) in seconds, I(rc) (exit code or HTTP status), I(operation_id)
+      when an operation was started and I(span) with the instance name in batch runs.
+    - Set I(trace_file) to also export them as trace spans.
+    type: list
+    returned: always
+    sample: [{"cmd": ["yc", "operation", "get", "fhm0b28lgfp4tbq5s4sa", "--format", "json"],
+              "started": 1700000000.123, "duration": 0.9, "rc": 0}]
+'''
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.calls import finish_calls
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc import (
+    YcError,
+    backend_argument_spec,
+    yc_client,
+)
+
+
+def run_module():
+    module_args = dict(
+        operation_ids=dict(type='list', elements='str', required=True),
+        timeout=dict(type='int', required=False, default=600),
+        poll_interval=dict(type='float', required=False, default=2),
+        max_poll_interval=dict(type='float', required=False, default=30),
+        backoff=dict(type='float', required=False, default=1.5),
+        max_workers=dict(type='int', required=False, default=10),
+        fail_on_error=dict(type='bool', required=False, default=True),
+    )
+    module_args.update(backend_argument_spec())
+
+    result = dict(
+        changed=False,
+        operations={},
+        pending=[],
+        failed_operations=[],
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    if module.params['max_workers'] < 1:
+        module.fail_json(msg='max_workers must be at least 1', **result)
+
+    cli = yc_client(module)
+    started = time.time()
+    deadline = started + module.params['timeout']
+    interval = module.params['poll_interval']
+    # keep order, drop duplicates
+    pending = list(dict.fromkeys(module.params['operation_ids']))
+
+    def poll(operation_id):
+        try:
+            return operation_id, cli.get_operation(operation_id), None
+        except YcError as e:
+            return operation_id, None, e
+
+    with ThreadPoolExecutor(max_workers=min(module.params['max_workers'], max(len(pending), 1))) as executor:
+        while pending:
+            still_pending = []
+            for operation_id, operation, error in executor.map(poll, pending):
+                if error is not None:
+                    result.update(error.to_result())
+                    result['pending'] = pending
+                    finish_calls(module, cli, result, 'yc_operation_wait', failed=True)
+                    module.fail_json(**result)
+                if not operation.get('done'):
+                    still_pending.append(operation_id)
+                    continue
+                operation['elapsed'] = round(time.time() - started, 3)
+                result['operations'][operation_id] = operation
+                if 'error' in operation:
+                    result['failed_operations'].append(operation_id)
+            pending = still_pending
+            if not pending:
+                break
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            time.sleep(min(interval, remaining))
+            interval = min(interval * module.params['backoff'], module.params['max_poll_interval'])
+
+    result['pending'] = pending
+    result['elapsed'] = round(time.time() - started, 3)
+
+    failed = bool(pending) or bool(result['failed_operations'] and module.params['fail_on_error'])
+    finish_calls(module, cli, result, 'yc_operation_wait', failed=failed)
+    if pending:
+        module.fail_json(msg='Timed out waiting for operations: ' + ', '.join(pending), **result)
+    if result['failed_operations'] and module.params['fail_on_error']:
+        module.fail_json(msg='Operations finished with error: ' + ', '.join(result['failed_operations']), **result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: yc_wait_ready
+
+short_description: Wait until many hosts accept connections on a port
+
+version_added: "1.1.0"
+
+description:
+    - Probes a TCP port (SSH by default) on all given hosts at the same time until every one of them
+      is ready or the overall I(timeout) passes.
+    - Hosts can be given as addresses or as instances returned by M(timych.yandex_cloud_cvl.yc)
+      and M(timych.yandex_cloud_cvl.yc_instances), their one-to-one NAT address is probed then.
+    - Runs on the controller, use it in a play on the control host.
+options:
+    hosts:
+        description:
+        - Addresses to probe.
+        type: list
+        elements: str
+        required: no
+        default: []
+    instances:
+        description:
+        - Instances to probe, either instance dicts or per-instance results with a I(vm) key.
+        - Results without I(vm), for example of unchanged instances, are skipped.
+        type: list
+        elements: dict
+        required: no
+        default: []
+    private_ip:
+        description:
+        - Probe the private address of I(instances) instead of the one-to-one NAT one.
+        type: bool
+        required: no
+        default: false
+    port:
+        description:
+        - Port to probe.
+        type: int
+        required: no
+        default: 22
+    banner:
+        description:
+        - If set, the port is only ready once the server sends data starting with this string.
+        - Use C(SSH-) to wait for sshd itself instead of any open socket.
+        type: str
+        required: no
+    delay:
+        description:
+        - Seconds to wait before the first probe.
+        type: int
+        required: no
+        default: 0
+    timeout:
+        description:
+        - Overall deadline in seconds for all hosts, I(delay) included.
+        type: int
+        required: no
+        default: 300
+    interval:
+        description:
+        - Seconds between probes of the same host.
+        type: float
+        required: no
+        default: 2
+    connect_timeout:
+        description:
+        - Timeout in seconds of one connection attempt.
+        type: float
+        required: no
+        default: 5
+    max_workers:
+        description:
+        - How many hosts may be probed at the same time, all of them when not set.
+        - All probes share the I(timeout) deadline, hosts queued behind busy probes get less of it.
+        type: int
+        required: no
+
+author:
+    - Timur Alekseev (@Timych84)
+'''
+
+EXAMPLES = r'''
+# Wait for ssh on all instances created by yc_instances
+- name: Wait for ssh connect
+  timych.yandex_cloud_cvl.yc_wait_ready:
+    instances: "{{ instace_result.instances | selectattr('changed') | list }}"
+    banner: "SSH-"
+    timeout: 300
+
+# Wait for Clickhouse HTTP interface
+- name: Wait for clickhouse
+  timych.yandex_cloud_cvl.yc_wait_ready:
+    hosts:
+      - 10.0.0.5
+      - 10.0.0.6
+    port: 8123
+'''
+
+RETURN = r'''
+hosts:
+    description: Probe result of every host, indexed by host name or address
+    type: dict
+    returned: always
+    sample: {"vector-01": {"host": "51.250.1.2", "port": 22, "ready": true, "elapsed": 23.4, "attempts": 9,
+                           "error": null}}
+ready:
+    description: Hosts that became ready
+    type: list
+    returned: always
+    sample: ["vector-01"]
+not_ready:
+    description: Hosts that were not ready before the deadline
+    type: list
+    returned: always
+    sample: []
+elapsed:
+    description: Seconds spent waiting
+    type: float
+    returned: always
+    sample: 25.1
+'''
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.readiness import wait_for_port
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc import instance_address
+
+
+def run_module():
+    module_args = dict(
+        hosts=dict(type='list', elements='str', required=False, default=[]),
+        instances=dict(type='list', elements='dict', required=False, default=[]),
+        private_ip=dict(type='bool', required=False, default=False),
+        port=dict(type='int', required=False, default=22),
+        banner=dict(type='str', required=False),
+        delay=dict(type='int', required=False, default=0),
+        timeout=dict(type='int', required=False, default=300),
+        interval=dict(type='float', required=False, default=2),
+        connect_timeout=dict(type='float', required=False, default=5),
+        max_workers=dict(type='int', required=False),
+    )
+
+    result = dict(
+        changed=False,
+        hosts={},
+        ready=[],
+        not_ready=[],
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    if module.params['max_workers'] is not None and module.params['max_workers'] < 1:
+        module.fail_json(msg='max_workers must be at least 1', **result)
+
+    targets = dict((host, host) for host in module.params['hosts'])
+    for instance in module.params['instances']:
+        vm = instance['vm'] if 'vm' in instance else instance
+        if not vm or 'name' not in vm:
+            continue
+        address = instance_address(vm, public=not module.params['private_ip'])
+        if address is None:
+            module.fail_json(msg='Instance has no address: ' + vm['name'], **result)
+        targets[vm['name']] = address
+
+    started = time.time()
+    deadline = started + module.params['timeout']
+    if targets and module.params['delay']:
+        time.sleep(min(module.params['delay'], module.params['timeout']))
+
+    def probe(item):
+        name, address = item
+        return name, wait_for_port(address, module.params['port'], deadline,
+                                   interval=module.params['interval'],
+                                   connect_timeout=module.params['connect_timeout'],
+                                   banner=module.params['banner'],
+                                   started=started)
+
+    if targets:
+        workers = min(module.params['max_workers'] or len(targets), len(targets))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for name, probe_result in executor.map(probe, sorted(targets.items())):
+                result['hosts'][name] = probe_result
+                result['ready' if probe_result['ready'] else 'not_ready'].append(name)
+
+    result['elapsed'] = round(time.time() - started, 3)
+
+    if result['not_ready']:
+        module.fail_json(msg='Hosts not ready: ' + ', '.join(result['not_ready']), **result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+COLLECTION_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MODULE_PACKAGE = 'ansible_collections.timych.yandex_cloud_cvl.plugins.modules.'
+
+
+def collections_path():
+    """Directory holding ansible_collections, as the tests import the collection from it."""
+    import ansible_collections.timych.yandex_cloud_cvl as collection
+    return os.path.dirname(os.path.dirname(os.path.dirname(list(collection.__path__)[0])))
+
+
+class FakeYc(object):
+    """benchmarks/fake_yc.py as the yc on PATH of module runs."""
+
+    def __init__(self, directory):
+        self.dir = str(directory)
+        self.state_path = os.path.join(self.dir, 'state.json')
+        self.log = os.path.join(self.dir, 'calls.jsonl')
+        self.errors = {}
+        bin_dir = os.path.join(self.dir, 'bin')
+        os.mkdir(bin_dir)
+        with open(os.path.join(bin_dir, 'yc'), 'w') as file:
+            file.write('#!/bin/sh\nexec "%s" "%s" "$@"\n' % (
+                sys.executable, os.path.join(COLLECTION_DIR, 'benchmarks', 'fake_yc.py')))
+        os.chmod(os.path.join(bin_dir, 'yc'), 0o755)
+        self.env = dict(os.environ, PATH=bin_dir + os.pathsep + os.environ.get('PATH', ''), HOME=self.dir,
+                        PYTHONPATH=collections_path(), FAKE_YC_STATE=self.state_path, FAKE_YC_LOG=self.log)
+
+    def run(self, module, check_mode=False, **params):
+        """Run a module against the fake, return its result."""
+        if check_mode:
+            params['_ansible_check_mode'] = True
+        env = dict(self.env, FAKE_YC_ERRORS=json.dumps(self.errors))
+        process = subprocess.run([sys.executable, '-m', MODULE_PACKAGE + module],
+                                 input=json.dumps(dict(ANSIBLE_MODULE_ARGS=params)).encode(),
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, cwd=self.dir)
+        try:
+            return json.loads(process.stdout.decode())
+        except ValueError:
+            raise AssertionError('%s printed no result: %s %s' % (module, process.stdout, process.stderr))
+
+    def module(self, **params):
+        """Stand-in for AnsibleModule whose yc calls go to the fake."""
+        return FakeModule(self, params)
+
+    def yc(self, *args):
+        """Call the fake directly, to set up instances."""
+        output = subprocess.check_output(['yc'] + list(args) + ['--format', 'json'], env=self.env)
+        self.calls()
+        return json.loads(output.decode())
+
+    def state(self):
+        with open(self.state_path) as file:
+            return json.load(file)
+
+    def instances(self):
+        return self.state().get('instances', {}) if os.path.exists(self.state_path) else {}
+
+    def calls(self):
+        """Calls since the last calls(), as yc argv without --format."""
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log) as file:
+            records = [json.loads(line) for line in file]
+        os.remove(self.log)
+        return [' '.join(arg for arg in record['args'] if arg not in ('--format', 'json')) for record in records]
+
+
+class FakeModule(object):
+    """The part of AnsibleModule the yc clients use."""
+
+    def __init__(self, fake, params):
+        self.fake = fake
+        self.params = params
+
+    def run_command(self, args):
+        process = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 env=dict(self.fake.env, FAKE_YC_ERRORS=json.dumps(self.fake.errors)))
+        return process.returncode, process.stdout.decode(), process.stderr.decode()
+
+
+@pytest.fixture
+def fake_yc(tmp_path):
+    return FakeYc(tmp_path)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc import (
+    FINGERPRINT_LABEL,
+    GIB,
+    YcCli,
+    YcError,
+    apply_update,
+    build_yc_params,
+    classify_error,
+    plan_action,
+    spec_fingerprint,
+)
+
+
+def instance_params(**options):
+    params = dict(name='vm-1', description=None, zone='ru-central1-a', ssh_key=None, hostname=None, labels=None,
+                  platform=None, memory=2, cores=2, core_fraction=20, public_ip=True, preemptible=False,
+                  boot_disk=dict(image_family='centos-stream-8', image_folder_id='standard-images', size=10,
+                                 type='network-hdd'))
+    params.update(options)
+    return build_yc_params(params)
+
+
+def listed(status='RUNNING', memory=2, labels=None):
+    return dict(name='vm-1', description='', status=status, labels=labels or {}, platform_id='standard-v2',
+                resources=dict(memory=str(memory * GIB), cores='2', core_fraction='20'),
+                scheduling_policy={}, boot_disk=dict(disk_id='fhmdisk1'))
+
+
+@pytest.mark.parametrize('state, update, info, options, expected', [
+    ('present', False, None, {}, 'create'),
+    ('present', False, listed(memory=4), {}, None),
+    ('present', True, listed(), {}, None),
+    ('present', True, listed(memory=4), {}, 'update'),
+    ('present', True, listed(), dict(description='vector'), 'update'),
+    ('absent', False, listed(), {}, 'delete'),
+    ('stopped', False, listed(), {}, 'stop'),
+    ('started', False, listed(status='STOPPED'), {}, 'start'),
+    ('restarted', False, listed(), {}, 'restart'),
+])
+def test_plan_action(state, update, info, options, expected):
+    assert plan_action(instance_params(**options), state, update, info) == expected
+
+
+@pytest.mark.parametrize('state, info', [
+    ('absent', None),
+    ('stopped', listed(status='STOPPED')),
+    ('started', listed()),
+    ('restarted', listed(status='STOPPED')),
+])
+def test_plan_action_impossible(state, info):
+    with pytest.raises(YcError):
+        plan_action(instance_params(), state, False, info)
+
+
+def test_plan_action_fingerprint_skips_comparison():
+    params = instance_params()
+    info = listed(memory=4, labels={FINGERPRINT_LABEL: spec_fingerprint(params)})
+    assert plan_action(params, 'present', True, info, fingerprint=True) is None
+    assert plan_action(params, 'present', True, info) == 'update'
+    assert plan_action(params, 'present', True, listed(), fingerprint=True) == 'update'
+
+
+def test_plan_action_never_shrinks_disk():
+    disk = dict(id='fhmdisk1', size=str(20 * GIB))
+    assert plan_action(instance_params(), 'present', True, listed(), disk) is None
+
+
+def created(fake_yc, status='RUNNING'):
+    fake_yc.yc('compute', 'instance', 'create', '--name', 'vm-1', '--zone', 'ru-central1-a',
+               '--memory', '2', '--cores', '2', '--core-fraction', '20')
+    if status == 'STOPPED':
+        fake_yc.yc('compute', 'instance', 'stop', 'vm-1')
+    info = fake_yc.yc('compute', 'instance', 'get', 'vm-1')
+    return info, fake_yc.yc('compute', 'disk', 'get', info['boot_disk']['disk_id'])
+
+
+def test_apply_update_live_change_is_one_call(fake_yc):
+    info, disk = created(fake_yc)
+    result = apply_update(YcCli(fake_yc.module()), instance_params(description='vector', labels=dict(a='b')), info)
+    assert fake_yc.calls() == ['compute instance update vm-1 --description vector --labels a=b']
+    assert not result['restarted'] and result['vm']['description'] == 'vector'
+
+
+def test_apply_update_restart_changes_in_one_cycle(fake_yc):
+    info, disk = created(fake_yc)
+    params = instance_params(memory=4, cores=4, description='vector',
+                             boot_disk=dict(image_family='centos-stream-8', image_folder_id='standard-images',
+                                            size=20, type='network-hdd'))
+    result = apply_update(YcCli(fake_yc.module()), params, info, disk)
+    assert fake_yc.calls() == [
+        'compute instance stop vm-1',
+        'compute disk resize %s --size 20' % disk['id'],
+        'compute instance update vm-1 --cores 4 --description vector --memory 4',
+        'compute instance start vm-1',
+    ]
+    assert result['restarted'] and result['vm']['status'] == 'RUNNING'
+    assert result['vm']['resources']['memory'] == str(4 * GIB)
+
+
+def test_apply_update_keeps_stopped_instance_stopped(fake_yc):
+    info, disk = created(fake_yc, status='STOPPED')
+    result = apply_update(YcCli(fake_yc.module()), instance_params(memory=4), info, disk)
+    assert fake_yc.calls() == ['compute instance update vm-1 --memory 4']
+    assert not result['restarted'] and fake_yc.instances()['vm-1']['status'] == 'STOPPED'
+
+
+def test_apply_update_without_wait_leaves_last_step_running(fake_yc):
+    info, disk = created(fake_yc)
+    result = apply_update(YcCli(fake_yc.module()), instance_params(memory=4), info, disk, wait=False)
+    assert fake_yc.calls() == [
+        'compute instance stop vm-1',
+        'compute instance update vm-1 --memory 4',
+        'compute instance start vm-1 --async',
+    ]
+    assert '"id"' in result['yc_command_result'][1] and 'vm' not in result
+
+
+@pytest.mark.parametrize('rc, text, expected', [
+    (1, 'ERROR: rpc error: code = ResourceExhausted desc = Quota limit compute.instances.count exceeded', 'quota'),
+    (1, 'ERROR: rpc error: code = ResourceExhausted desc = Too Many Requests', 'quota'),
+    (429, '{"code": 8, "message": "rate limit exceeded"}', 'quota'),
+    (1, 'ERROR: rpc error: code = Unavailable desc = try again later', 'retryable'),
+    (1, 'ERROR: rpc error: code = DeadlineExceeded desc = context deadline exceeded', 'retryable'),
+    (1, 'ERROR: rpc error: code = FailedPrecondition desc = Another operation is in progress', 'retryable'),
+    (1, 'ERROR: operation is already in progress', 'retryable'),
+    (1, 'dial tcp: connection reset by peer', 'retryable'),
+    (503, '', 'retryable'),
+    (-1, '', 'retryable'),
+    (1, 'ERROR: rpc error: code = PermissionDenied desc = Permission denied', 'fatal'),
+    (1, 'ERROR: rpc error: code = InvalidArgument desc = invalid memory', 'fatal'),
+    (1, 'ERROR: instance with name "vm-1" already exists', 'fatal'),
+    (400, '{"code": 3, "message": "bad request"}', 'fatal'),
+    (1, None, 'fatal'),
+])
+def test_classify_error(rc, text, expected):
+    assert classify_error(rc, text) == expected
+
+
+@pytest.mark.parametrize('error, calls', [
+    ('ERROR: rpc error: code = Unavailable desc = fake', 3),
+    ('ERROR: rpc error: code = PermissionDenied desc = fake', 1),
+])
+def test_retries_by_bucket(fake_yc, error, calls):
+    fake_yc.errors['compute instance list'] = error
+    cli = YcCli(fake_yc.module(retries=2, retry_delay=0))
+    with pytest.raises(YcError):
+        cli.list_instances()
+    assert fake_yc.calls() == ['compute instance list'] * calls
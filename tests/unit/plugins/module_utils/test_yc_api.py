@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from ansible.module_utils.six.moves.urllib.request import urlopen
+from ansible.module_utils.six.moves import BaseHTTPServer, http_client
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc_api import (
+    ConnectionPool,
+    IamTokenCache,
+    YcApi,
+    _cli_profile,
+)
+
+COLLECTION_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))))
+
+YC_CONFIG = """current: %s
+profiles:
+  default:
+    token: AQAAAAfake
+    cloud-id: b1gcloud1
+    folder-id: b1gfolder1
+  other:
+    token: AQAAAAfake
+    cloud-id: b1gcloud2
+    folder-id: b1gfolder2
+"""
+
+
+class Module(object):
+    """The part of AnsibleModule YcApi uses."""
+
+    def __init__(self, **params):
+        self.params = params
+
+    def run_command(self, args):
+        return 0, 't1.from-yc\n', ''
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+@pytest.fixture
+def api_url():
+    """benchmarks/fake_yc_api.py on a free port."""
+    url = 'http://127.0.0.1:%d' % free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(COLLECTION_DIR, 'benchmarks', 'fake_yc_api.py'),
+                                '--port', url.rsplit(':', 1)[1]], stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while True:
+        try:
+            urlopen(url + '/fake_stats').read()
+            break
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+    yield url
+    process.terminate()
+    process.wait()
+
+
+def stats(url):
+    return json.loads(urlopen(url + '/fake_stats').read().decode())
+
+
+def write_config(home, profile):
+    if not os.path.isdir(os.path.join(home, '.config', 'yandex-cloud')):
+        os.makedirs(os.path.join(home, '.config', 'yandex-cloud'))
+    with open(os.path.join(home, '.config', 'yandex-cloud', 'config.yaml'), 'w') as file:
+        file.write(YC_CONFIG % profile)
+
+
+def test_cli_profile_differs_per_profile(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    assert _cli_profile() == ''
+    write_config(str(tmp_path), 'default')
+    default = _cli_profile()
+    assert 'b1gfolder1' in default and 'b1gfolder2' not in default
+    write_config(str(tmp_path), 'other')
+    assert 'b1gcloud2' in _cli_profile() and _cli_profile() != default
+
+
+def test_cli_token_not_reused_after_profile_switch(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    write_config(str(tmp_path), 'default')
+    cache_path = str(tmp_path / 'token.json')
+    api = YcApi(Module(token_cache=cache_path))
+    assert api._iam_token() == 't1.from-yc'
+    assert IamTokenCache(cache_path, 'yc:' + _cli_profile()).load() == 't1.from-yc'
+
+    write_config(str(tmp_path), 'other')
+    assert IamTokenCache(cache_path, 'yc:' + _cli_profile()).load() is None
+
+
+def test_oauth_token_cached(api_url, tmp_path):
+    params = dict(api_endpoint=api_url, folder_id='fake-folder', oauth_token='fake-oauth',
+                  token_cache=str(tmp_path / 'token.json'))
+    for dummy in range(3):
+        YcApi(Module(**params)).list_instances()
+    assert stats(api_url)['tokens'] == 1
+    YcApi(Module(**dict(params, oauth_token='other-oauth'))).list_instances()
+    assert stats(api_url)['tokens'] == 2
+
+
+def test_subnet_and_image_listed_once(api_url, tmp_path):
+    api = YcApi(Module(api_endpoint=api_url, folder_id='fake-folder', oauth_token='fake-oauth',
+                       token_cache=str(tmp_path / 'token.json')))
+    api._iam_token()
+    before = stats(api_url)['requests']
+    boot_disk = {'image-family': 'centos-stream-8', 'image-folder-id': 'standard-images'}
+
+    def lookup(zone):
+        return api._subnet_id(zone), api._image_id(boot_disk)
+
+    threads = [threading.Thread(target=lookup, args=(zone,)) for zone in ['ru-central1-a', 'ru-central1-b'] * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert api.zone_subnet('ru-central1-a')['id'] == 'e9bsubnet-a'
+    assert stats(api_url)['requests'] - before == 2
+
+
+class ClosingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Closes the connection of every other request without an answer."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_one_request_with(self, method):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        self.server.requests.append((method, self.headers.get('Idempotency-Key')))
+        if len(self.server.requests) % 2:
+            self.close_connection = True
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def do_GET(self):
+        self.handle_one_request_with('GET')
+
+    def do_POST(self):
+        self.handle_one_request_with('POST')
+
+
+@pytest.fixture
+def closing_server():
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), ClosingHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_pool_retries_get_on_fresh_connection(closing_server):
+    url = 'http://127.0.0.1:%d/compute/v1/instances' % closing_server.server_address[1]
+    assert ConnectionPool(5).request('GET', url) == (200, b'{}')
+    assert len(closing_server.requests) == 2
+
+
+def test_pool_does_not_resend_post(closing_server):
+    url = 'http://127.0.0.1:%d/compute/v1/instances' % closing_server.server_address[1]
+    with pytest.raises((http_client.HTTPException, OSError)):
+        ConnectionPool(5).request('POST', url, body='{}')
+    assert closing_server.requests == [('POST', None)]
+
+
+def test_post_resent_with_same_idempotency_key(closing_server, tmp_path):
+    api = YcApi(Module(api_endpoint='http://127.0.0.1:%d' % closing_server.server_address[1],
+                       iam_token='t1.fake', token_cache=str(tmp_path / 'token.json'), retries=0))
+    assert api.request('POST', 'compute', '/compute/v1/instances/fhm1:start') == {}
+    (first_method, first_key), (second_method, second_key) = closing_server.requests
+    assert first_method == second_method == 'POST' and first_key and first_key == second_key
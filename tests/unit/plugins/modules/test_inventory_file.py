@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+
+import yaml
+
+from ansible_collections.timych.yandex_cloud_cvl.plugins.modules.inventory_file import merge, replace_hosts
+
+HAND_WRITTEN = """---
+all:
+  vars:
+    ansible_user: centos
+clickhouse:
+  hosts:
+    clickhouse-01:
+      ansible_host: 10.0.0.1
+  vars:
+    clickhouse_port: 8123
+lighthouse:
+  hosts:
+    lighthouse-01:
+      ansible_host: 10.0.0.3
+monitoring:
+  children:
+    clickhouse:
+    vector:
+vector:
+"""
+
+
+def vm(name, description, address):
+    return dict(name=name, description=description, status='RUNNING', network_interfaces=[
+        dict(primary_v4_address=dict(address='10.0.1.1', one_to_one_nat=dict(address=address)))])
+
+
+def write_inventory(fake_yc, content):
+    path = os.path.join(fake_yc.dir, 'inventory.yml')
+    with open(path, 'w') as file:
+        file.write(content)
+    return path
+
+
+def read_inventory(path):
+    with open(path) as file:
+        return yaml.safe_load(file)
+
+
+def test_merge_keeps_hand_written_content(fake_yc):
+    path = write_inventory(fake_yc, HAND_WRITTEN)
+    result = fake_yc.run('inventory_file', path=path, instances=[
+        dict(changed=True, name='vector-01', action='create', vm=vm('vector-01', 'vector', '1.2.3.4'))])
+    assert result['changed'] and result['added'] == ['vector-01']
+    inventory = read_inventory(path)
+    assert inventory['all'] == dict(vars=dict(ansible_user='centos'))
+    assert inventory['clickhouse'] == dict(hosts={'clickhouse-01': dict(ansible_host='10.0.0.1')},
+                                           vars=dict(clickhouse_port=8123))
+    assert inventory['monitoring'] == dict(children=dict(clickhouse=None, vector=None))
+    assert inventory['vector'] == dict(hosts={'vector-01': dict(ansible_host='1.2.3.4')})
+
+    again = fake_yc.run('inventory_file', path=path, instances=[vm('vector-01', 'vector', '1.2.3.4')])
+    assert not again['changed'] and again['checksum'] == result['checksum']
+
+
+def test_removing_last_host_keeps_group_vars(fake_yc):
+    path = write_inventory(fake_yc, HAND_WRITTEN)
+    result = fake_yc.run('inventory_file', path=path, instances=[
+        dict(changed=True, name='clickhouse-01', action='delete'),
+        dict(changed=True, name='lighthouse-01', action='delete')])
+    assert sorted(result['removed']) == ['clickhouse-01', 'lighthouse-01']
+    inventory = read_inventory(path)
+    assert inventory['clickhouse'] == dict(vars=dict(clickhouse_port=8123))
+    assert 'lighthouse' not in inventory
+    assert inventory['vector'] is None and 'monitoring' in inventory
+
+
+def test_hosts_option_and_check_mode(fake_yc):
+    path = write_inventory(fake_yc, HAND_WRITTEN)
+    result = fake_yc.run('inventory_file', check_mode=True, path=path, hosts=[
+        dict(name='lighthouse-01', state='absent'),
+        dict(name='vector-02', groups=['vector'], vars=dict(ansible_host='5.6.7.8'))])
+    assert result['changed'] and result['removed'] == ['lighthouse-01'] and result['added'] == ['vector-02']
+    with open(path) as file:
+        assert file.read() == HAND_WRITTEN
+
+
+def test_yc_absent_result_removes_nothing(fake_yc):
+    path = write_inventory(fake_yc, HAND_WRITTEN)
+    result = fake_yc.run('inventory_file', path=path, instances=[dict(changed=True, msg='deleted')])
+    assert not result['removed'] and result['hosts'] == 2
+
+
+def test_merge_updates_moved_host():
+    groups = dict(vector={'vector-01': dict(ansible_host='1.1.1.1')})
+    merged, changes = merge(groups, {'vector-01': (set(['clickhouse']), dict(ansible_host='1.1.1.1'))}, set())
+    assert changes == dict(added=[], updated=['vector-01'], removed=[])
+    assert merged == dict(clickhouse={'vector-01': dict(ansible_host='1.1.1.1')})
+    assert groups['vector'], 'merge must not change its input'
+
+
+def test_merge_keeps_address_of_host_without_one():
+    groups = dict(vector={'vector-01': dict(ansible_host='1.1.1.1')})
+    merged, changes = merge(groups, {'vector-01': (set(['vector']), {})}, set())
+    assert not changes['updated'] and merged == groups
+
+
+def test_replace_hosts_round_trip():
+    inventory = yaml.safe_load(HAND_WRITTEN)
+    groups = dict((group, (entry or {}).get('hosts')) for group, entry in inventory.items())
+    groups = dict((group, hosts) for group, hosts in groups.items() if hosts)
+    assert replace_hosts(inventory, groups) == inventory
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import base64
+import bz2
+import gzip
+import lzma
+import os
+
+import pytest
+
+from ansible_collections.timych.yandex_cloud_cvl.plugins.modules.my_own_module import (
+    B64_CHUNK_SIZE,
+    CHUNK_SIZE,
+    b64_chunks,
+    decompress_chunks,
+)
+
+DATA = os.urandom(3 * CHUNK_SIZE + 1000)
+COMPRESS = dict(gzip=gzip.compress, bzip2=bz2.compress, xz=lzma.compress)
+
+
+def wrapped(text, width, start=0):
+    """text with a line break every width characters after start."""
+    return text[:start] + '\n'.join(text[offset:offset + width] for offset in range(start, len(text), width))
+
+
+@pytest.mark.parametrize('text', [
+    base64.b64encode(DATA).decode(),
+    wrapped(base64.b64encode(DATA).decode(), 76),
+    # no whitespace in the first piece, a line break off the 4 character boundary later
+    wrapped(base64.b64encode(DATA).decode(), 4099, start=B64_CHUNK_SIZE + 1),
+    wrapped(base64.b64encode(DATA).decode(), 4097, start=4097) + '\r\n',
+], ids=['plain', 'wrapped', 'late-line-break', 'line-break-after-4k'])
+def test_b64_chunks(text):
+    assert b''.join(b64_chunks(text)) == DATA
+
+
+def test_b64_chunks_bounded():
+    assert max(len(chunk) for chunk in b64_chunks(base64.b64encode(DATA).decode())) <= CHUNK_SIZE
+
+
+@pytest.mark.parametrize('compression', sorted(COMPRESS))
+def test_decompress_chunks(compression):
+    data = DATA + b'\0' * (4 * CHUNK_SIZE)
+    text = wrapped(base64.b64encode(COMPRESS[compression](data)).decode(), 76)
+    chunks = list(decompress_chunks(b64_chunks(text), compression))
+    assert b''.join(chunks) == data
+    assert max(len(chunk) for chunk in chunks) <= CHUNK_SIZE
+
+
+@pytest.mark.parametrize('compression', sorted(COMPRESS))
+def test_decompress_truncated(compression):
+    compressed = COMPRESS[compression](DATA)
+    with pytest.raises(ValueError):
+        list(decompress_chunks([compressed[:len(compressed) // 2]], compression))
+
+
+def test_write_compressed_content(fake_yc):
+    path = os.path.join(fake_yc.dir, 'out', 'file.bin')
+    content = wrapped(base64.b64encode(gzip.compress(DATA)).decode(), 4099, start=B64_CHUNK_SIZE + 1)
+    result = fake_yc.run('my_own_module', path=path, content_compressed=content)
+    assert result['changed'] and result['bytes_written'] == len(DATA)
+    with open(path, 'rb') as file:
+        assert file.read() == DATA
+
+    again = fake_yc.run('my_own_module', path=path, content_b64=base64.encodebytes(DATA).decode(), force=True)
+    assert not again['changed'] and again['same_content']
+
+
+def test_write_bad_base64(fake_yc):
+    path = os.path.join(fake_yc.dir, 'file.bin')
+    result = fake_yc.run('my_own_module', path=path, content_b64='not base64!')
+    assert result['failed'] and not os.path.exists(path)
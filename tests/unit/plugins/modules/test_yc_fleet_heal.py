@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.timych.yandex_cloud_cvl.plugins.module_utils.yc import YcError
+from ansible_collections.timych.yandex_cloud_cvl.plugins.modules.yc_fleet_heal import recreatable
+
+HEAL = dict(preflight='skip', names=['vm-1'], boot_disk=dict(size=20), ssh_key='ssh-ed25519 AAAA test')
+
+
+def cli_error(stderr):
+    return YcError('yc compute instance start failed', rc=1, stdout='', stderr=stderr)
+
+
+@pytest.mark.parametrize('error, expected', [
+    (cli_error('ERROR: rpc error: code = FailedPrecondition desc = Boot disk is broken'), True),
+    (cli_error('ERROR: rpc error: code = NotFound desc = Disk fhmdisk01 not found'), True),
+    (YcError('POST start failed: HTTP 400', rc=400, stderr='{"code": 9, "message": "disk is detached"}'), True),
+    (cli_error('ERROR: rpc error: code = PermissionDenied desc = Permission denied'), False),
+    (cli_error('ERROR: rpc error: code = Unauthenticated desc = The token has expired'), False),
+    (cli_error('ERROR: rpc error: code = InvalidArgument desc = folder fake not found'), False),
+    (cli_error('ERROR: rpc error: code = NotFound desc = Folder fake not found'), False),
+    (cli_error('ERROR: rpc error: code = ResourceExhausted desc = Quota limit vpc.externalAddresses exceeded'),
+     False),
+    (cli_error('ERROR: rpc error: code = Unavailable desc = try again'), False),
+    (YcError('POST start failed: HTTP 403', rc=403, stderr='{"code": 9, "message": "no access"}'), False),
+    (YcError('Operation fd8op failed: not allowed', rc=7, stdout='{"error": {"code": 7}}', stderr=''), False),
+    (cli_error('ERROR: something unexpected'), False),
+])
+def test_recreatable(error, expected):
+    assert recreatable(error) is expected
+
+
+def stopped_instance(fake_yc):
+    vm = fake_yc.yc('compute', 'instance', 'create', '--name', 'vm-1', '--zone', 'ru-central1-a', '--preemptible')
+    fake_yc.yc('compute', 'instance', 'stop', 'vm-1')
+    return vm
+
+
+def test_start(fake_yc):
+    stopped_instance(fake_yc)
+    result = fake_yc.run('yc_fleet_heal', preflight='skip', names=['vm-1'])
+    assert result['changed'] and result['started'] == ['vm-1']
+    assert fake_yc.instances()['vm-1']['status'] == 'RUNNING'
+
+
+def test_check_mode_calls_nothing(fake_yc):
+    vm = stopped_instance(fake_yc)
+    result = fake_yc.run('yc_fleet_heal', check_mode=True, recreate=True, **HEAL)
+    assert result['changed'] and [item['action'] for item in result['instances']] == ['start']
+    assert fake_yc.calls() == ['compute instance list']
+    assert fake_yc.instances()['vm-1']['id'] == vm['id']
+    assert fake_yc.instances()['vm-1']['status'] == 'STOPPED'
+
+
+def test_recreate_needs_disk_and_key(fake_yc):
+    stopped_instance(fake_yc)
+    result = fake_yc.run('yc_fleet_heal', preflight='skip', names=['vm-1'], recreate=True)
+    assert result['failed'] and 'recreate needs boot_disk and ssh_key' in result['msg']
+    assert fake_yc.calls() == ['compute instance list']
+
+
+def test_no_recreate_on_permission_error(fake_yc):
+    vm = stopped_instance(fake_yc)
+    fake_yc.errors['compute instance start vm-1'] = 'ERROR: rpc error: code = PermissionDenied desc = denied'
+    result = fake_yc.run('yc_fleet_heal', recreate=True, retries=0, **HEAL)
+    assert result['failed'] and result['failed_instances'] == ['vm-1']
+    assert not [call for call in fake_yc.calls() if 'delete' in call or 'create' in call]
+    assert fake_yc.instances()['vm-1']['id'] == vm['id']
+
+
+def test_no_recreate_without_option(fake_yc):
+    vm = stopped_instance(fake_yc)
+    fake_yc.errors['compute instance start vm-1'] = 'ERROR: rpc error: code = FailedPrecondition desc = broken'
+    result = fake_yc.run('yc_fleet_heal', preflight='skip', names=['vm-1'], retries=0)
+    assert result['failed'] and not result['changed']
+    assert fake_yc.instances()['vm-1']['id'] == vm['id']
+
+
+def test_recreate_broken_instance(fake_yc):
+    vm = stopped_instance(fake_yc)
+    fake_yc.errors['compute instance start vm-1'] = 'ERROR: rpc error: code = FailedPrecondition desc = broken'
+    result = fake_yc.run('yc_fleet_heal', recreate=True, retries=0, **HEAL)
+    assert result['changed'] and result['recreated'] == ['vm-1']
+    calls = fake_yc.calls()
+    assert calls.index('compute instance delete vm-1') < [call.startswith('compute instance create')
+                                                           for call in calls].index(True)
+    recreated = fake_yc.instances()['vm-1']
+    assert recreated['id'] != vm['id'] and recreated['status'] == 'RUNNING'
+    assert recreated['scheduling_policy'] == dict(preemptible=True)
+    assert fake_yc.state()['disks'][recreated['boot_disk']['disk_id']]['size'] == str(20 * 1024 ** 3)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Timur Alekseev (@Timych84)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+
+
+def ssh_key(fake_yc, name):
+    path = os.path.join(fake_yc.dir, name + '.pub')
+    with open(path, 'w') as file:
+        file.write('ssh-ed25519 AAAA%s test\n' % name)
+    return path
+
+
+def test_ssh_key_change_updates_template(fake_yc):
+    group = dict(preflight='skip', name='vector', size=2, service_account_id='aje0fake', zone='ru-central1-a',
+                 ssh_key=ssh_key(fake_yc, 'first'), wait_timeout=10)
+    assert fake_yc.run('yc_instance_group', **group)['action'] == 'create'
+
+    unchanged = fake_yc.run('yc_instance_group', **group)
+    assert not unchanged['changed'] and unchanged['changes'] == {}
+    without_key = fake_yc.run('yc_instance_group', **dict(group, ssh_key=None))
+    assert not without_key['changed']
+
+    result = fake_yc.run('yc_instance_group', **dict(group, ssh_key=ssh_key(fake_yc, 'second')))
+    assert result['changed'] and result['action'] == 'update'
+    assert list(result['changes']) == ['metadata']
+    assert 'AAAAsecond' in result['changes']['metadata']['desired']['ssh-keys']
+    template = fake_yc.state()['instance_groups']['vector']['instance_template']
+    assert 'AAAAsecond' in template['metadata']['ssh-keys']